@@ -4,11 +4,15 @@
 import logging
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from app.database.connection import get_db_cursor
+from app.database.connection import get_db_cursor, on_commit
+from app.models.repository import fetch_rows
+from app.models.rows import AdminVideoItem
 from app.services.video_service import VideoService
 from app.services.category_service import CategoryService
 from app.services.user_service import UserService
 from app.services.stats_service import StatsService
+from app.utils.pagination import AFTER, BEFORE, decode_cursor, encode_cursor, keyset_condition
+from app.utils.job_queue import run_in_background
 
 logger = logging.getLogger(__name__)
 
@@ -18,14 +22,23 @@ class AdminService:
     
     @staticmethod
     def log_admin_action(admin_id: int, action: str, details: str = None):
-        """تسجيل عمليات الإدارة"""
+        """تسجيل عمليات الإدارة (في طابور المهام الخلفية)"""
         try:
-            with get_db_cursor() as cursor:
+            # بدون إعادة محاولة: الخطأ الوحيد المتوقع هو غياب جدول admin_logs
+            run_in_background(AdminService._save_admin_log, admin_id, action, details, datetime.now(), retries=0)
+        except Exception as e:
+            logger.debug(f"تسجيل الإدارة: {action}")
+    
+    @staticmethod
+    def _save_admin_log(admin_id: int, action: str, details: str, timestamp: datetime):
+        """كتابة سجل الإدارة (اتصال مستقل عن وحدة العمل)"""
+        try:
+            with get_db_cursor(standalone=True) as cursor:
                 cursor.execute("""
                     INSERT INTO admin_logs (admin_id, action, details, timestamp)
                     VALUES (%s, %s, %s, %s)
                     ON CONFLICT DO NOTHING
-                """, (admin_id, action, details, datetime.now()))
+                """, (admin_id, action, details, timestamp))
                 
         except Exception as e:
             # إذا لم يكن جدول admin_logs موجود، نتجاهل الخطأ
@@ -55,12 +68,22 @@ class AdminService:
             return {}
     
     @staticmethod
-    def search_admin_videos(query: str = None, category_id: int = None, limit: int = 50) -> List[Tuple]:
-        """البحث المتقدم للإدارة"""
+    def search_admin_videos(query: str = None, category_id: int = None, limit: int = 50,
+                            cursor: Optional[str] = None) -> List[AdminVideoItem]:
+        """البحث المتقدم للإدارة (مع cursor: تصفح بالمفاتيح على (upload_date, id))"""
         try:
-            with get_db_cursor() as cursor:
+            with get_db_cursor() as db_cursor:
                 where_conditions = []
                 params = []
+                order = "DESC"
+                
+                keyset = decode_cursor(cursor)
+                if keyset:
+                    direction, key = keyset
+                    order = "DESC" if direction == AFTER else "ASC"
+                    condition, key_params = keyset_condition(("v.upload_date", "v.id"), direction, key)
+                    where_conditions.append(condition)
+                    params.extend(key_params)
                 
                 if query:
                     where_conditions.append("(v.title ILIKE %s OR v.caption ILIKE %s OR v.file_name ILIKE %s)")
@@ -72,22 +95,32 @@ class AdminService:
                 
                 where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
                 
-                cursor.execute(f"""
+                db_cursor.execute(f"""
                     SELECT v.id, v.title, v.caption, v.view_count, v.file_name, 
-                           v.upload_date, c.name as category_name, v.file_size
+                           v.upload_date, c.name as category_name
                     FROM video_archive v
                     LEFT JOIN categories c ON v.category_id = c.id
                     WHERE {where_clause}
-                    ORDER BY v.upload_date DESC
+                    ORDER BY v.upload_date {order}, v.id {order}
                     LIMIT %s
                 """, params + [limit])
                 
-                return cursor.fetchall()
+                rows = fetch_rows(db_cursor, AdminVideoItem)
+                return rows[::-1] if keyset and keyset[0] == BEFORE else rows
                 
         except Exception as e:
             logger.error(f"❌ خطأ في البحث الإداري: {e}")
             return []
     
+    @staticmethod
+    def admin_page_cursors(videos: List[AdminVideoItem]) -> Tuple[Optional[str], Optional[str]]:
+        """مؤشرا الصفحة السابقة والتالية لنتائج search_admin_videos"""
+        if not videos:
+            return None, None
+        first, last = videos[0], videos[-1]
+        return (encode_cursor(BEFORE, (first.upload_date, first.id)),
+                encode_cursor(AFTER, (last.upload_date, last.id)))
+    
     @staticmethod
     def bulk_update_videos_category(video_ids: List[int], category_id: int, admin_id: int) -> int:
         """تحديث تصنيف عدة فيديوهات مرة واحدة"""
@@ -97,12 +130,17 @@ class AdminService:
                 video_ids_str = ','.join(map(str, video_ids))
                 
                 cursor.execute(f"""
-                    UPDATE video_archive 
+                    UPDATE video_archive v
                     SET category_id = %s 
-                    WHERE id IN ({video_ids_str})
+                    FROM (SELECT id, category_id FROM video_archive WHERE id IN ({video_ids_str}) FOR UPDATE) old
+                    WHERE v.id = old.id
+                    RETURNING old.category_id
                 """, (category_id,))
                 
-                updated_count = cursor.rowcount
+                old_categories = [row[0] for row in cursor.fetchall()]
+                updated_count = len(old_categories)
+                # الذاكرة تُحدث بعد الـ commit حتى لا تصف كتابة تم التراجع عنها
+                on_commit(lambda: VideoService.videos_moved(video_ids, old_categories, category_id))
                 
                 AdminService.log_admin_action(
                     admin_id, 
@@ -123,9 +161,11 @@ class AdminService:
             with get_db_cursor() as cursor:
                 video_ids_str = ','.join(map(str, video_ids))
                 
-                cursor.execute(f"DELETE FROM video_archive WHERE id IN ({video_ids_str})")
+                cursor.execute(f"DELETE FROM video_archive WHERE id IN ({video_ids_str}) RETURNING category_id")
                 
-                deleted_count = cursor.rowcount
+                old_categories = [row[0] for row in cursor.fetchall()]
+                deleted_count = len(old_categories)
+                on_commit(lambda: VideoService.videos_deleted(video_ids, old_categories))
                 
                 AdminService.log_admin_action(
                     admin_id, 
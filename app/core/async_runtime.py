@@ -0,0 +1,192 @@
+"""
+وضع التشغيل غير المتزامن (BOT_RUNTIME=async): خادم webhook على aiohttp وعميل AsyncTeleBot
+واستعلامات على محرك SQLAlchemy غير المتزامن.
+
+كل تحديث يصبح مهمة asyncio ويُرد على تيليجرام فوراً، فيمكن لعملية واحدة حمل آلاف
+التحديثات الجارية بدلاً من تحديث لكل خيط. تحديثات المحادثة الواحدة تُعالج بالترتيب
+(قفل لكل محادثة). المسارات المنقولة لـ app.handlers.async_handlers تعمل داخل الحلقة،
+وباقي التحديثات تُحال للمعالجات المتزامنة في مجموعة خيوط محدودة.
+"""
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+from aiohttp import web
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from app.core.database import close_db
+from app.handlers.async_handlers import handle_update, route_update
+from app.utils.update_queue import Timing, chat_id_of
+
+logger = logging.getLogger(__name__)
+
+# أقصى عدد تحديثات جارية في نفس الوقت (بعده يُرد 503 ليعيد تيليجرام الإرسال)
+ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', '1000'))
+# خيوط المعالجات المتزامنة للتحديثات غير المنقولة
+ASYNC_SYNC_WORKERS = int(os.getenv('ASYNC_SYNC_WORKERS', '8'))
+# مهلة إنهاء التحديثات الجارية عند الإيقاف (بالثواني)
+ASYNC_SHUTDOWN_TIMEOUT = float(os.getenv('ASYNC_SHUTDOWN_TIMEOUT', '10'))
+
+
+class AsyncRuntime:
+    """خادم webhook غير متزامن مع توزيع التحديثات على المعالجات غير المتزامنة والمتزامنة"""
+
+    def __init__(self, token: str, webhook_url: str, admin_ids: Iterable[int], process_sync: Callable,
+                 stats_provider: Optional[Callable[[], Dict]] = None, warm_up: Optional[Callable] = None,
+                 max_in_flight: int = 1000, sync_workers: int = 8):
+        self.token = token
+        self.webhook_url = webhook_url
+        self.admin_ids = frozenset(admin_ids or ())
+        self.process_sync = process_sync
+        self.stats_provider = stats_provider
+        self.warm_up = warm_up
+        self.max_in_flight = max_in_flight
+
+        self.bot = AsyncTeleBot(token)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, sync_workers), thread_name_prefix="sync-update")
+        self._tasks = set()
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_refs: Dict[int, int] = {}
+
+        self._accepted = 0
+        self._rejected = 0
+        self._handled_async = 0
+        self._delegated = 0
+        self._failed = 0
+        self._max_in_flight_seen = 0
+        self._processing = Timing()
+
+    # === الطلبات ===
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        try:
+            update = types.Update.de_json(await request.text())
+        except Exception as e:
+            logger.error(f"❌ تحديث غير صالح في Webhook: {e}")
+            return web.Response(status=400)
+
+        if len(self._tasks) >= self.max_in_flight:
+            self._rejected += 1
+            logger.warning(f"⚠️ تم بلوغ حد التحديثات الجارية ({self.max_in_flight}) - تم رفض التحديث")
+            return web.Response(status=503)
+
+        self._accepted += 1
+        task = asyncio.get_running_loop().create_task(self._dispatch(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._max_in_flight_seen = max(self._max_in_flight_seen, len(self._tasks))
+        return web.Response(status=200)
+
+    async def handle_ping(self, request: web.Request) -> web.Response:
+        return web.Response(text=f"pong ✅ - الوضع غير المتزامن - {time.strftime('%H:%M:%S')}")
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        health = {"status": "healthy", "runtime": self.stats()}
+        if self.stats_provider is not None:
+            try:
+                health["background"] = self.stats_provider()
+            except Exception as e:
+                health["background_error"] = str(e)[:100]
+        return web.json_response(health)
+
+    # === التوزيع ===
+
+    async def _dispatch(self, update):
+        """معالجة تحديث مع الحفاظ على ترتيب تحديثات المحادثة الواحدة"""
+        chat_id = chat_id_of(update)
+        if chat_id is None:
+            await self._process(update)
+            return
+
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+        self._chat_refs[chat_id] = self._chat_refs.get(chat_id, 0) + 1
+        try:
+            # انتظار القفل بترتيب الوصول (المهام تبدأ بترتيب إنشائها)
+            async with lock:
+                await self._process(update)
+        finally:
+            self._chat_refs[chat_id] -= 1
+            if not self._chat_refs[chat_id]:
+                del self._chat_refs[chat_id]
+                del self._chat_locks[chat_id]
+
+    async def _process(self, update):
+        started = time.monotonic()
+        try:
+            handler = route_update(update)
+            if handler is not None:
+                await handle_update(self.bot, update, handler, self.admin_ids)
+                self._handled_async += 1
+            else:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self.process_sync, update)
+                self._delegated += 1
+        except Exception as e:
+            self._failed += 1
+            logger.error(f"❌ خطأ في معالجة التحديث: {e}")
+        finally:
+            self._processing.add((time.monotonic() - started) * 1000)
+
+    def stats(self) -> Dict:
+        stats = {
+            'mode': 'async',
+            'in_flight': len(self._tasks),
+            'max_in_flight': self.max_in_flight,
+            'peak_in_flight': self._max_in_flight_seen,
+            'active_chats': len(self._chat_locks),
+            'accepted': self._accepted,
+            'rejected': self._rejected,
+            'handled_async': self._handled_async,
+            'delegated_sync': self._delegated,
+            'failed': self._failed,
+        }
+        stats.update(self._processing.as_dict('processing'))
+        return stats
+
+    # === دورة الحياة ===
+
+    async def _on_startup(self, app: web.Application):
+        if self.warm_up is not None:
+            # تحميل القوائم وشجرة التصنيفات مسبقاً حتى تُقدم من الذاكرة
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.warm_up)
+
+        await self.bot.remove_webhook()
+        webhook_url = f"{self.webhook_url}/{self.token}"
+        if await self.bot.set_webhook(url=webhook_url):
+            logger.info(f"✅ تم إعداد Webhook (غير متزامن): {webhook_url}")
+        else:
+            logger.error("❌ فشل في إعداد Webhook")
+
+    async def _on_cleanup(self, app: web.Application):
+        if self._tasks:
+            logger.info(f"⏳ انتظار {len(self._tasks)} تحديث جارٍ قبل الإيقاف")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=ASYNC_SHUTDOWN_TIMEOUT)
+            if pending:
+                logger.warning(f"⚠️ تم الإيقاف مع {len(pending)} تحديث غير مكتمل")
+        self._executor.shutdown(wait=True)
+        try:
+            await self.bot.close_session()
+        except Exception as e:
+            logger.error(f"❌ خطأ في إغلاق جلسة البوت: {e}")
+        await close_db()
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(f'/{self.token}', self.handle_webhook)
+        app.router.add_get('/', self.handle_health)
+        app.router.add_get('/health', self.handle_health)
+        app.router.add_get('/ping', self.handle_ping)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    def run(self, port: int):
+        """تشغيل الخادم (يعود عند الإيقاف بعد إنهاء التحديثات الجارية)"""
+        logger.info(f"🚀 تشغيل الوضع غير المتزامن على المنفذ {port} "
+                    f"(حتى {self.max_in_flight} تحديث جارٍ)")
+        web.run_app(self.build_app(), host='0.0.0.0', port=port, print=None)
@@ -17,9 +17,20 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+
+def _async_database_url(url: str) -> str:
+    """تحويل رابط psycopg2 (postgres:// أو postgresql://) إلى رابط asyncpg"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            url = "postgresql+asyncpg://" + url[len(prefix):]
+            break
+    # asyncpg يستخدم ssl بدلاً من sslmode
+    return url.replace("sslmode=", "ssl=")
+
+
 # إنشاء محرك قاعدة البيانات
 engine: AsyncEngine = create_async_engine(
-    settings.DATABASE_URL,
+    _async_database_url(settings.DATABASE_URL),
     echo=settings.DEBUG,
     pool_pre_ping=True,
     pool_recycle=3600,
@@ -3,14 +3,16 @@
 """
 import psycopg2
 import logging
-from typing import Optional
+import threading
+from typing import Callable, List, Optional
 from contextlib import contextmanager
+from app.database.pool import get_pool
 
 logger = logging.getLogger(__name__)
 
 
 def get_db_connection():
-    """الاتصال بقاعدة البيانات"""
+    """اتصال مباشر بقاعدة البيانات خارج التجمع (للعمليات الإدارية الخاصة)"""
     try:
         import main
         conn = psycopg2.connect(main.DATABASE_URL)
@@ -20,24 +22,224 @@ def get_db_connection():
         return None
 
 
-@contextmanager
-def get_db_cursor():
-    """Context manager لإدارة الاتصال والcursor"""
-    conn = get_db_connection()
-    if not conn:
+# وحدة العمل الحالية لكل خيط (اتصال ومعاملة واحدة لكل تحديث)
+_local = threading.local()
+
+
+class _UnitOfWork:
+    """
+    اتصال مشترك لاستعلامات التحديث الحالي. المعاملة تبقى مفتوحة بين استعلامات الخدمات
+    فقط، وتُنهى (commit وإرجاع الاتصال للتجمع) قبل أي طلب لـ Telegram عبر release_unit_of_work.
+    """
+
+    __slots__ = ('pooled', 'in_transaction', 'savepoints', 'after_commit')
+
+    def __init__(self):
+        self.pooled = None
+        self.in_transaction = False
+        self.savepoints = 0
+        self.after_commit: List[Callable[[], object]] = []
+
+
+def _run_after_commit(callbacks: List[Callable[[], object]]):
+    """تنفيذ دوال ما بعد الـ commit (خطأ إحداها لا يمنع الباقي)"""
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"❌ خطأ في دالة ما بعد الـ commit: {e}")
+
+
+def on_commit(callback: Callable[[], object]):
+    """
+    تنفيذ callback بعد نجاح commit المعاملة الحالية فقط (إبطال الذاكرة المؤقتة وتحديث
+    البيانات في الذاكرة)، ويُتجاهل إذا انتهت المعاملة بـ rollback.
+    داخل كتلة get_db_cursor مستقلة يُربط بـ commit الكتلة، وداخل unit_of_work بـ commit الوحدة،
+    وخارجهما يُنفذ فوراً.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending:
+        pending[-1].append(callback)
+        return
+    uow = getattr(_local, 'uow', None)
+    if uow is not None:
+        uow.after_commit.append(callback)
+        return
+    _run_after_commit([callback])
+
+
+def _borrow_connection():
+    """استعارة اتصال من التجمع"""
+    try:
+        return get_pool().getconn()
+    except Exception as e:
+        logger.error(f"❌ خطأ في الاتصال بقاعدة البيانات: {e}")
         raise Exception("فشل الاتصال بقاعدة البيانات")
+
+
+def _return_connection(pooled, broken: bool = False):
+    """إرجاع الاتصال للتجمع"""
+    get_pool().putconn(pooled, discard=broken or bool(pooled.conn.closed))
+
+
+def _finish(uow: _UnitOfWork, commit: bool) -> bool:
+    """إنهاء معاملة الوحدة الحالية وإرجاع اتصالها للتجمع (الوحدة نفسها تبقى قابلة للاستخدام)"""
+    if uow.pooled is None:
+        committed = commit
+    else:
+        broken = False
+        committed = False
+        try:
+            if commit:
+                uow.pooled.conn.commit()
+                committed = True
+            else:
+                uow.pooled.conn.rollback()
+        except Exception as e:
+            logger.error(f"❌ خطأ في إنهاء معاملة وحدة العمل: {e}")
+            try:
+                uow.pooled.conn.rollback()
+            except Exception:
+                broken = True
+        _return_connection(uow.pooled, broken)
+        uow.pooled = None
+
+    callbacks, uow.after_commit = uow.after_commit, []
+    uow.in_transaction = False
+    uow.savepoints = 0
+    if committed:
+        _run_after_commit(callbacks)
+    return committed
+
+
+def _rollback_block(uow: _UnitOfWork, conn, savepoint: Optional[str]):
+    """تراجع عن كتلة فاشلة: لنقطة الحفظ، أو عن المعاملة إذا كانت الكتلة الأولى فيها"""
+    if savepoint is not None:
+        try:
+            with conn.cursor() as savepoint_cursor:
+                savepoint_cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            return
+        except Exception as e:
+            logger.error(f"❌ تعذر الرجوع لنقطة الحفظ - تم التراجع عن معاملة وحدة العمل كاملة: {e}")
+            uow.after_commit.clear()
+    try:
+        conn.rollback()
+    except Exception:
+        pass
+    uow.in_transaction = False
+    uow.savepoints = 0
+
+
+def release_unit_of_work():
+    """
+    commit المعاملة المفتوحة في وحدة العمل الحالية وإرجاع اتصالها للتجمع.
+    يُستدعى قبل أي إدخال/إخراج خارجي (طلبات Telegram) حتى لا يبقى الاتصال
+    "idle in transaction" أثناء انتظار الشبكة؛ الاستعلامات التالية تستعير اتصالاً جديداً.
+    """
+    uow = getattr(_local, 'uow', None)
+    if uow is not None and uow.pooled is not None:
+        _finish(uow, commit=True)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    وحدة عمل لكل تحديث: استدعاءات get_db_cursor المتتالية تشترك في اتصال ومعاملة واحدة
+    حتى أول طلب لـ Telegram أو نهاية التحديث، ثم يتم الـ commit مرة واحدة.
+    فشل كتلة استعلام لا يُلغي كتابات الكتل السابقة (نقطة حفظ قبل كل كتلة بعد الأولى).
+    الاستدعاء المتداخل لا يفتح وحدة جديدة بل يعيد استخدام الحالية.
+    """
+    if getattr(_local, 'uow', None) is not None:
+        yield _local.uow
+        return
+    
+    uow = _UnitOfWork()
+    _local.uow = uow
+    try:
+        yield uow
+    except Exception as e:
+        _local.uow = None
+        _finish(uow, commit=False)
+        logger.error(f"❌ خطأ في وحدة العمل: {e}")
+        raise
+    _local.uow = None
+    _finish(uow, commit=True)
+
+
+def in_unit_of_work() -> bool:
+    """هل الخيط الحالي داخل وحدة عمل؟"""
+    return getattr(_local, 'uow', None) is not None
+
+
+@contextmanager
+def get_db_cursor(standalone: bool = False):
+    """
+    Context manager لإدارة الاتصال والcursor (الاتصال مُستعار من التجمع).
+    داخل unit_of_work يُعاد استخدام اتصال الوحدة بدون commit منفصل،
+    إلا إذا طُلب standalone=True (للكتابات الجانبية التي لا يجب أن تُفشل الوحدة).
+    """
+    uow = None if standalone else getattr(_local, 'uow', None)
+    if uow is not None:
+        if uow.pooled is None:
+            uow.pooled = _borrow_connection()
+        conn = uow.pooled.conn
+        # نقطة حفظ تحمي كتابات الكتل السابقة في نفس المعاملة إذا فشلت هذه الكتلة
+        savepoint = None
+        if uow.in_transaction:
+            uow.savepoints += 1
+            savepoint = f"uow_{uow.savepoints}"
+            with conn.cursor() as savepoint_cursor:
+                savepoint_cursor.execute(f"SAVEPOINT {savepoint}")
+        uow.in_transaction = True
+        registered = len(uow.after_commit)
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        except Exception as e:
+            # تراجع عن هذه الكتلة فقط (ودوال ما بعد الـ commit التي سجلتها)
+            del uow.after_commit[registered:]
+            _rollback_block(uow, conn, savepoint)
+            logger.error(f"❌ خطأ في قاعدة البيانات (تم التراجع عن هذه الكتلة): {e}")
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        return
     
+    pooled = _borrow_connection()
+    conn = pooled.conn
+    broken = False
+    cursor = None
+    if getattr(_local, 'pending', None) is None:
+        _local.pending = []
+    after_commit: List[Callable[[], object]] = []
+    _local.pending.append(after_commit)
+    committed = False
     try:
         cursor = conn.cursor()
         yield cursor
         conn.commit()
+        committed = True
     except Exception as e:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True
         logger.error(f"❌ خطأ في قاعدة البيانات: {e}")
         raise
     finally:
-        cursor.close()
-        conn.close()
+        if _local.pending and _local.pending[-1] is after_commit:
+            _local.pending.pop()
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                broken = True
+        _return_connection(pooled, broken)
+    if committed:
+        _run_after_commit(after_commit)
 
 
 def check_database() -> bool:
@@ -63,8 +265,12 @@ def init_database():
             
             existing_tables = [row[0] for row in cursor.fetchall()]
             logger.info(f"✅ جداول موجودة: {existing_tables}")
-            
-            return len(existing_tables) >= 3
+        
+        # التحقق من الفهارس المطلوبة (تحذير فقط - الإنشاء عبر python -m app.database.migrate)
+        from app.database.migrate import check_required_indexes
+        check_required_indexes()
+        
+        return len(existing_tables) >= 3
             
     except Exception as e:
         logger.error(f"❌ خطأ في تهيئة قاعدة البيانات: {e}")
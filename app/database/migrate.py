@@ -0,0 +1,303 @@
+"""
+نظام ترحيل مخطط قاعدة البيانات بالإصدارات
+الاستخدام:
+    python -m app.database.migrate            # تطبيق جميع الترحيلات المعلقة
+    python -m app.database.migrate --status   # عرض الترحيلات المطبقة والمعلقة
+    python -m app.database.migrate --check    # فحص الفهارس المطلوبة فقط
+
+كل ترحيل قائمة أوامر متكررة الأمان (IF NOT EXISTS) تُنفذ بوضع autocommit،
+والفهارس تُبنى بـ CONCURRENTLY حتى لا تُقفل الجداول أثناء عمل البوت.
+"""
+import os
+import sys
+import logging
+import argparse
+from functools import partial
+from typing import Callable, List, Optional, Tuple, Union
+
+from app.database.connection import get_db_connection, get_db_cursor
+from app.database.schema import (
+    FULLTEXT_SEARCH_DDL,
+    FULLTEXT_SEARCH_INDEX_DDL,
+    TRIGRAM_SEARCH_DDL,
+    KEYSET_INDEX_DDL,
+    CATEGORY_CLOSURE_DDL,
+    backfill_search_vectors,
+)
+
+logger = logging.getLogger(__name__)
+
+# مفتاح قفل استشاري يمنع تشغيل أكثر من عملية ترحيل في نفس الوقت
+MIGRATION_LOCK_KEY = 740520
+
+# فهارس الاستعلامات الساخنة التي لا يغطيها فهرس آخر
+HOT_QUERY_INDEX_DDL: List[str] = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_history_user_watched
+    ON user_history (user_id, last_watched DESC)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_history_last_watched
+    ON user_history (last_watched)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_favorites_user_video
+    ON user_favorites (user_id, video_id)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_favorites_user_added
+    ON user_favorites (user_id, added_date DESC)
+    """,
+]
+
+# آخر ظهور للمستخدم (يُكتب على دفعات من app.services.last_seen)
+USER_LAST_SEEN_DDL: List[str] = [
+    "ALTER TABLE bot_users ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP",
+]
+
+# أحداث المشاهدة (إلحاق فقط) ولقطات ترتيب الرائج (app.services.trending)
+TRENDING_DDL: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS video_view_events (
+        video_id INTEGER NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        views INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_video_view_events_bucket
+    ON video_view_events (bucket)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trending_snapshots (
+        video_id INTEGER PRIMARY KEY,
+        score DOUBLE PRECISION NOT NULL,
+        taken_at TIMESTAMP NOT NULL
+    )
+    """,
+]
+
+# حالات المحادثة المشتركة بين العمليات (app.utils.state_store، STATE_BACKEND=postgres)
+# UNLOGGED: بلا WAL لأن الحالات مؤقتة ويمكن فقدها عند تعطل الخادم
+CONVERSATION_STATES_DDL: List[str] = [
+    """
+    CREATE UNLOGGED TABLE IF NOT EXISTS conversation_states (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state JSONB NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL,
+        expires_at TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (namespace, key)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_conversation_states_expires
+    ON conversation_states (namespace, expires_at)
+    """,
+]
+
+Step = Union[str, Callable[[], object]]
+
+# (الإصدار، الاسم، الخطوات) - لا تُعدل ترحيلاً منشوراً، أضف إصداراً جديداً
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'keyset_and_hot_query_indexes', KEYSET_INDEX_DDL + HOT_QUERY_INDEX_DDL),
+    (2, 'fulltext_search', FULLTEXT_SEARCH_DDL + [partial(backfill_search_vectors, raise_errors=True)]
+        + FULLTEXT_SEARCH_INDEX_DDL),
+    (3, 'trigram_search', TRIGRAM_SEARCH_DDL),
+    (4, 'bot_users_last_seen', USER_LAST_SEEN_DDL),
+    (5, 'category_closure', CATEGORY_CLOSURE_DDL),
+    (6, 'view_events_and_trending', TRENDING_DDL),
+    (7, 'conversation_states', CONVERSATION_STATES_DDL),
+]
+
+# ترحيلات أوضاع البحث تُطبق فقط عند تفعيل الوضع (SEARCH_MODE)، وتبقى معلقة بدونه
+# حتى لا يمنع فشلها (مثل عدم توفر امتداد pg_trgm) تطبيق الترحيلات التالية
+SEARCH_MODE_MIGRATIONS = {
+    3: 'trigram',
+}
+
+# الفهارس التي يجب أن تكون موجودة وصالحة (تُفحص عند بدء التشغيل)
+REQUIRED_INDEXES: List[str] = [
+    'idx_video_archive_category_rank',       # video_archive(category_id, view_count, upload_date)
+    'idx_video_archive_upload_date_id',      # video_archive(upload_date)
+    'idx_categories_parent_name',            # categories(parent_id, name)
+    'idx_user_history_user_watched',         # user_history(user_id, last_watched)
+    'idx_user_history_last_watched',         # user_history(last_watched) للتنظيف
+    'idx_user_favorites_user_video',         # user_favorites(user_id, video_id)
+    'category_closure_pkey',                 # category_closure(ancestor_id, descendant_id)
+    'idx_video_view_events_bucket',          # video_view_events(bucket) للاستعادة والتنظيف
+]
+
+# فهارس أوضاع البحث تُطلب فقط عند تفعيل الوضع
+SEARCH_MODE_INDEXES = {
+    'fts': ['idx_video_archive_search_vector'],
+    'trigram': [
+        'idx_video_archive_title_trgm',
+        'idx_video_archive_caption_trgm',
+        'idx_video_archive_file_name_trgm',
+    ],
+}
+
+
+def required_indexes() -> List[str]:
+    """قائمة الفهارس المطلوبة حسب الإعدادات الحالية"""
+    return REQUIRED_INDEXES + SEARCH_MODE_INDEXES.get(os.getenv('SEARCH_MODE', 'ilike'), [])
+
+
+def migration_enabled(version: int) -> bool:
+    """هل الترحيل مطلوب حسب الإعدادات الحالية؟"""
+    mode = SEARCH_MODE_MIGRATIONS.get(version)
+    return mode is None or mode == os.getenv('SEARCH_MODE', 'ilike')
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def _applied_versions(cursor) -> List[int]:
+    cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _managed_indexes() -> List[str]:
+    """أسماء جميع الفهارس التي تنشئها الترحيلات (مستخرجة من أوامر DDL)"""
+    names = []
+    for _, _, steps in MIGRATIONS:
+        for step in steps:
+            if isinstance(step, str) and 'CREATE INDEX' in step:
+                names.append(step.split('IF NOT EXISTS', 1)[1].split()[0])
+    return names
+
+
+def _drop_invalid_indexes(cursor):
+    """حذف الفهارس غير الصالحة (بقايا CREATE INDEX CONCURRENTLY فاشل) حتى يُعاد بناؤها"""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND NOT i.indisvalid AND c.relname = ANY(%s)
+    """, (_managed_indexes(),))
+    for (index_name,) in cursor.fetchall():
+        logger.warning(f"⚠️ حذف فهرس غير صالح لإعادة بنائه: {index_name}")
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+
+def run_migrations(target: Optional[int] = None) -> bool:
+    """تطبيق الترحيلات المعلقة بالترتيب حتى الإصدار target (أو الأحدث)"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            try:
+                _ensure_migrations_table(cursor)
+                _drop_invalid_indexes(cursor)
+                applied = set(_applied_versions(cursor))
+
+                for version, name, steps in MIGRATIONS:
+                    if version in applied or (target is not None and version > target):
+                        continue
+                    if not migration_enabled(version):
+                        logger.info(f"⏭️ تخطي الترحيل {version}: {name} (وضع البحث غير مفعل)")
+                        continue
+
+                    logger.info(f"🔄 تطبيق الترحيل {version}: {name}")
+                    for step in steps:
+                        if callable(step):
+                            step()
+                        else:
+                            cursor.execute(step)
+
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                        (version, name)
+                    )
+                    logger.info(f"✅ تم تطبيق الترحيل {version}: {name}")
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        return True
+    except Exception as e:
+        logger.error(f"❌ خطأ في ترحيل قاعدة البيانات: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def migration_status() -> List[Tuple[int, str, bool]]:
+    """حالة كل ترحيل: (الإصدار، الاسم، مطبق؟)"""
+    try:
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+            applied = set(_applied_versions(cursor)) if cursor.fetchone()[0] else set()
+    except Exception as e:
+        logger.error(f"❌ خطأ في قراءة حالة الترحيلات: {e}")
+        applied = set()
+
+    return [(version, name, version in applied) for version, name, _ in MIGRATIONS]
+
+
+def check_required_indexes() -> List[str]:
+    """إرجاع أسماء الفهارس المطلوبة المفقودة أو غير الصالحة (وتسجيل تحذير بها)"""
+    expected = required_indexes()
+    try:
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = ANY(%s) AND i.indisvalid
+            """, (expected,))
+            present = {row[0] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"❌ خطأ في فحص الفهارس: {e}")
+        return []
+
+    missing = [name for name in expected if name not in present]
+    if missing:
+        logger.warning(
+            f"⚠️ فهارس مفقودة ({len(missing)}): {', '.join(missing)} - "
+            f"شغّل: python -m app.database.migrate"
+        )
+    else:
+        logger.info("✅ جميع الفهارس المطلوبة موجودة")
+    return missing
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m app.database.migrate',
+                                     description='ترحيل مخطط قاعدة البيانات')
+    parser.add_argument('--status', action='store_true', help='عرض حالة الترحيلات')
+    parser.add_argument('--check', action='store_true', help='فحص الفهارس المطلوبة فقط')
+    parser.add_argument('--target', type=int, default=None, help='التوقف عند هذا الإصدار')
+    args = parser.parse_args(argv)
+
+    if args.status:
+        for version, name, applied in migration_status():
+            icon = '✅' if applied else ('⏳' if migration_enabled(version) else '⏭️')
+            print(f"{icon} {version:>3}  {name}")
+        return 0
+
+    if args.check:
+        return 1 if check_required_indexes() else 0
+
+    if not run_migrations(args.target):
+        return 1
+    return 1 if check_required_indexes() else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,292 @@
+"""
+تجمع اتصالات قاعدة البيانات (Connection Pool) آمن للاستخدام من عدة خيوط
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """انتهت مهلة انتظار اتصال متاح من التجمع"""
+
+
+class _PooledConnection:
+    """غلاف للاتصال يحفظ وقت الإنشاء وآخر استخدام"""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """تجمع اتصالات محدود الحجم مع فحص صحة عند الاستعارة وعمر أقصى للاتصال"""
+
+    def __init__(self, connect: Callable, min_size: int = 1, max_size: int = 10,
+                 max_age: float = 1800.0, timeout: float = 10.0,
+                 health_check_idle: float = 30.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("إعدادات تجمع الاتصالات غير صالحة")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.timeout = timeout
+        # لا نفحص الاتصال إلا إذا بقي خاملاً أكثر من هذه المدة (ثوانٍ)
+        self.health_check_idle = health_check_idle
+
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+
+        # عدادات الإحصائيات
+        self._started_at = time.monotonic()
+        self._connects = 0
+        self._connect_failures = 0
+        self._discarded = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    # === الاستعارة والإرجاع ===
+
+    def getconn(self):
+        """استعارة اتصال من التجمع (ينتظر حتى timeout إذا كان التجمع ممتلئاً)"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("تجمع الاتصالات مغلق")
+
+                pooled = None
+                must_connect = False
+                while True:
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._in_use < self.max_size:
+                        must_connect = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"لا يوجد اتصال متاح خلال {self.timeout} ثانية "
+                            f"(المستخدم: {self._in_use}/{self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+                # حجز المكان قبل الخروج من القفل حتى لا يتجاوز العدد الحد الأقصى
+                self._in_use += 1
+
+            if must_connect:
+                try:
+                    pooled = self._new_connection()
+                except Exception:
+                    self._release_slot()
+                    raise
+            elif not self._is_usable(pooled):
+                self._discard(pooled)
+                self._release_slot()
+                continue
+
+            self._record_checkout(time.monotonic() - started, waited)
+            pooled.last_used = time.monotonic()
+            return pooled
+
+    def putconn(self, pooled, discard: bool = False):
+        """إرجاع اتصال للتجمع أو التخلص منه إذا كان تالفاً أو قديماً"""
+        conn = pooled.conn
+        if not discard:
+            try:
+                if conn.closed:
+                    discard = True
+                elif conn.status != psycopg2.extensions.STATUS_READY:
+                    # معاملة مفتوحة لم تُغلق - نلغيها قبل إعادة الاستخدام
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        if not discard and self._expired(pooled):
+            discard = True
+
+        if discard:
+            self._discard(pooled)
+            self._release_slot()
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    # === إدارة دورة الحياة ===
+
+    def fill(self):
+        """فتح الحد الأدنى من الاتصالات مسبقاً"""
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) + self._in_use >= self.min_size:
+                    return
+                self._in_use += 1
+            try:
+                pooled = self._new_connection()
+            except Exception as e:
+                self._release_slot()
+                logger.warning(f"⚠️ تعذر تجهيز اتصالات التجمع مسبقاً: {e}")
+                return
+            with self._cond:
+                self._in_use -= 1
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def close(self):
+        """إغلاق جميع الاتصالات الخاملة ومنع الاستعارة الجديدة"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled.conn)
+
+    def stats(self) -> Dict:
+        """إحصائيات التجمع لتحديد الحجم المناسب"""
+        with self._cond:
+            uptime = max(time.monotonic() - self._started_at, 1e-9)
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_avg_ms': round(self._wait_time_total / max(self._checkouts, 1) * 1000, 2),
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 2),
+                'connects': self._connects,
+                'connect_failures': self._connect_failures,
+                'connects_per_sec': round(self._connects / uptime, 4),
+                'discarded': self._discarded,
+            }
+
+    # === دوال مساعدة ===
+
+    def _new_connection(self) -> _PooledConnection:
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._connect_failures += 1
+            raise
+        with self._cond:
+            self._connects += 1
+        return _PooledConnection(conn)
+
+    def _expired(self, pooled) -> bool:
+        return self.max_age > 0 and time.monotonic() - pooled.created_at > self.max_age
+
+    def _is_usable(self, pooled) -> bool:
+        """فحص صحة الاتصال عند الاستعارة"""
+        conn = pooled.conn
+        if conn.closed or self._expired(pooled):
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ اتصال تالف في التجمع تم استبعاده: {e}")
+            return False
+
+    def _discard(self, pooled):
+        self._close_quietly(pooled.conn)
+        with self._cond:
+            self._discarded += 1
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _record_checkout(self, wait_time: float, waited: bool):
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time_total += wait_time
+            if wait_time > self._wait_time_max:
+                self._wait_time_max = wait_time
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """الحصول على تجمع الاتصالات المشترك (يُنشأ عند أول استخدام)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                import main
+                database_url = main.DATABASE_URL
+                _pool = ConnectionPool(
+                    connect=lambda: psycopg2.connect(database_url),
+                    min_size=int(os.getenv('DB_POOL_MIN', '1')),
+                    max_size=int(os.getenv('DB_POOL_MAX', '10')),
+                    max_age=float(os.getenv('DB_POOL_MAX_AGE', '1800')),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                    health_check_idle=float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', '30')),
+                )
+                _pool.fill()
+                logger.info(f"✅ تم إنشاء تجمع الاتصالات ({_pool.min_size}-{_pool.max_size})")
+    return _pool
+
+
+def get_pool_stats() -> Dict:
+    """إحصائيات تجمع الاتصالات (فارغة إذا لم يُنشأ بعد)"""
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+
+def close_pool():
+    """إغلاق تجمع الاتصالات عند إيقاف البوت"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+            logger.info("✅ تم إغلاق تجمع الاتصالات")
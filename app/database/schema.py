@@ -0,0 +1,293 @@
+"""
+تعريفات مخطط قاعدة البيانات الإضافية (البحث النصي الكامل والتقريبي) وأوامر الترحيل
+الاستخدام:
+    python -m app.database.schema fts        # إنشاء عمود البحث والمشغل ثم التعبئة والفهرس
+    python -m app.database.schema backfill   # تعبئة عمود البحث للصفوف القديمة فقط
+    python -m app.database.schema trigram    # تفعيل pg_trgm وفهارس البحث التقريبي
+    python -m app.database.schema keyset     # الفهارس المركبة للتصفح بالمفاتيح
+    python -m app.database.schema closure    # جدول إغلاق شجرة التصنيفات (استعلامات الشجرة الفرعية)
+يُفضل تطبيق هذه التعريفات عبر نظام الترحيل: python -m app.database.migrate
+"""
+import os
+import sys
+import time
+import logging
+from typing import List
+
+from app.database.connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# إعدادات البحث النصي المضمنة في PostgreSQL - القيمة تُدمج في نص DDL والاستعلامات
+# فلا يُقبل إلا اسم من هذه القائمة
+TS_CONFIGS = frozenset({
+    'simple', 'arabic', 'armenian', 'basque', 'catalan', 'danish', 'dutch', 'english',
+    'finnish', 'french', 'german', 'greek', 'hindi', 'hungarian', 'indonesian', 'irish',
+    'italian', 'lithuanian', 'nepali', 'norwegian', 'portuguese', 'romanian', 'russian',
+    'serbian', 'spanish', 'swedish', 'tamil', 'turkish', 'yiddish',
+})
+
+# إعداد البحث النصي: 'simple' يناسب المحتوى المختلط عربي/إنجليزي بدون تجذير
+SEARCH_TS_CONFIG = os.getenv('SEARCH_TS_CONFIG', 'simple').strip().lower()
+if SEARCH_TS_CONFIG not in TS_CONFIGS:
+    logger.error(f"❌ إعداد بحث نصي غير مدعوم '{SEARCH_TS_CONFIG}' - سيتم استخدام 'simple'")
+    SEARCH_TS_CONFIG = 'simple'
+
+# دالة بناء متجه البحث: العنوان (A)، اسم المسلسل واسم الملف (B)، الوصف (C)، باقي البيانات (D)
+FULLTEXT_SEARCH_DDL: List[str] = [
+    "ALTER TABLE video_archive ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    f"""
+    CREATE OR REPLACE FUNCTION video_archive_search_vector(
+        p_title text, p_caption text, p_file_name text, p_metadata jsonb
+    ) RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+        SELECT
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(p_title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(p_metadata->>'series_name', '')), 'B') ||
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}',
+                regexp_replace(coalesce(p_file_name, ''), '[._\\-\\[\\]()]+', ' ', 'g')), 'B') ||
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(p_caption, '')), 'C') ||
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}',
+                concat_ws(' ', p_metadata->>'production', p_metadata->>'status',
+                          p_metadata->>'quality_resolution')), 'D')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION video_archive_search_vector_trigger() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := video_archive_search_vector(
+            NEW.title, NEW.caption, NEW.file_name, NEW.metadata::jsonb
+        );
+        RETURN NEW;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS trg_video_archive_search_vector ON video_archive",
+    """
+    CREATE TRIGGER trg_video_archive_search_vector
+    BEFORE INSERT OR UPDATE OF title, caption, file_name, metadata ON video_archive
+    FOR EACH ROW EXECUTE FUNCTION video_archive_search_vector_trigger()
+    """,
+]
+
+# يُبنى بعد التعبئة لأن بناء GIN على جدول ممتلئ أسرع من تحديثه صفاً صفاً
+FULLTEXT_SEARCH_INDEX_DDL: List[str] = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_video_archive_search_vector
+    ON video_archive USING gin (search_vector)
+    """,
+]
+
+
+# توحيد الحروف العربية المتشابهة في البحث التقريبي: أ/إ/آ/ٱ -> ا، ة -> ه، ى -> ي
+# الحروف الزائدة في المصدر (التطويل والتشكيل) تُحذف
+ARABIC_NORMALIZE_FROM = 'أإآٱةى' + 'ـ' + ''.join(chr(c) for c in range(0x064B, 0x0653))
+ARABIC_NORMALIZE_TO = 'ااااهي'
+
+_ARABIC_TRANSLATION = str.maketrans(
+    ARABIC_NORMALIZE_FROM[:len(ARABIC_NORMALIZE_TO)],
+    ARABIC_NORMALIZE_TO,
+    ARABIC_NORMALIZE_FROM[len(ARABIC_NORMALIZE_TO):]
+)
+
+
+def normalize_search_text(text: str) -> str:
+    """نفس توحيد archive_normalize() في قاعدة البيانات لكن في بايثون (لنص البحث)"""
+    return (text or '').lower().translate(_ARABIC_TRANSLATION).strip()
+
+
+TRIGRAM_SEARCH_DDL: List[str] = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""
+    CREATE OR REPLACE FUNCTION archive_normalize(p_text text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT translate(lower(coalesce(p_text, '')), '{ARABIC_NORMALIZE_FROM}', '{ARABIC_NORMALIZE_TO}')
+    $$
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_video_archive_title_trgm
+    ON video_archive USING gin (archive_normalize(title) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_video_archive_caption_trgm
+    ON video_archive USING gin (archive_normalize(caption) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_video_archive_file_name_trgm
+    ON video_archive USING gin (archive_normalize(file_name) gin_trgm_ops)
+    """,
+]
+
+
+# فهارس التصفح بالمفاتيح: نفس ترتيب ORDER BY حتى يُقرأ كل صفحة مباشرة من الفهرس
+KEYSET_INDEX_DDL: List[str] = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_video_archive_category_rank
+    ON video_archive (category_id, view_count DESC, upload_date DESC, id DESC)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_video_archive_upload_date_id
+    ON video_archive (upload_date DESC, id DESC)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_categories_parent_name
+    ON categories (parent_id, name, id)
+    """,
+]
+
+
+# إعادة بناء جدول الإغلاق كاملاً. القفل EXCLUSIVE يُسلسل عمليات الإعادة المتزامنة
+# (وإلا تتداخل DELETE/INSERT من معاملتين وتفشل على category_closure_pkey) مع السماح بالقراءة
+REFRESH_CATEGORY_CLOSURE_DDL = """
+    CREATE OR REPLACE FUNCTION refresh_category_closure() RETURNS void
+    LANGUAGE sql AS $$
+        LOCK TABLE category_closure IN EXCLUSIVE MODE;
+        DELETE FROM category_closure;
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT t.ancestor_id, c.id, t.depth + 1
+            FROM tree t
+            JOIN categories c ON c.parent_id = t.descendant_id
+            WHERE t.depth < 32 AND c.id <> t.ancestor_id
+        )
+        SELECT DISTINCT ON (ancestor_id, descendant_id) ancestor_id, descendant_id, depth
+        FROM tree
+        ORDER BY ancestor_id, descendant_id, depth;
+    $$
+    """
+
+# جدول الإغلاق: صف لكل (سلف، حفيد) بما فيها التصنيف نفسه (depth = 0)
+# يُعاد بناؤه كاملاً بمشغل على مستوى الأمر عند أي تعديل في هيكل التصنيفات (الجدول صغير)
+CATEGORY_CLOSURE_DDL: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS category_closure (
+        ancestor_id INTEGER NOT NULL,
+        descendant_id INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (ancestor_id, descendant_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_category_closure_descendant
+    ON category_closure (descendant_id)
+    """,
+    REFRESH_CATEGORY_CLOSURE_DDL,
+    """
+    CREATE OR REPLACE FUNCTION category_closure_trigger() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM refresh_category_closure();
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS trg_categories_closure ON categories",
+    """
+    CREATE TRIGGER trg_categories_closure
+    AFTER INSERT OR DELETE OR UPDATE OF parent_id ON categories
+    FOR EACH STATEMENT EXECUTE FUNCTION category_closure_trigger()
+    """,
+    "SELECT refresh_category_closure()",
+]
+
+
+def apply_ddl(statements: List[str]) -> bool:
+    """تنفيذ أوامر DDL بوضع autocommit (مطلوب لـ CREATE INDEX CONCURRENTLY)"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        return True
+    except Exception as e:
+        logger.error(f"❌ خطأ في تنفيذ تعديلات المخطط: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def backfill_search_vectors(batch_size: int = 2000, raise_errors: bool = False) -> int:
+    """
+    تعبئة عمود search_vector للصفوف القديمة على دفعات (commit بعد كل دفعة).
+    raise_errors=True يرفع الخطأ بدلاً من إرجاع العدد الجزئي (خطوة الترحيل حتى لا يُسجل
+    الترحيل كمطبق بعد تعبئة فاشلة).
+    """
+    conn = get_db_connection()
+    if not conn:
+        if raise_errors:
+            raise Exception("فشل الاتصال بقاعدة البيانات لتعبئة عمود البحث")
+        return 0
+
+    total = 0
+    try:
+        while True:
+            started = time.monotonic()
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE video_archive v
+                    SET search_vector = video_archive_search_vector(
+                        v.title, v.caption, v.file_name, v.metadata::jsonb
+                    )
+                    WHERE v.id IN (
+                        SELECT id FROM video_archive
+                        WHERE search_vector IS NULL
+                        ORDER BY id
+                        LIMIT %s
+                    )
+                """, (batch_size,))
+                updated = cursor.rowcount
+            conn.commit()
+
+            if updated <= 0:
+                break
+            total += updated
+            logger.info(f"🔄 تمت تعبئة {total} صف ({updated} في {time.monotonic() - started:.2f}s)")
+
+        logger.info(f"✅ اكتملت تعبئة عمود البحث: {total} صف")
+        return total
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ خطأ في تعبئة عمود البحث: {e}")
+        if raise_errors:
+            raise
+        return total
+    finally:
+        conn.close()
+
+
+def setup_fulltext_search() -> bool:
+    """إنشاء البحث النصي الكامل: العمود والمشغل، ثم التعبئة، ثم فهرس GIN"""
+    if not apply_ddl(FULLTEXT_SEARCH_DDL):
+        return False
+    backfill_search_vectors()
+    return apply_ddl(FULLTEXT_SEARCH_INDEX_DDL)
+
+
+def main(argv: List[str]) -> int:
+    commands = {
+        'fts': setup_fulltext_search,
+        'backfill': lambda: backfill_search_vectors() >= 0,
+        'trigram': lambda: apply_ddl(TRIGRAM_SEARCH_DDL),
+        'keyset': lambda: apply_ddl(KEYSET_INDEX_DDL),
+        'closure': lambda: apply_ddl(CATEGORY_CLOSURE_DDL),
+    }
+
+    if len(argv) != 1 or argv[0] not in commands:
+        print(f"الاستخدام: python -m app.database.schema [{'|'.join(commands)}]")
+        return 2
+
+    return 0 if commands[argv[0]]() else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    sys.exit(main(sys.argv[1:]))
@@ -5,10 +5,9 @@ import logging
 from datetime import datetime
 from telebot import types
 
-logger = logging.getLogger(__name__)
+from app.utils.pagination import BEFORE, parse_page_callback
 
-# حالة المشرفين للعمليات التفاعلية
-admin_states = {}
+logger = logging.getLogger(__name__)
 
 
 def admin_command(bot, message):
@@ -100,6 +99,9 @@ def handle_admin_callback(bot, call):
         elif data == "admin_videos":
             handle_admin_videos(bot, call)
             
+        elif data == "admin_videos_recent" or data.startswith("admin_videos_page_"):
+            handle_admin_video_list(bot, call)
+            
         elif data == "admin_categories":
             handle_admin_categories(bot, call)
             
@@ -156,6 +158,48 @@ def handle_admin_videos(bot, call):
                          reply_markup=markup, parse_mode='Markdown')
 
 
+def handle_admin_video_list(bot, call):
+    """قائمة الفيديوهات للإدارة (الأحدث أولاً) مع التصفح بالمفاتيح"""
+    from app.admin.admin_service import AdminService
+    
+    per_page = 10
+    try:
+        page, cursor = 1, None
+        if call.data.startswith("admin_videos_page_"):
+            page, cursor = parse_page_callback(call.data.replace("admin_videos_page_", ""))
+        
+        # الرجوع للخلف يعني وجود صفحة تالية، وإلا يُطلب صف إضافي لمعرفة ذلك
+        backwards = bool(cursor) and cursor.startswith(BEFORE)
+        videos = AdminService.search_admin_videos(limit=per_page if backwards else per_page + 1, cursor=cursor)
+        has_next = backwards or len(videos) > per_page
+        videos = videos[:per_page]
+    except Exception as e:
+        logger.error(f"❌ خطأ في الحصول على قائمة الفيديوهات: {e}")
+        page, videos, has_next = 1, [], False
+    
+    if not videos:
+        text = "🎬 إدارة الفيديوهات\n\n❌ لا توجد فيديوهات في هذه الصفحة"
+    else:
+        text = f"🎬 أحدث الفيديوهات (صفحة {page})\n\n"
+        for video in videos:
+            category_name = video.category_name or "غير مصنف"
+            text += f"#{video.id} {video.display_title[:40]}\n   👁️ {video.view_count or 0} | 📂 {category_name}\n"
+    
+    markup = types.InlineKeyboardMarkup()
+    prev_cursor, next_cursor = AdminService.admin_page_cursors(videos)
+    nav_buttons = []
+    if page > 1:
+        prev_data = "admin_videos_recent" if page == 2 else f"admin_videos_page_{page-1}_{prev_cursor}"
+        nav_buttons.append(types.InlineKeyboardButton("⬅️ السابق", callback_data=prev_data))
+    if has_next and next_cursor:
+        nav_buttons.append(types.InlineKeyboardButton("➡️ التالي", callback_data=f"admin_videos_page_{page+1}_{next_cursor}"))
+    if nav_buttons:
+        markup.row(*nav_buttons)
+    markup.add(types.InlineKeyboardButton("🔙 إدارة الفيديوهات", callback_data="admin_videos"))
+    
+    bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+
+
 def handle_admin_categories(bot, call):
     """إدارة التصنيفات"""
     try:
@@ -168,8 +212,8 @@ def handle_admin_categories(bot, call):
     text = f"📚 **إدارة التصنيفات** ({len(categories)} تصنيف)\n\n"
     
     for i, category in enumerate(categories[:10], 1):
-        video_count = category[4] if len(category) > 4 else 0
-        text += f"**{i}.** {category[1]} ({video_count} فيديو)\n"
+        video_count = category.video_count
+        text += f"**{i}.** {category.name} ({video_count} فيديو)\n"
     
     if len(categories) > 10:
         text += f"\n... و {len(categories) - 10} تصنيف آخر"
@@ -0,0 +1,158 @@
+"""
+معالجات غير متزامنة للمسارات الأكثر استخداماً في الوضع غير المتزامن (BOT_RUNTIME=async):
+قوائم الأشهر/الأحدث/الرائج والتصنيفات وتفاصيل الفيديو والمفضلة.
+تستخدم نفس بناء النصوص والأزرار في المعالجات المتزامنة، وأي تحديث آخر
+(الأوامر والبحث وأزرار الإدارة والأرشفة) يُحال للمعالجات المتزامنة.
+"""
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+
+from app.handlers.callbacks import build_categories_page, build_video_list
+from app.handlers.video_handler import FAVORITE_REPLIES, build_video_keyboard, format_video_details
+from app.services.async_services import AsyncCategoryService, AsyncUserService, AsyncVideoService
+from app.services.category_service import CategoryService
+from app.services.user_service import FAVORITE_ADDED, FAVORITE_REMOVED, UserService
+from app.services.view_counter import view_counter
+from app.utils.pagination import parse_page_callback
+
+logger = logging.getLogger(__name__)
+
+
+async def safe_edit(bot, chat_id, message_id, text, markup=None):
+    """تحرير رسالة بأمان (أو إرسال رسالة جديدة إذا تعذر التحرير)"""
+    try:
+        await bot.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+    except Exception as e:
+        logger.error(f"❌ edit_message_text failed: {e}")
+        try:
+            await bot.send_message(chat_id, text, reply_markup=markup)
+        except Exception as e2:
+            logger.error(f"❌ send_message fallback failed: {e2}")
+
+
+async def _show_video_list(bot, call, loader, header: str, empty_text: str, show_views: bool = True):
+    videos = await loader(10)
+    if not videos:
+        await safe_edit(bot, call.message.chat.id, call.message.message_id, empty_text)
+    else:
+        text, markup = build_video_list(header, videos, show_views)
+        await safe_edit(bot, call.message.chat.id, call.message.message_id, text, markup)
+    await bot.answer_callback_query(call.id)
+
+
+async def handle_popular_videos(bot, call, admin_ids):
+    await _show_video_list(bot, call, AsyncVideoService.get_popular_videos,
+                           "🔥 الفيديوهات الأشهر", "❌ لا توجد فيديوهات شائعة")
+
+
+async def handle_recent_videos(bot, call, admin_ids):
+    await _show_video_list(bot, call, AsyncVideoService.get_recent_videos,
+                           "🆕 أحدث الفيديوهات", "❌ لا توجد فيديوهات حديثة", show_views=False)
+
+
+async def handle_trending_videos(bot, call, admin_ids):
+    await _show_video_list(bot, call, AsyncVideoService.get_trending_videos,
+                           "🚀 الرائج الآن", "❌ لا توجد فيديوهات رائجة حالياً")
+
+
+async def handle_categories_menu(bot, call, admin_ids):
+    """قائمة التصنيفات الرئيسية مع التصفح"""
+    page, cursor = 1, None
+    if call.data.startswith("categories_page_"):
+        page, cursor = parse_page_callback(call.data.replace("categories_page_", ""))
+
+    per_page = 10
+    categories = await AsyncCategoryService.get_categories(page=page, per_page=per_page, cursor=cursor)
+    total_categories = await AsyncCategoryService.get_total_categories_count()
+
+    if not categories:
+        await safe_edit(bot, call.message.chat.id, call.message.message_id, "❌ لا توجد تصنيفات متاحة")
+    else:
+        prev_cursor, next_cursor = CategoryService.category_page_cursors(categories)
+        text, markup = build_categories_page(categories, total_categories, page, per_page,
+                                             prev_cursor, next_cursor)
+        await safe_edit(bot, call.message.chat.id, call.message.message_id, text, markup)
+    await bot.answer_callback_query(call.id)
+
+
+async def handle_video_details(bot, call, admin_ids):
+    """تفاصيل الفيديو مع تسجيل المشاهدة في مخازن الذاكرة"""
+    user_id = call.from_user.id
+    video_id = int(call.data.replace("video_", ""))
+
+    video = await AsyncVideoService.get_video_by_id(video_id)
+    if not video:
+        await bot.answer_callback_query(call.id, "❌ الفيديو غير موجود")
+        return
+
+    AsyncVideoService.update_view_count(video_id, video)
+    UserService.add_to_history(user_id, video_id)
+
+    is_admin = user_id in admin_ids
+    view_count = (video.view_count or 0) + view_counter.pending_views(video_id)
+    text = format_video_details(video, view_count, is_admin)
+    is_fav = await AsyncUserService.is_favorite(user_id, video_id)
+    markup = build_video_keyboard(video_id, is_fav, is_admin)
+    await safe_edit(bot, call.message.chat.id, call.message.message_id, text, markup)
+    await bot.answer_callback_query(call.id)
+
+
+async def handle_toggle_favorite(bot, call, admin_ids):
+    """إضافة/إزالة من المفضلة مع تبديل زر المفضلة فقط"""
+    user_id = call.from_user.id
+    video_id = int(call.data.replace("favorite_", ""))
+
+    result = await AsyncUserService.toggle_favorite(user_id, video_id)
+    reply, show_alert = FAVORITE_REPLIES[result]
+    await bot.answer_callback_query(call.id, reply, show_alert=show_alert)
+    if result not in (FAVORITE_ADDED, FAVORITE_REMOVED):
+        return
+
+    markup = build_video_keyboard(video_id, result == FAVORITE_ADDED, user_id in admin_ids)
+    try:
+        await bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
+    except Exception as e:
+        logger.error(f"❌ فشل تحديث زر المفضلة: {e}")
+
+
+_CALLBACK_ROUTES = {
+    "popular": handle_popular_videos,
+    "recent": handle_recent_videos,
+    "trending": handle_trending_videos,
+    "categories": handle_categories_menu,
+}
+
+_CALLBACK_PREFIXES = (
+    ("categories_page_", handle_categories_menu),
+    ("video_", handle_video_details),
+    ("favorite_", handle_toggle_favorite),
+)
+
+AsyncHandler = Callable[..., Awaitable[None]]
+
+
+def route_update(update) -> Optional[AsyncHandler]:
+    """المعالج غير المتزامن للتحديث، أو None ليُحال للمعالجات المتزامنة"""
+    call = update.callback_query
+    if call is None or not call.data or call.message is None:
+        return None
+    handler = _CALLBACK_ROUTES.get(call.data)
+    if handler is not None:
+        return handler
+    for prefix, handler in _CALLBACK_PREFIXES:
+        if call.data.startswith(prefix):
+            return handler
+    return None
+
+
+async def handle_update(bot, update, handler: AsyncHandler, admin_ids: Iterable[int]):
+    """تشغيل معالج غير متزامن مع نفس سلوك الأخطاء في المعالج المتزامن للأزرار"""
+    call = update.callback_query
+    try:
+        await handler(bot, call, admin_ids)
+    except Exception as e:
+        logger.error(f"❌ خطأ في معالج الأزرار غير المتزامن: {e}")
+        try:
+            await bot.answer_callback_query(call.id, "❌ حدث خطأ")
+        except Exception:
+            pass
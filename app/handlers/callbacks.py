@@ -3,11 +3,13 @@ import logging
 import math
 from datetime import datetime
 from telebot import types
+from app.utils.pagination import parse_page_callback
+from app.utils.state_store import create_state_store
 
 logger = logging.getLogger(__name__)
 
-# حالة المستخدمين للعمليات التفاعلية
-user_states = {}
+# حالة المستخدمين للعمليات التفاعلية (محدودة الحجم والصلاحية)
+user_states = create_state_store('user')
 
 
 def safe_edit(bot, chat_id, message_id, text, markup=None, allow_html=False):
@@ -64,8 +66,8 @@ def handle_callback_query(bot, call):
             handle_categories_menu(bot, call)
             
         elif data.startswith("categories_page_"):
-            page = int(data.replace("categories_page_", ""))
-            handle_categories_menu(bot, call, page)
+            page, cursor = parse_page_callback(data.replace("categories_page_", ""))
+            handle_categories_menu(bot, call, page, cursor)
             
         elif data == "favorites":
             handle_favorites_menu(bot, call, user_id)
@@ -79,6 +81,9 @@ def handle_callback_query(bot, call):
         elif data == "recent":
             handle_recent_videos(bot, call)
             
+        elif data == "trending":
+            handle_trending_videos(bot, call)
+            
         elif data == "stats":
             handle_stats_menu(bot, call)
             
@@ -94,8 +99,8 @@ def handle_callback_query(bot, call):
             if "_page_" in data:
                 parts = data.replace("category_", "").split("_page_")
                 category_id = int(parts[0])
-                page = int(parts[1])
-                handle_category_videos(bot, call, category_id, page)
+                page, cursor = parse_page_callback(parts[1])
+                handle_category_videos(bot, call, category_id, page, cursor)
             else:
                 category_id = int(data.replace("category_", ""))
                 handle_category_videos(bot, call, category_id)
@@ -156,56 +161,67 @@ def handle_search_menu(bot, call):
     safe_edit(bot, call.message.chat.id, call.message.message_id, search_text, markup)
 
 
-def handle_categories_menu(bot, call, page: int = 1):
+def build_categories_page(categories, total_categories: int, page: int, per_page: int,
+                          prev_cursor: str = None, next_cursor: str = None):
+    """نص وأزرار صفحة التصنيفات (مشتركة بين الوضعين المتزامن وغير المتزامن)"""
+    total_pages = max(1, math.ceil(total_categories / per_page))
+    
+    text = f"📚 التصنيفات المتاحة (صفحة {page}/{total_pages})\n\n"
+    text += "اختر التصنيف لتصفح محتواه:\n\n"
+    
+    markup = types.InlineKeyboardMarkup()
+    
+    for category in categories:
+        cat_name = category.name[:25] + "..." if len(category.name) > 25 else category.name
+        # العدد التراكمي (مع التصنيفات الفرعية) إن توفر
+        video_count = category.total_video_count
+        
+        display_text = f"📁 {cat_name}"
+        if video_count > 0:
+            display_text += f" ({video_count})"
+        
+        text += f"{display_text}\n"
+        btn = types.InlineKeyboardButton(display_text, callback_data=f"category_{category.id}")
+        markup.add(btn)
+    
+    nav_buttons = []
+    if page > 1:
+        prev_data = f"categories_page_{page-1}" if page == 2 else f"categories_page_{page-1}_{prev_cursor}"
+        nav_buttons.append(types.InlineKeyboardButton("⬅️ السابق", callback_data=prev_data))
+    if page < total_pages:
+        nav_buttons.append(types.InlineKeyboardButton("➡️ التالي", callback_data=f"categories_page_{page+1}_{next_cursor}"))
+    if nav_buttons:
+        markup.add(*nav_buttons)
+    
+    btn_back = types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu")
+    markup.add(btn_back)
+    return text, markup
+
+
+def handle_categories_menu(bot, call, page: int = 1, cursor: str = None):
     """معالج قائمة التصنيفات مع التصفح"""
     try:
         from app.services.category_service import CategoryService
         
         per_page = 10
-        categories = CategoryService.get_categories(include_counts=True, page=page, per_page=per_page)
+        categories = CategoryService.get_categories(include_counts=True, page=page, per_page=per_page,
+                                                    cursor=cursor)
         total_categories = CategoryService.get_total_categories_count()
         
         if not categories:
             safe_edit(bot, call.message.chat.id, call.message.message_id, "❌ لا توجد تصنيفات متاحة")
             return
         
-        total_pages = max(1, math.ceil(total_categories / per_page))
-        
-        text = f"📚 التصنيفات المتاحة (صفحة {page}/{total_pages})\n\n"
-        text += "اختر التصنيف لتصفح محتواه:\n\n"
-        
-        markup = types.InlineKeyboardMarkup()
-        
-        for category in categories:
-            cat_name = category[1][:25] + "..." if len(category[1]) > 25 else category[1]
-            video_count = category[4] if len(category) > 4 else 0
-            
-            display_text = f"📁 {cat_name}"
-            if video_count > 0:
-                display_text += f" ({video_count})"
-            
-            text += f"{display_text}\n"
-            btn = types.InlineKeyboardButton(display_text, callback_data=f"category_{category[0]}")
-            markup.add(btn)
-        
-        nav_buttons = []
-        if page > 1:
-            nav_buttons.append(types.InlineKeyboardButton("⬅️ السابق", callback_data=f"categories_page_{page-1}"))
-        if page < total_pages:
-            nav_buttons.append(types.InlineKeyboardButton("➡️ التالي", callback_data=f"categories_page_{page+1}"))
-        if nav_buttons:
-            markup.add(*nav_buttons)
-        
-        btn_back = types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu")
-        markup.add(btn_back)
-        
+        prev_cursor, next_cursor = CategoryService.category_page_cursors(categories)
+        text, markup = build_categories_page(categories, total_categories, page, per_page,
+                                             prev_cursor, next_cursor)
         safe_edit(bot, call.message.chat.id, call.message.message_id, text, markup)
     except Exception as e:
         logger.error(f"❌ خطأ في التصنيفات: {e}")
         safe_edit(bot, call.message.chat.id, call.message.message_id, "❌ حدث خطأ في عرض التصنيفات")
 
 
-def handle_category_videos(bot, call, category_id: int, page: int = 1):
+def handle_category_videos(bot, call, category_id: int, page: int = 1, cursor: str = None):
     """معالج فيديوهات التصنيف مع دعم التصنيفات الفرعية والتصفح"""
     try:
         from app.services.video_service import VideoService
@@ -217,7 +233,7 @@ def handle_category_videos(bot, call, category_id: int, page: int = 1):
             bot.answer_callback_query(call.id, "❌ التصنيف غير موجود")
             return
         
-        category_name = category[1]
+        category_name = category.name
         
         # جلب التصنيفات الفرعية
         subcategories = []
@@ -227,9 +243,13 @@ def handle_category_videos(bot, call, category_id: int, page: int = 1):
         except Exception as sc_err:
             logger.error(f"❌ خطأ في جلب التصنيفات الفرعية: {sc_err}")
         
-        # جلب الفيديوهات
-        videos = VideoService.get_videos_by_category(category_id, per_page, page)
-        total_videos = VideoService.get_category_videos_count(category_id)
+        # جلب الفيديوهات: التصنيف الأب يعرض فيديوهات شجرته الفرعية كاملة
+        if subcategories:
+            videos = VideoService.get_subtree_videos(category_id, per_page, page, cursor)
+            total_videos = VideoService.get_subtree_videos_count(category_id)
+        else:
+            videos = VideoService.get_videos_by_category(category_id, per_page, page, cursor)
+            total_videos = VideoService.get_category_videos_count(category_id)
         
         # التحقق من وجود محتوى
         if not subcategories and not videos:
@@ -243,14 +263,14 @@ def handle_category_videos(bot, call, category_id: int, page: int = 1):
         if subcategories:
             text += "📂 التصنيفات الفرعية:\n"
             for sub in subcategories:
-                sub_name = sub[1][:30] + "..." if len(sub[1]) > 30 else sub[1]
-                video_count = sub[4] if len(sub) > 4 else 0
+                sub_name = sub.name[:30] + "..." if len(sub.name) > 30 else sub.name
+                video_count = sub.total_video_count
                 display_text = f"📂 {sub_name}"
                 if video_count > 0:
                     display_text += f" ({video_count})"
                 
                 text += f"• {sub_name}\n"
-                markup.add(types.InlineKeyboardButton(display_text, callback_data=f"category_{sub[0]}"))
+                markup.add(types.InlineKeyboardButton(display_text, callback_data=f"category_{sub.id}"))
             text += "\n"
         
         # عرض الفيديوهات إن وجدت
@@ -265,25 +285,29 @@ def handle_category_videos(bot, call, category_id: int, page: int = 1):
             text += "\n\n"
             
             for i, video in enumerate(videos, 1):
-                title = video[1] if video[1] else (video[4] if video[4] else f"فيديو {video[0]}")
+                title = video.display_title
                 title_short = title[:30] + "..." if len(title) > 30 else title
-                views = video[3] if video[3] else 0
+                views = video.view_count or 0
                 
                 video_number = (page - 1) * per_page + i
                 text += f"{video_number}. {title_short}\n   👁️ {views:,}\n\n"
                 
                 # أضف زرين لكل فيديو: تفاصيل وجلب
-                btn_details = types.InlineKeyboardButton(f"📺 {video_number}. {title[:15]}...", callback_data=f"video_{video[0]}")
-                btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video[0]}")
+                btn_details = types.InlineKeyboardButton(f"📺 {video_number}. {title[:15]}...", callback_data=f"video_{video.id}")
+                btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video.id}")
                 markup.add(btn_details, btn_download)
             
             # أزرار التصفح للفيديوهات
             if total_pages > 1:
+                # التصفح بالمفاتيح: المؤشر يحمل مفتاح أول/آخر فيديو في الصفحة الحالية
+                prev_cursor, next_cursor = VideoService.video_page_cursors(videos)
                 nav_buttons = []
                 if page > 1:
-                    nav_buttons.append(types.InlineKeyboardButton("⬅️ السابق", callback_data=f"category_{category_id}_page_{page-1}"))
+                    prev_data = (f"category_{category_id}_page_1" if page == 2
+                                 else f"category_{category_id}_page_{page-1}_{prev_cursor}")
+                    nav_buttons.append(types.InlineKeyboardButton("⬅️ السابق", callback_data=prev_data))
                 if page < total_pages:
-                    nav_buttons.append(types.InlineKeyboardButton("➡️ التالي", callback_data=f"category_{category_id}_page_{page+1}"))
+                    nav_buttons.append(types.InlineKeyboardButton("➡️ التالي", callback_data=f"category_{category_id}_page_{page+1}_{next_cursor}"))
                 if nav_buttons:
                     markup.add(*nav_buttons)
         
@@ -321,13 +345,13 @@ def handle_favorites_menu(bot, call, user_id):
         markup = types.InlineKeyboardMarkup()
         
         for i, video in enumerate(favorites, 1):
-            title = video[1] if video[1] else (video[4] if video[4] else f"فيديو {video[0]}")
+            title = video.display_title
             title_short = title[:30] + "..." if len(title) > 30 else title
             text += f"{i}. {title_short}\n\n"
             
             # أضف زرين لكل فيديو: تفاصيل وجلب
-            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video[0]}")
-            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video[0]}")
+            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video.id}")
+            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video.id}")
             markup.add(btn_details, btn_download)
             
         markup.add(types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu"))
@@ -359,13 +383,13 @@ def handle_history_menu(bot, call, user_id):
         markup = types.InlineKeyboardMarkup()
         
         for i, video in enumerate(history, 1):
-            title = video[1] if video[1] else (video[4] if video[4] else f"فيديو {video[0]}")
+            title = video.display_title
             title_short = title[:30] + "..." if len(title) > 30 else title
             text += f"{i}. {title_short}\n\n"
             
             # أضف زرين لكل فيديو: تفاصيل وجلب
-            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video[0]}")
-            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video[0]}")
+            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video.id}")
+            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video.id}")
             markup.add(btn_details, btn_download)
             
         markup.add(types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu"))
@@ -374,6 +398,30 @@ def handle_history_menu(bot, call, user_id):
         logger.error(f"❌ خطأ في السجل: {e}")
 
 
+def build_video_list(header: str, videos, show_views: bool = True):
+    """نص وأزرار قائمة فيديوهات (تفاصيل وجلب لكل فيديو) - مشتركة بين الوضعين"""
+    text = f"{header}\n\n"
+    markup = types.InlineKeyboardMarkup()
+    
+    for i, video in enumerate(videos, 1):
+        title = video.display_title
+        title_short = title[:30] + "..." if len(title) > 30 else title
+        
+        if show_views:
+            views = video.view_count or 0
+            text += f"{i}. {title_short}\n   👁️ {views:,}\n\n"
+        else:
+            text += f"{i}. {title_short}\n\n"
+        
+        # أضف زرين لكل فيديو: تفاصيل وجلب
+        btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video.id}")
+        btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video.id}")
+        markup.add(btn_details, btn_download)
+        
+    markup.add(types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu"))
+    return text, markup
+
+
 def handle_popular_videos(bot, call):
     """معالج الفيديوهات الشائعة"""
     try:
@@ -384,25 +432,26 @@ def handle_popular_videos(bot, call):
             safe_edit(bot, call.message.chat.id, call.message.message_id, "❌ لا توجد فيديوهات شائعة")
             return
             
-        text = "🔥 الفيديوهات الأشهر\n\n"
-        markup = types.InlineKeyboardMarkup()
+        text, markup = build_video_list("🔥 الفيديوهات الأشهر", popular)
+        safe_edit(bot, call.message.chat.id, call.message.message_id, text, markup)
+    except Exception as e:
+        logger.error(f"❌ خطأ في الفيديوهات الشائعة: {e}")
+
+
+def handle_trending_videos(bot, call):
+    """معالج الفيديوهات الرائجة (الأكثر مشاهدة مؤخراً)"""
+    try:
+        from app.services.video_service import VideoService
+        trending = VideoService.get_trending_videos(10)
         
-        for i, video in enumerate(popular, 1):
-            title = video[1] if video[1] else (video[4] if video[4] else f"فيديو {video[0]}")
-            title_short = title[:30] + "..." if len(title) > 30 else title
-            views = video[3] if video[3] else 0
-            
-            text += f"{i}. {title_short}\n   👁️ {views:,}\n\n"
-            
-            # أضف زرين لكل فيديو: تفاصيل وجلب
-            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video[0]}")
-            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video[0]}")
-            markup.add(btn_details, btn_download)
+        if not trending:
+            safe_edit(bot, call.message.chat.id, call.message.message_id, "❌ لا توجد فيديوهات رائجة حالياً")
+            return
             
-        markup.add(types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu"))
+        text, markup = build_video_list("🚀 الرائج الآن", trending)
         safe_edit(bot, call.message.chat.id, call.message.message_id, text, markup)
     except Exception as e:
-        logger.error(f"❌ خطأ في الفيديوهات الشائعة: {e}")
+        logger.error(f"❌ خطأ في الفيديوهات الرائجة: {e}")
 
 
 def handle_recent_videos(bot, call):
@@ -415,20 +464,7 @@ def handle_recent_videos(bot, call):
             safe_edit(bot, call.message.chat.id, call.message.message_id, "❌ لا توجد فيديوهات حديثة")
             return
             
-        text = "🆕 أحدث الفيديوهات\n\n"
-        markup = types.InlineKeyboardMarkup()
-        
-        for i, video in enumerate(recent, 1):
-            title = video[1] if video[1] else (video[4] if video[4] else f"فيديو {video[0]}")
-            title_short = title[:30] + "..." if len(title) > 30 else title
-            text += f"{i}. {title_short}\n\n"
-            
-            # أضف زرين لكل فيديو: تفاصيل وجلب
-            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video[0]}")
-            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video[0]}")
-            markup.add(btn_details, btn_download)
-            
-        markup.add(types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu"))
+        text, markup = build_video_list("🆕 أحدث الفيديوهات", recent, show_views=False)
         safe_edit(bot, call.message.chat.id, call.message.message_id, text, markup)
     except Exception as e:
         logger.error(f"❌ خطأ في الفيديوهات الحديثة: {e}")
@@ -46,13 +46,15 @@ def start_command(bot, message):
         btn_history = types.InlineKeyboardButton("📊 سجل المشاهدة", callback_data="history")
         btn_popular = types.InlineKeyboardButton("🔥 الأشهر", callback_data="popular")
         btn_recent = types.InlineKeyboardButton("🆕 الأحدث", callback_data="recent")
+        btn_trending = types.InlineKeyboardButton("🚀 الرائج", callback_data="trending")
         btn_stats = types.InlineKeyboardButton("📈 الإحصائيات", callback_data="stats")
         btn_help = types.InlineKeyboardButton("❓ المساعدة", callback_data="help")
         
         markup.add(btn_search, btn_categories)
         markup.add(btn_favorites, btn_history)
         markup.add(btn_popular, btn_recent)
-        markup.add(btn_stats, btn_help)
+        markup.add(btn_trending, btn_stats)
+        markup.add(btn_help)
         
         bot.send_message(message.chat.id, welcome_text, reply_markup=markup, parse_mode='Markdown')
         
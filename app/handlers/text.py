@@ -10,12 +10,22 @@ from app.handlers.callbacks import user_states
 logger = logging.getLogger(__name__)
 
 
+def format_result_count(total: int, count_kind: str) -> str:
+    """صياغة عدد النتائج حسب نوعه: دقيق، محدود بسقف، أو تقديري"""
+    if count_kind == 'capped':
+        return f"{total:,}+"
+    if count_kind == 'estimate':
+        return f"~{total:,}"
+    return f"{total:,}"
+
+
 def handle_text_message(bot, message):
     user_id = message.from_user.id
     query = message.text.strip()
     
     # وضع البحث المتقدم
-    if user_id in user_states and user_states[user_id].get('action') == 'searching':
+    state = user_states.get(user_id)
+    if state and state.get('action') == 'searching':
         handle_search_input(bot, message, query)
         return
     
@@ -27,8 +37,10 @@ def handle_text_message(bot, message):
     wait_msg = bot.send_message(message.chat.id, "🔍 جاري البحث الذكي في الأرشيف...")
     
     try:
-        results = VideoService.search_videos(query, limit=15)
-        total_count = VideoService.get_search_count(query)
+        # البحث السريع يكتفي بعد محدود بسقف (يكفي لعرض "1000+")
+        results, total_count, count_kind = VideoService.search_videos_with_count(
+            query, limit=15, count_strategy='capped'
+        )
         
         if not results:
             text = (
@@ -51,23 +63,26 @@ def handle_text_message(bot, message):
         
         # صياغة النتائج مع أزرار التحميل
         text = f"🔍 نتائج البحث: {query}\n"
-        text += f"📊 تم العثور على {total_count} نتيجة\n\n"
+        text += f"📊 تم العثور على {format_result_count(total_count, count_kind)} نتيجة\n\n"
         text += "🎯 البحث تم في: العنوان، الوصف، اسم الملف، البيانات\n\n"
         
         markup = types.InlineKeyboardMarkup()
         for i, video in enumerate(results[:10], 1):
-            title = video[1] if video[1] else (video[4] if video[4] else f"فيديو {video[0]}")
+            title = video.display_title
             title = title[:50] + "..." if len(title) > 50 else title
-            views = video[3] if video[3] else 0
+            views = video.view_count or 0
             text += f"{i}. {title}\n   👁️ {views:,}\n\n"
             
             # إضافة زرين: تفاصيل و جلب
-            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:20]}...", callback_data=f"video_{video[0]}")
-            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video[0]}")
+            btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:20]}...", callback_data=f"video_{video.id}")
+            btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video.id}")
             markup.add(btn_details, btn_download)
         
         if total_count > 10:
-            text += f"... و {total_count - 10} نتيجة أخرى\n"
+            if count_kind == 'exact':
+                text += f"... و {total_count - 10} نتيجة أخرى\n"
+            else:
+                text += "... ونتائج أخرى كثيرة\n"
         
         buttons_row = []
         if total_count > 15:
@@ -87,14 +102,15 @@ def handle_text_message(bot, message):
 
 
 def handle_search_input(bot, message, query):
-    if message.from_user.id in user_states:
-        del user_states[message.from_user.id]
+    user_states.pop(message.from_user.id, None)
     
     wait_msg = bot.send_message(message.chat.id, "🎯 جاري البحث المتقدم الشامل...")
     
     try:
-        results = VideoService.search_videos(query, limit=25)
-        total_count = VideoService.get_search_count(query)
+        # البحث المتقدم: عد دقيق للنتائج القليلة وتقدير المخطط للبحث الواسع
+        results, total_count, count_kind = VideoService.search_videos_with_count(
+            query, limit=25, count_strategy='estimate'
+        )
         if not results:
             bot.edit_message_text(
                 f"❌ لم يتم العثور على نتائج للبحث المتقدم: {query}",
@@ -102,7 +118,8 @@ def handle_search_input(bot, message, query):
             )
             return
         
-        show_advanced_search_results(bot, wait_msg.chat.id, wait_msg.message_id, results, query, total_count)
+        show_advanced_search_results(bot, wait_msg.chat.id, wait_msg.message_id, results, query, total_count,
+                                     count_kind)
     except Exception as e:
         logger.error(f"❌ خطأ في البحث: {e}")
         try:
@@ -112,28 +129,29 @@ def handle_search_input(bot, message, query):
             bot.send_message(message.chat.id, f"❌ حدث خطأ في البحث: {query}")
 
 
-def show_advanced_search_results(bot, chat_id, message_id, results, query, total_count):
+def show_advanced_search_results(bot, chat_id, message_id, results, query, total_count, count_kind='exact'):
     per_page = 12
+    count_text = format_result_count(total_count, count_kind)
     
     text = f"🎯 نتائج البحث المتقدم: {query}\n"
-    text += f"📊 العدد الإجمالي: {total_count}\n"
+    text += f"📊 العدد الإجمالي: {count_text}\n"
     text += f"📄 عرض أول {min(len(results), per_page)} نتيجة\n\n"
     text += "🔍 البحث الشامل: العنوان، الوصف، اسم الملف، البيانات\n\n"
     
     markup = types.InlineKeyboardMarkup()
     for i, video in enumerate(results[:per_page], 1):
-        title = video[1] if video[1] else (video[4] if video[4] else f"فيديو {video[0]}")
+        title = video.display_title
         title_short = title[:35] + "..." if len(title) > 35 else title
-        views = video[3] if video[3] else 0
+        views = video.view_count or 0
         text += f"{i}. {title_short}\n   👁️ {views:,}\n\n"
         
         # إضافة زرين: تفاصيل و جلب
-        btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video[0]}")
-        btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video[0]}")
+        btn_details = types.InlineKeyboardButton(f"📺 {i}. {title[:15]}...", callback_data=f"video_{video.id}")
+        btn_download = types.InlineKeyboardButton("📥 جلب", callback_data=f"download_{video.id}")
         markup.add(btn_details, btn_download)
     
     if total_count > per_page:
-        text += f"📋 للاطلاع على جميع النتائج ({total_count}) استخدم كلمات أكثر تحديداً\n\n"
+        text += f"📋 للاطلاع على جميع النتائج ({count_text}) استخدم كلمات أكثر تحديداً\n\n"
     
     control_buttons = []
     if total_count > per_page:
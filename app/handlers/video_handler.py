@@ -2,14 +2,94 @@
 import logging
 import json
 import os
+from functools import lru_cache
 from telebot import types
+from app.models.rows import VideoDetail
 from app.services.video_service import VideoService
-from app.services.user_service import UserService
+from app.services.user_service import (
+    FAVORITE_ADDED, FAVORITE_ERROR, FAVORITE_LIMIT, FAVORITE_REMOVED, UserService,
+)
+from app.services.view_counter import view_counter
 from app.utils.metadata_extractor import extract_video_metadata, create_grouping_key
 
 logger = logging.getLogger(__name__)
 
 
+# رد الضغط على زر المفضلة لكل نتيجة: (النص، تنبيه منبثق؟)
+FAVORITE_REPLIES = {
+    FAVORITE_ADDED: ("✅ تم إضافة للمفضلة!", False),
+    FAVORITE_REMOVED: ("❌ تم إزالة من المفضلة", False),
+    FAVORITE_LIMIT: ("⚠️ وصلت للحد الأقصى للمفضلات - احذف بعضها أولاً", True),
+    FAVORITE_ERROR: ("⚠️ تعذر تحديث المفضلة - حاول مرة أخرى", True),
+}
+
+
+@lru_cache(maxsize=4096)
+def _video_keyboard_rows(video_id: int, is_fav: bool, is_admin: bool) -> tuple:
+    """صفوف أزرار تفاصيل الفيديو كـ tuple ثابت من (النص، callback_data) - مخزنة لكل تركيبة"""
+    fav_text = "❤️ إزالة من المفضلة" if is_fav else "💖 إضافة للمفضلة"
+    
+    # صف الأزرار الأول: تحميل (متاح دائماً) ومفضلة
+    rows = [(("📥 جلب الفيديو", f"download_{video_id}"), (fav_text, f"favorite_{video_id}"))]
+    
+    # أزرار إضافية للمشرفين
+    if is_admin:
+        rows.append((("🗂️ نقل التصنيف", f"admin_video_move_{video_id}"),
+                     ("🗑️ حذف", f"admin_video_delete_{video_id}")))
+    
+    # زر العودة
+    rows.append((("🔙 رجوع", "main_menu"),))
+    return tuple(rows)
+
+
+def build_video_keyboard(video_id: int, is_fav: bool, is_admin: bool) -> types.InlineKeyboardMarkup:
+    """
+    لوحة أزرار تفاصيل الفيديو (كائن جديد لكل استدعاء من وصف مخزن).
+    تعتمد فقط على المعرف وحالة المفضلة والإشراف حتى يمكن تبديل زر المفضلة وحده.
+    """
+    markup = types.InlineKeyboardMarkup()
+    for row in _video_keyboard_rows(video_id, is_fav, is_admin):
+        markup.add(*(types.InlineKeyboardButton(text, callback_data=data) for text, data in row))
+    return markup
+
+
+def format_video_details(video: VideoDetail, view_count: int, is_admin: bool) -> str:
+    """نص تفاصيل الفيديو (مشترك بين الوضعين المتزامن وغير المتزامن)"""
+    text = f"🎬 {video.display_title}\n\n"
+    
+    # إضافة الوصف إن وُجد
+    if video.caption:
+        desc = video.caption[:300] + "..." if len(video.caption) > 300 else video.caption
+        text += f"📝 الوصف:\n{desc}\n\n"
+    
+    # معلومات إضافية
+    if video.category_name:
+        text += f"📚 التصنيف: {video.category_name}\n"
+    
+    if video.file_name:
+        file_name = video.file_name[:50] + "..." if len(video.file_name) > 50 else video.file_name
+        text += f"📄 اسم الملف: {file_name}\n"
+    
+    # إحصائيات الفيديو
+    text += f"\n📊 الإحصائيات:\n"
+    text += f"👁️ المشاهدات: {view_count:,}\n"
+    
+    if video.upload_date:
+        try:
+            upload_date = video.upload_date.strftime('%Y-%m-%d %H:%M')
+            text += f"📅 تاريخ الرفع: {upload_date}\n"
+        except:
+            pass
+    
+    # معلومات المصدر للمشرفين
+    if is_admin:
+        text += f"\n🔧 معلومات المصدر (للمشرف):\n"
+        text += f"🆔 معرف الفيديو: {video.id}\n"
+        text += f"💬 معرف المحادثة: {video.chat_id}\n"
+        text += f"📨 معرف الرسالة: {video.message_id}\n"
+    return text
+
+
 def handle_video_details(bot, call, user_id, video_id):
     """عرض تفاصيل الفيديو مع إحصائيات وأزرار التحكم"""
     try:
@@ -19,73 +99,18 @@ def handle_video_details(bot, call, user_id, video_id):
             return
 
         # تحديث عداد المشاهدة وإضافة للسجل
-        VideoService.update_view_count(video_id)
+        VideoService.update_view_count(video_id, video)
         UserService.add_to_history(user_id, video_id)
 
-        # بناء معلومات الفيديو
-        title = video[9] if video[9] else (video[4] if video[4] else f"فيديو {video[0]}")
-        
-        text = f"🎬 {title}\n\n"
-        
-        # إضافة الوصف إن وُجد
-        if video[2]:
-            desc = video[2][:300] + "..." if len(video[2]) > 300 else video[2]
-            text += f"📝 الوصف:\n{desc}\n\n"
-        
-        # معلومات إضافية
-        if len(video) > 12 and video[12]:  # category_name
-            text += f"📚 التصنيف: {video[12]}\n"
-        
-        if video[4]:  # file_name
-            file_name = video[4][:50] + "..." if len(video[4]) > 50 else video[4]
-            text += f"📄 اسم الملف: {file_name}\n"
-        
-        # إحصائيات الفيديو
-        text += f"\n📊 الإحصائيات:\n"
-        text += f"👁️ المشاهدات: {video[8]:,}\n"  # view_count
-        
-        if video[11]:  # upload_date
-            try:
-                upload_date = video[11].strftime('%Y-%m-%d %H:%M')
-                text += f"📅 تاريخ الرفع: {upload_date}\n"
-            except:
-                pass
-        
-        # معلومات المصدر للمشرفين
+        # العداد في القاعدة + المشاهدات المعلقة في المخزن حتى يبدو العدد حياً
+        view_count = (video.view_count or 0) + view_counter.pending_views(video_id)
         from main import ADMIN_IDS
-        if user_id in ADMIN_IDS:
-            text += f"\n🔧 معلومات المصدر (للمشرف):\n"
-            text += f"🆔 معرف الفيديو: {video[0]}\n"
-            text += f"💬 معرف المحادثة: {video[3]}\n"
-            text += f"📨 معرف الرسالة: {video[1]}\n"
+        is_admin = user_id in ADMIN_IDS
+        text = format_video_details(video, view_count, is_admin)
 
-        # التحقق من المفضلة
+        # التحقق من المفضلة وإنشاء لوحة الأزرار
         is_fav = UserService.is_favorite(user_id, video_id)
-        fav_text = "❤️ إزالة من المفضلة" if is_fav else "💖 إضافة للمفضلة"
-
-        # إنشاء لوحة الأزرار
-        markup = types.InlineKeyboardMarkup()
-        
-        # صف الأزرار الأول: تحميل ومفضلة
-        first_row = []
-        
-        # زر التحميل - متاح دائماً
-        first_row.append(types.InlineKeyboardButton("📥 جلب الفيديو", callback_data=f"download_{video_id}"))
-        
-        # زر المفضلة
-        first_row.append(types.InlineKeyboardButton(fav_text, callback_data=f"favorite_{video_id}"))
-        
-        markup.add(*first_row)
-        
-        # أزرار إضافية للمشرفين
-        if user_id in ADMIN_IDS:
-            admin_row = []
-            admin_row.append(types.InlineKeyboardButton("🗂️ نقل التصنيف", callback_data=f"admin_video_move_{video_id}"))
-            admin_row.append(types.InlineKeyboardButton("🗑️ حذف", callback_data=f"admin_video_delete_{video_id}"))
-            markup.add(*admin_row)
-        
-        # زر العودة
-        markup.add(types.InlineKeyboardButton("🔙 رجوع", callback_data="main_menu"))
+        markup = build_video_keyboard(video_id, is_fav, is_admin)
 
         # إرسال التفاصيل
         try:
@@ -106,13 +131,13 @@ def handle_video_details(bot, call, user_id, video_id):
 def handle_video_download(bot, call, video_id):
     """تحميل/جلب الفيديو - طريقة محسنة مع حل جميع المشاكل"""
     try:
-        video = VideoService.get_video_by_id(video_id)
+        video = VideoService.get_video_for_delivery(video_id)
         if not video:
             bot.answer_callback_query(call.id, "❌ الفيديو غير متاح", show_alert=True)
             return
 
-        title = video[9] if video[9] else (video[4] if video[4] else f"فيديو {video[0]}")
-        file_id = video[5]  # file_id
+        title = video.display_title
+        file_id = video.file_id
         
         # الطريقة الأولى: استخدام file_id مباشرة (الأكثر موثوقية)
         if file_id and file_id != "":
@@ -120,7 +145,7 @@ def handle_video_download(bot, call, video_id):
                 caption = f"🎬 {title}\n\n📥 من أرشيف الفيديوهات المتقدم\n🤖 تم الجلب تلقائياً"
                 
                 # تحديد نوع الملف وإرساله
-                file_name = (video[4] or "").lower()
+                file_name = (video.file_name or "").lower()
                 if file_name.endswith(('.mp4', '.mkv', '.avi', '.mov', '.webm', '.flv')):
                     sent_msg = bot.send_video(chat_id=call.message.chat.id, video=file_id, caption=caption)
                 elif file_name.endswith(('.jpg', '.jpeg', '.png', '.gif')):
@@ -145,7 +170,7 @@ def handle_video_download(bot, call, video_id):
                     # إرسال الملف بطريقة مختلفة
                     caption = f"🎬 {title}\n\n📥 تم جلبه من الأرشيف (طريقة 2)"
                     
-                    file_name = (video[4] or "").lower()
+                    file_name = (video.file_name or "").lower()
                     if file_name.endswith(('.mp4', '.mkv', '.avi', '.mov', '.webm')):
                         bot.send_video(chat_id=call.message.chat.id, video=file_id, caption=caption, timeout=60)
                     else:
@@ -159,8 +184,8 @@ def handle_video_download(bot, call, video_id):
                 logger.warning(f"⚠️ فشل get_file للفيديو {video_id}: {get_file_error}")
         
         # الطريقة الثالثة: copy_message من المصدر (إذا توفرت المعلومات)
-        source_chat_id = video[3]  # chat_id
-        source_message_id = video[1]  # message_id
+        source_chat_id = video.chat_id
+        source_message_id = video.message_id
         
         if source_chat_id and source_message_id:
             try:
@@ -225,15 +250,19 @@ def handle_video_download(bot, call, video_id):
 def handle_toggle_favorite(bot, call, user_id, video_id):
     """إضافة/إزالة فيديو من المفضلة"""
     try:
-        is_added = UserService.toggle_favorite(user_id, video_id)
-        
-        if is_added:
-            bot.answer_callback_query(call.id, "✅ تم إضافة للمفضلة!", show_alert=False)
-        else:
-            bot.answer_callback_query(call.id, "❌ تم إزالة من المفضلة", show_alert=False)
+        result = UserService.toggle_favorite(user_id, video_id)
+        reply, show_alert = FAVORITE_REPLIES[result]
+        bot.answer_callback_query(call.id, reply, show_alert=show_alert)
+        if result not in (FAVORITE_ADDED, FAVORITE_REMOVED):
+            return
         
-        # تحديث عرض التفاصيل
-        handle_video_details(bot, call, user_id, video_id)
+        # تبديل زر المفضلة فقط - بدون إعادة جلب الفيديو أو احتساب مشاهدة جديدة
+        from main import ADMIN_IDS
+        markup = build_video_keyboard(video_id, result == FAVORITE_ADDED, user_id in ADMIN_IDS)
+        try:
+            bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
+        except Exception as e:
+            logger.error(f"❌ فشل تحديث زر المفضلة: {e}")
         
     except Exception as e:
         logger.error(f"❌ خطأ في المفضلة: {e}")
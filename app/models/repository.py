@@ -0,0 +1,92 @@
+"""
+طبقة الوصول للبيانات: أعمدة كل نوع صف واستعلامات الجلب بالمعرف.
+الأعمدة ونصوص الاستعلامات مشتركة بين الخدمات المتزامنة (psycopg2) وغير المتزامنة (SQLAlchemy)
+حتى لا يختلف شكل الصف بين الوضعين.
+"""
+import re
+import logging
+from typing import Dict, List, Optional, Type
+
+from app.database.connection import get_db_cursor
+from app.models.rows import VideoDelivery, VideoDetail
+
+logger = logging.getLogger(__name__)
+
+# أعمدة VideoListItem (من video_archive بدون اسم مستعار)
+VIDEO_LIST_COLUMNS = "id, title, view_count, file_name, upload_date"
+
+# أعمدة UserVideoItem (v = video_archive) - يُضاف تاريخ الحفظ من جدول المستخدم
+USER_VIDEO_COLUMNS = "v.id, v.title, v.view_count, v.file_name"
+
+# استعلام VideoDetail بدون شرط WHERE (v = video_archive، c = categories)
+VIDEO_DETAIL_SELECT = """
+    SELECT v.id, v.message_id, v.caption, v.chat_id, v.file_name, v.file_id,
+           v.view_count, v.title, v.upload_date, c.name AS category_name
+    FROM video_archive v
+    LEFT JOIN categories c ON v.category_id = c.id
+"""
+
+# استعلام VideoDelivery بدون شرط WHERE
+VIDEO_DELIVERY_SELECT = """
+    SELECT id, message_id, chat_id, file_id, file_name, title
+    FROM video_archive
+"""
+
+# مجموعة مفضلات المستخدم
+FAVORITE_IDS_SQL = "SELECT video_id FROM user_favorites WHERE user_id = %(user_id)s"
+
+# إضافة/إزالة من المفضلة بأمر واحد: الحذف إن وُجد وإلا الإضافة (بدون سباق بين فحص وتعديل)،
+# ويُرجع هل تمت الإضافة
+TOGGLE_FAVORITE_SQL = """
+    WITH deleted AS (
+        DELETE FROM user_favorites
+        WHERE user_id = %(user_id)s AND video_id = %(video_id)s
+        RETURNING video_id
+    ), inserted AS (
+        INSERT INTO user_favorites (user_id, video_id, added_date, date_added)
+        SELECT %(user_id)s, %(video_id)s, %(now)s, %(now)s
+        WHERE NOT EXISTS (SELECT 1 FROM deleted)
+        RETURNING video_id
+    )
+    SELECT EXISTS (SELECT 1 FROM inserted)
+"""
+
+
+def named_params(sql: str) -> str:
+    """تحويل معاملات psycopg2 المسماة %(name)s إلى صيغة :name في text() لـ SQLAlchemy"""
+    return re.sub(r"%\((\w+)\)s", r":\1", sql)
+
+
+def fetch_rows(cursor, row_type: Type) -> List:
+    """كل صفوف المؤشر بنوع الصف المطلوب"""
+    return [row_type._make(row) for row in cursor.fetchall()]
+
+
+def fetch_row(cursor, row_type: Type) -> Optional[object]:
+    """صف واحد بنوع الصف المطلوب (أو None)"""
+    row = cursor.fetchone()
+    return row_type._make(row) if row is not None else None
+
+
+class VideoRepository:
+    """جلب الفيديوهات بالمعرف بأعمدة حالة الاستخدام فقط (الأخطاء تُرفع للخدمة)"""
+
+    @staticmethod
+    def get_detail(video_id: int) -> Optional[VideoDetail]:
+        with get_db_cursor() as cursor:
+            cursor.execute(VIDEO_DETAIL_SELECT + " WHERE v.id = %s", (video_id,))
+            return fetch_row(cursor, VideoDetail)
+
+    @staticmethod
+    def get_details(video_ids: List[int]) -> Dict[int, VideoDetail]:
+        if not video_ids:
+            return {}
+        with get_db_cursor() as cursor:
+            cursor.execute(VIDEO_DETAIL_SELECT + " WHERE v.id = ANY(%s)", (list(video_ids),))
+            return {video.id: video for video in fetch_rows(cursor, VideoDetail)}
+
+    @staticmethod
+    def get_delivery(video_id: int) -> Optional[VideoDelivery]:
+        with get_db_cursor() as cursor:
+            cursor.execute(VIDEO_DELIVERY_SELECT + " WHERE id = %s", (video_id,))
+            return fetch_row(cursor, VideoDelivery)
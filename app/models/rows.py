@@ -0,0 +1,96 @@
+"""
+أنواع صفوف القراءة: لكل حالة استخدام أعمدتها فقط بدلاً من صف عريض ثابت.
+NamedTuple بلا __dict__ (نفس حجم الـ tuple)، يُصل لحقولها بالاسم وتبقى قابلة للفهرسة.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+
+def _display_title(row) -> str:
+    """العنوان المعروض: العنوان ثم اسم الملف ثم رقم الفيديو"""
+    return row.title or row.file_name or f"فيديو {row.id}"
+
+
+class VideoListItem(NamedTuple):
+    """عنصر في قوائم الفيديوهات (الأشهر، الأحدث، الرائج، التصنيف، البحث) - بدون الوصف"""
+    id: int
+    title: Optional[str]
+    view_count: int
+    file_name: Optional[str]
+    upload_date: Optional[datetime]
+
+    display_title = property(_display_title)
+
+
+class UserVideoItem(NamedTuple):
+    """عنصر في مفضلات/سجل المستخدم (saved_at: تاريخ الإضافة أو آخر مشاهدة)"""
+    id: int
+    title: Optional[str]
+    view_count: int
+    file_name: Optional[str]
+    saved_at: Optional[datetime]
+
+    display_title = property(_display_title)
+
+
+class VideoDetail(NamedTuple):
+    """شاشة تفاصيل الفيديو (بدون metadata و grouping_key)"""
+    id: int
+    message_id: int
+    caption: Optional[str]
+    chat_id: int
+    file_name: Optional[str]
+    file_id: Optional[str]
+    view_count: int
+    title: Optional[str]
+    upload_date: Optional[datetime]
+    category_name: Optional[str]
+
+    display_title = property(_display_title)
+
+
+class VideoDelivery(NamedTuple):
+    """ما يلزم لإرسال الفيديو للمستخدم فقط"""
+    id: int
+    message_id: int
+    chat_id: int
+    file_id: Optional[str]
+    file_name: Optional[str]
+    title: Optional[str]
+
+    display_title = property(_display_title)
+
+    @classmethod
+    def from_detail(cls, video: VideoDetail) -> "VideoDelivery":
+        return cls(video.id, video.message_id, video.chat_id, video.file_id, video.file_name, video.title)
+
+
+class AdminVideoItem(NamedTuple):
+    """عنصر في قائمة/بحث فيديوهات الإدارة"""
+    id: int
+    title: Optional[str]
+    caption: Optional[str]
+    view_count: int
+    file_name: Optional[str]
+    upload_date: Optional[datetime]
+    category_name: Optional[str]
+
+    display_title = property(_display_title)
+
+
+class CategoryItem(NamedTuple):
+    """تصنيف بدون أعداد"""
+    id: int
+    name: str
+    parent_id: Optional[int]
+    full_path: Optional[str]
+
+
+class CategoryWithCounts(NamedTuple):
+    """تصنيف مع عدد فيديوهاته المباشر والتراكمي (مع التصنيفات الفرعية)"""
+    id: int
+    name: str
+    parent_id: Optional[int]
+    full_path: Optional[str]
+    video_count: int
+    total_video_count: int
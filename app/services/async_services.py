@@ -0,0 +1,241 @@
+"""
+نسخ غير متزامنة من استعلامات الخدمات للوضع غير المتزامن (BOT_RUNTIME=async)
+على محرك SQLAlchemy في app.core.database.
+تشارك الذاكرة المؤقتة والقوائم في الذاكرة ومخازن الكتابة المؤجلة مع الخدمات المتزامنة،
+فلا تُنتظر قاعدة البيانات إلا عند عدم وجود البيانات في الذاكرة.
+الصفوف المُرجعة بنفس أنواع app.models.rows في الخدمات المتزامنة.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Type
+
+from sqlalchemy import text
+
+from app.core.database import async_session_maker
+from app.models.repository import (
+    FAVORITE_IDS_SQL, TOGGLE_FAVORITE_SQL, VIDEO_DETAIL_SELECT, VIDEO_LIST_COLUMNS, named_params,
+)
+from app.models.rows import CategoryWithCounts, VideoDetail, VideoListItem
+from app.services.category_service import CategoryService
+from app.services.category_tree import category_tree
+from app.services.top_lists import popular_videos, recent_videos
+from app.services.trending import trending
+from app.services.user_service import (
+    FAVORITE_ADDED, FAVORITE_ERROR, FAVORITE_LIMIT, FAVORITE_REMOVED, UserService,
+)
+from app.services.video_service import VideoService
+from app.services.view_counter import view_counter
+from app.utils.cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+
+def _as_row(row, row_type: Optional[Type]):
+    return row_type._make(row) if row_type is not None else tuple(row)
+
+
+async def _fetch_all(sql: str, params: Dict = None, row_type: Optional[Type] = None) -> List:
+    async with async_session_maker() as session:
+        result = await session.execute(text(sql), params or {})
+        return [_as_row(row, row_type) for row in result.fetchall()]
+
+
+async def _fetch_one(sql: str, params: Dict = None, row_type: Optional[Type] = None) -> Optional[object]:
+    async with async_session_maker() as session:
+        result = await session.execute(text(sql), params or {})
+        row = result.fetchone()
+        return _as_row(row, row_type) if row is not None else None
+
+
+class AsyncVideoService:
+    """استعلامات الفيديوهات غير المتزامنة"""
+
+    @staticmethod
+    async def get_video_by_id(video_id: int) -> Optional[VideoDetail]:
+        """الحصول على فيديو بالمعرف (نفس ذاكرة صفوف الفيديو في VideoService)"""
+        cached = VideoService.cached_video(video_id)
+        if cached is not MISSING:
+            return cached
+
+        try:
+            video = await _fetch_one(VIDEO_DETAIL_SELECT + " WHERE v.id = :video_id",
+                                     {'video_id': video_id}, VideoDetail)
+        except Exception as e:
+            logger.error(f"❌ خطأ في الحصول على الفيديو: {e}")
+            return None
+
+        VideoService.cache_video(video_id, video)
+        return video
+
+    @staticmethod
+    async def get_videos_by_ids(video_ids: List[int]) -> Dict[int, VideoDetail]:
+        """عدة فيديوهات بالمعرفات: من الذاكرة ثم استعلام واحد للباقي"""
+        videos, missing = {}, []
+        for video_id in video_ids:
+            cached = VideoService.cached_video(video_id)
+            if cached is MISSING:
+                missing.append(video_id)
+            elif cached:
+                videos[video_id] = cached
+
+        if missing:
+            try:
+                rows = await _fetch_all(VIDEO_DETAIL_SELECT + " WHERE v.id = ANY(:video_ids)",
+                                        {'video_ids': missing}, VideoDetail)
+            except Exception as e:
+                logger.error(f"❌ خطأ في الحصول على الفيديوهات: {e}")
+                return videos
+            for row in rows:
+                videos[row.id] = row
+                VideoService.cache_video(row.id, row)
+        return videos
+
+    @staticmethod
+    def update_view_count(video_id: int, video: VideoDetail) -> bool:
+        """تسجيل مشاهدة في مخازن الذاكرة (لا يلمس قاعدة البيانات عند تمرير الصف)"""
+        return VideoService.update_view_count(video_id, video)
+
+    @staticmethod
+    async def get_popular_videos(limit: int = 10) -> List[VideoListItem]:
+        """أشهر الفيديوهات (من القائمة في الذاكرة إن حُملت)"""
+        if popular_videos.loaded:
+            cached = popular_videos.top(limit)
+            if cached is not None:
+                return cached
+
+        try:
+            return await _fetch_all(f"""
+                SELECT {VIDEO_LIST_COLUMNS}
+                FROM video_archive
+                WHERE view_count > 0
+                ORDER BY view_count DESC, upload_date DESC
+                LIMIT :limit
+            """, {'limit': limit}, VideoListItem)
+        except Exception as e:
+            logger.error(f"❌ خطأ في الفيديوهات الشائعة: {e}")
+            return []
+
+    @staticmethod
+    async def get_recent_videos(limit: int = 10) -> List[VideoListItem]:
+        """أحدث الفيديوهات (من القائمة في الذاكرة إن حُملت)"""
+        if recent_videos.loaded:
+            cached = recent_videos.top(limit)
+            if cached is not None:
+                return cached
+
+        try:
+            return await _fetch_all(f"""
+                SELECT {VIDEO_LIST_COLUMNS}
+                FROM video_archive
+                ORDER BY upload_date DESC
+                LIMIT :limit
+            """, {'limit': limit}, VideoListItem)
+        except Exception as e:
+            logger.error(f"❌ خطأ في الفيديوهات الحديثة: {e}")
+            return []
+
+    @staticmethod
+    async def get_trending_videos(limit: int = 10) -> List[VideoListItem]:
+        """الفيديوهات الرائجة: الترتيب من الذاكرة والصفوف الناقصة باستعلام واحد"""
+        try:
+            ranked = [video_id for video_id, _ in trending.top(limit)]
+            videos = await AsyncVideoService.get_videos_by_ids(ranked)
+            return [VideoService._list_row(videos[video_id], view_counter.pending_views(video_id))
+                    for video_id in ranked if video_id in videos]
+        except Exception as e:
+            logger.error(f"❌ خطأ في الفيديوهات الرائجة: {e}")
+            return []
+
+
+class AsyncUserService:
+    """استعلامات المستخدمين غير المتزامنة (المفضلات)"""
+
+    @staticmethod
+    async def _favorite_ids(user_id: int) -> Optional[Set[int]]:
+        """مجموعة مفضلات المستخدم (نفس ذاكرة المفضلات في UserService)"""
+        ids = UserService.cached_favorite_ids(user_id)
+        if ids is not MISSING:
+            return ids
+
+        try:
+            rows = await _fetch_all(named_params(FAVORITE_IDS_SQL), {'user_id': user_id})
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحميل المفضلات: {e}")
+            return None
+
+        ids = {row[0] for row in rows}
+        UserService.cache_favorite_ids(user_id, ids)
+        return ids
+
+    @staticmethod
+    async def is_favorite(user_id: int, video_id: int) -> bool:
+        ids = await AsyncUserService._favorite_ids(user_id)
+        return ids is not None and video_id in ids
+
+    @staticmethod
+    async def toggle_favorite(user_id: int, video_id: int) -> str:
+        """إضافة/إزالة من المفضلة بأمر واحد ذري (نفس نتائج UserService.toggle_favorite)"""
+        try:
+            ids = await AsyncUserService._favorite_ids(user_id)
+            if UserService.favorites_full(ids, video_id):
+                return FAVORITE_LIMIT
+
+            async with async_session_maker() as session:
+                result = await session.execute(text(named_params(TOGGLE_FAVORITE_SQL)),
+                                               {'user_id': user_id, 'video_id': video_id, 'now': datetime.now()})
+                added = result.scalar()
+                await session.commit()
+
+            UserService.favorite_toggled(user_id, video_id, added)
+            return FAVORITE_ADDED if added else FAVORITE_REMOVED
+
+        except Exception as e:
+            UserService.forget_favorite_ids(user_id)
+            logger.error(f"❌ خطأ في المفضلة: {e}")
+            return FAVORITE_ERROR
+
+
+class AsyncCategoryService:
+    """استعلامات التصنيفات غير المتزامنة (الشجرة في الذاكرة أولاً)"""
+
+    @staticmethod
+    async def get_categories(page: int = 1, per_page: int = 20,
+                             cursor: Optional[str] = None) -> List[CategoryWithCounts]:
+        """
+        صفحة التصنيفات الرئيسية مع الأعداد.
+        الاستعلام الاحتياطي يستخدم OFFSET (نفس الصفحة التي يحددها المؤشر).
+        """
+        if category_tree.loaded:
+            category_tree.ensure_loaded()
+            rows = CategoryService._categories_from_tree(True, page, per_page, None, cursor)
+            if rows is not None:
+                return rows
+
+        try:
+            rows = await _fetch_all("""
+                SELECT c.id, c.name, c.parent_id, c.full_path,
+                       COUNT(v.id) as video_count
+                FROM categories c
+                LEFT JOIN video_archive v ON c.id = v.category_id
+                WHERE c.parent_id IS NULL OR c.parent_id = 0
+                GROUP BY c.id, c.name, c.parent_id, c.full_path
+                ORDER BY c.name ASC, c.id ASC
+                LIMIT :limit OFFSET :offset
+            """, {'limit': per_page, 'offset': (page - 1) * per_page})
+        except Exception as e:
+            logger.error(f"❌ خطأ في الحصول على التصنيفات: {e}")
+            return []
+        return CategoryService._with_counts(rows)
+
+    @staticmethod
+    async def get_total_categories_count() -> int:
+        """عدد التصنيفات الرئيسية"""
+        if category_tree.loaded:
+            return len(category_tree.children(None))
+
+        try:
+            row = await _fetch_one("SELECT COUNT(*) FROM categories WHERE parent_id IS NULL OR parent_id = 0")
+            return row[0] if row else 0
+        except Exception as e:
+            logger.error(f"❌ خطأ في عدد التصنيفات: {e}")
+            return 0
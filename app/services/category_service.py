@@ -4,6 +4,10 @@
 import logging
 from typing import List, Optional, Tuple
 from app.database.connection import get_db_cursor
+from app.models.repository import fetch_row, fetch_rows
+from app.models.rows import CategoryItem, CategoryWithCounts
+from app.services.category_tree import category_tree
+from app.utils.pagination import AFTER, BEFORE, decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -12,63 +16,109 @@ class CategoryService:
     """خدمة إدارة التصنيفات"""
     
     @staticmethod
-    def get_categories(include_counts: bool = False, page: int = 1, per_page: int = 20, parent_id: Optional[int] = None) -> List[Tuple]:
-        """الحصول على قائمة التصنيفات مع إمكانية التصفح والتصنيفات الفرعية"""
+    def get_categories(include_counts: bool = False, page: int = 1, per_page: int = 20, parent_id: Optional[int] = None,
+                       cursor: Optional[str] = None) -> List[CategoryItem]:
+        """
+        الحصول على قائمة التصنيفات مع إمكانية التصفح والتصنيفات الفرعية.
+        مع cursor يُستخدم التصفح بالمفاتيح على (name, id) بدلاً من OFFSET.
+        تُقرأ من شجرة التصنيفات في الذاكرة، والاستعلام احتياطي فقط إذا تعذر بناؤها.
+        مع include_counts تُرجع CategoryWithCounts.
+        """
+        if category_tree.ensure_loaded():
+            rows = CategoryService._categories_from_tree(include_counts, page, per_page, parent_id, cursor)
+            if rows is not None:
+                return rows
+        
         try:
-            with get_db_cursor() as cursor:
+            with get_db_cursor() as db_cursor:
                 offset = (page - 1) * per_page
                 
+                if parent_id is not None:
+                    # التصنيفات الفرعية لتصنيف معين
+                    where_clause, params = "c.parent_id = %s", [parent_id]
+                else:
+                    # التصنيفات الرئيسية
+                    where_clause, params = "(c.parent_id IS NULL OR c.parent_id = 0)", []
+                
+                order = "ASC"
+                keyset = decode_cursor(cursor)
+                if keyset:
+                    direction, key = keyset
+                    comparison, order = (">", "ASC") if direction == AFTER else ("<", "DESC")
+                    # المؤشر يحمل معرف التصنيف فقط والمفتاح (name, id) يُقرأ من الصف نفسه
+                    where_clause += f" AND (c.name, c.id) {comparison} (SELECT name, id FROM categories WHERE id = %s)"
+                    params.append(key[0])
+                    offset = 0
+                
                 if include_counts:
-                    if parent_id is not None:
-                        # جلب التصنيفات الفرعية لتصنيف معين مع العدادات
-                        cursor.execute("""
-                            SELECT c.id, c.name, c.parent_id, c.full_path, 
-                                   COUNT(v.id) as video_count
-                            FROM categories c
-                            LEFT JOIN video_archive v ON c.id = v.category_id
-                            WHERE c.parent_id = %s
-                            GROUP BY c.id, c.name, c.parent_id, c.full_path
-                            ORDER BY c.name
-                            LIMIT %s OFFSET %s
-                        """, (parent_id, per_page, offset))
-                    else:
-                        # جلب التصنيفات الرئيسية مع العدادات
-                        cursor.execute("""
-                            SELECT c.id, c.name, c.parent_id, c.full_path, 
-                                   COUNT(v.id) as video_count
-                            FROM categories c
-                            LEFT JOIN video_archive v ON c.id = v.category_id
-                            WHERE c.parent_id IS NULL OR c.parent_id = 0
-                            GROUP BY c.id, c.name, c.parent_id, c.full_path
-                            ORDER BY c.name
-                            LIMIT %s OFFSET %s
-                        """, (per_page, offset))
+                    db_cursor.execute(f"""
+                        SELECT c.id, c.name, c.parent_id, c.full_path, 
+                               COUNT(v.id) as video_count
+                        FROM categories c
+                        LEFT JOIN video_archive v ON c.id = v.category_id
+                        WHERE {where_clause}
+                        GROUP BY c.id, c.name, c.parent_id, c.full_path
+                        ORDER BY c.name {order}, c.id {order}
+                        LIMIT %s OFFSET %s
+                    """, params + [per_page, offset])
                 else:
-                    if parent_id is not None:
-                        cursor.execute("""
-                            SELECT id, name, parent_id, full_path
-                            FROM categories 
-                            WHERE parent_id = %s
-                            ORDER BY name
-                            LIMIT %s OFFSET %s
-                        """, (parent_id, per_page, offset))
-                    else:
-                        cursor.execute("""
-                            SELECT id, name, parent_id, full_path
-                            FROM categories 
-                            WHERE parent_id IS NULL OR parent_id = 0
-                            ORDER BY name
-                            LIMIT %s OFFSET %s
-                        """, (per_page, offset))
+                    db_cursor.execute(f"""
+                        SELECT c.id, c.name, c.parent_id, c.full_path
+                        FROM categories c
+                        WHERE {where_clause}
+                        ORDER BY c.name {order}, c.id {order}
+                        LIMIT %s OFFSET %s
+                    """, params + [per_page, offset])
                 
-                return cursor.fetchall()
+                rows = (CategoryService._with_counts(db_cursor.fetchall()) if include_counts
+                        else fetch_rows(db_cursor, CategoryItem))
+                return rows[::-1] if keyset and keyset[0] == BEFORE else rows
         except Exception as e:
             logger.error(f"❌ خطأ في الحصول على التصنيفات: {e}")
             return []
     
     @staticmethod
-    def get_subcategories(parent_id: int) -> List[Tuple]:
+    def _with_counts(rows) -> List[CategoryWithCounts]:
+        """صفوف الاستعلام الاحتياطي (بدون الشجرة يُستخدم العدد المباشر كعدد تراكمي)"""
+        return [CategoryWithCounts(*row, row[4]) for row in rows]
+    
+    @staticmethod
+    def _categories_from_tree(include_counts: bool, page: int, per_page: int, parent_id: Optional[int],
+                              cursor: Optional[str]) -> Optional[List[CategoryItem]]:
+        """صفحة تصنيفات من الشجرة (None إذا كان تصنيف المؤشر غير موجود فيها)"""
+        siblings = category_tree.children(parent_id)
+        
+        keyset = decode_cursor(cursor)
+        if keyset:
+            direction, key = keyset
+            index = next((i for i, node in enumerate(siblings) if node.id == key[0]), None)
+            if index is None:
+                return None
+            if direction == AFTER:
+                selected = siblings[index + 1:index + 1 + per_page]
+            else:
+                selected = siblings[max(0, index - per_page):index]
+        else:
+            offset = (page - 1) * per_page
+            selected = siblings[offset:offset + per_page]
+        
+        if include_counts:
+            return [node.as_row_with_counts() for node in selected]
+        return [node.as_row() for node in selected]
+    
+    @staticmethod
+    def category_page_cursors(categories: List[CategoryItem]) -> Tuple[Optional[str], Optional[str]]:
+        """مؤشرا الصفحة السابقة والتالية لقائمة تصنيفات"""
+        if not categories:
+            return None, None
+        return encode_cursor(BEFORE, (categories[0].id,)), encode_cursor(AFTER, (categories[-1].id,))
+    
+    @staticmethod
+    def get_subcategories(parent_id: int) -> List[CategoryWithCounts]:
         """الحصول على التصنيفات الفرعية لتصنيف معين"""
+        if category_tree.ensure_loaded():
+            return [node.as_row_with_counts() for node in category_tree.children(parent_id)]
+        
         try:
             with get_db_cursor() as cursor:
                 cursor.execute("""
@@ -81,14 +131,20 @@ class CategoryService:
                     ORDER BY c.name
                 """, (parent_id,))
                 
-                return cursor.fetchall()
+                return CategoryService._with_counts(cursor.fetchall())
         except Exception as e:
             logger.error(f"❌ خطأ في جلب التصنيفات الفرعية: {e}")
             return []
     
     @staticmethod
-    def get_category_by_id(category_id: int) -> Optional[Tuple]:
+    def get_category_by_id(category_id: int) -> Optional[CategoryItem]:
         """الحصول على تصنيف بالمعرف"""
+        if category_tree.ensure_loaded():
+            node = category_tree.get(category_id)
+            if node is not None:
+                return node.as_row()
+        
+        # تصنيف غير موجود في الشجرة: قد يكون أُضيف بعد بنائها
         try:
             with get_db_cursor() as cursor:
                 cursor.execute("""
@@ -97,7 +153,10 @@ class CategoryService:
                     WHERE id = %s
                 """, (category_id,))
                 
-                return cursor.fetchone()
+                category = fetch_row(cursor, CategoryItem)
+                if category is not None:
+                    category_tree.invalidate()
+                return category
         except Exception as e:
             logger.error(f"❌ خطأ في الحصول على التصنيف: {e}")
             return None
@@ -105,6 +164,9 @@ class CategoryService:
     @staticmethod
     def get_total_categories_count(parent_id: Optional[int] = None) -> int:
         """الحصول على إجمالي عدد التصنيفات"""
+        if category_tree.ensure_loaded():
+            return len(category_tree.children(parent_id))
+        
         try:
             with get_db_cursor() as cursor:
                 if parent_id is not None:
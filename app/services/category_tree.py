@@ -0,0 +1,233 @@
+"""
+شجرة التصنيفات في الذاكرة: روابط الأب/الأبناء والمسار الكامل وعدد الفيديوهات
+المباشر والتراكمي (مع الأحفاد) لكل تصنيف.
+تُبنى مرة واحدة باستعلامين، وتُحدّث تدريجياً عند إضافة/حذف/نقل الفيديوهات،
+ويُعاد بناؤها دورياً في الخلفية لالتقاط أي تعديل خارجي.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.database.connection import get_db_cursor
+from app.models.rows import CategoryItem, CategoryWithCounts
+
+logger = logging.getLogger(__name__)
+
+# عمر الشجرة قبل إعادة بنائها في الخلفية (بالثواني)
+CATEGORY_TREE_TTL = float(os.getenv('CATEGORY_TREE_TTL', '600'))
+
+
+class CategoryNode:
+    """عقدة تصنيف واحدة"""
+
+    __slots__ = ('id', 'name', 'parent_id', 'full_path', 'children', 'direct_count', 'total_count')
+
+    def __init__(self, category_id: int, name: str, parent_id: Optional[int], full_path: Optional[str]):
+        self.id = category_id
+        self.name = name
+        self.parent_id = parent_id or None
+        self.full_path = full_path
+        self.children: List[int] = []
+        self.direct_count = 0
+        self.total_count = 0
+
+    def sort_key(self) -> Tuple[str, int]:
+        return (self.name or '', self.id)
+
+    def as_row(self) -> CategoryItem:
+        return CategoryItem(self.id, self.name, self.parent_id, self.full_path)
+
+    def as_row_with_counts(self) -> CategoryWithCounts:
+        return CategoryWithCounts(self.id, self.name, self.parent_id, self.full_path,
+                                  self.direct_count, self.total_count)
+
+
+class CategoryTree:
+    """شجرة التصنيفات الكاملة (آمنة للخيوط)"""
+
+    def __init__(self, ttl: float = 600.0):
+        self.ttl = ttl
+        self._nodes: Dict[int, CategoryNode] = {}
+        self._roots: List[int] = []
+        self._built_at = 0.0
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._builds = 0
+        self._adjustments = 0
+
+    # === البناء ===
+
+    def rebuild(self) -> bool:
+        """بناء الشجرة من قاعدة البيانات واستبدال الحالية دفعة واحدة"""
+        started = time.monotonic()
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute("SELECT id, name, parent_id, full_path FROM categories")
+                category_rows = cursor.fetchall()
+                cursor.execute("""
+                    SELECT category_id, COUNT(*)
+                    FROM video_archive
+                    WHERE category_id IS NOT NULL
+                    GROUP BY category_id
+                """)
+                count_rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"❌ خطأ في بناء شجرة التصنيفات: {e}")
+            return False
+
+        nodes = {row[0]: CategoryNode(*row) for row in category_rows}
+        for category_id, count in count_rows:
+            if category_id in nodes:
+                nodes[category_id].direct_count = count
+
+        # التصنيف الذي يشير لأب غير موجود لا يظهر في القوائم (نفس سلوك الاستعلام)
+        roots = []
+        for node in nodes.values():
+            node.total_count = node.direct_count
+            parent = nodes.get(node.parent_id)
+            if node.parent_id is None:
+                roots.append(node.id)
+            elif parent is not None and parent is not node:
+                parent.children.append(node.id)
+
+        for node in nodes.values():
+            node.children.sort(key=lambda child_id: nodes[child_id].sort_key())
+        roots.sort(key=lambda root_id: nodes[root_id].sort_key())
+
+        self._roll_up(nodes, roots)
+
+        with self._lock:
+            self._nodes = nodes
+            self._roots = roots
+            self._built_at = time.monotonic()
+            self._loaded = True
+            self._builds += 1
+
+        logger.info(f"🌳 تم بناء شجرة التصنيفات: {len(nodes)} تصنيف "
+                    f"في {(time.monotonic() - started) * 1000:.0f}ms")
+        return True
+
+    @staticmethod
+    def _roll_up(nodes: Dict[int, CategoryNode], roots: List[int]):
+        """حساب العدد التراكمي لكل عقدة (بدون تعاود حتى لا تتجاوز الأشجار العميقة حد بايثون)"""
+        visited = set()
+        for root_id in roots:
+            stack = [(root_id, False)]
+            while stack:
+                node_id, expanded = stack.pop()
+                node = nodes[node_id]
+                if expanded:
+                    node.total_count = node.direct_count + sum(
+                        nodes[child_id].total_count for child_id in node.children
+                    )
+                    continue
+                if node_id in visited:
+                    continue
+                visited.add(node_id)
+                stack.append((node_id, True))
+                stack.extend((child_id, False) for child_id in node.children)
+
+    def ensure_loaded(self) -> bool:
+        """التأكد من وجود الشجرة (بناء متزامن أول مرة وفي الخلفية عند انتهاء العمر)"""
+        if not self._loaded:
+            with self._rebuild_lock:
+                if not self._loaded:
+                    return self.rebuild()
+            return self._loaded
+
+        if time.monotonic() - self._built_at > self.ttl:
+            self._rebuild_in_background()
+        return True
+
+    def invalidate(self):
+        """فرض إعادة البناء عند الوصول التالي (بعد تعديل جدول التصنيفات)"""
+        with self._lock:
+            self._built_at = 0.0
+
+    def _rebuild_in_background(self):
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+
+        def rebuild():
+            try:
+                self.rebuild()
+            finally:
+                self._rebuild_lock.release()
+
+        try:
+            threading.Thread(target=rebuild, name="category-tree", daemon=True).start()
+        except Exception as e:
+            self._rebuild_lock.release()
+            logger.error(f"❌ خطأ في تشغيل إعادة بناء شجرة التصنيفات: {e}")
+
+    # === القراءة ===
+
+    @property
+    def loaded(self) -> bool:
+        """هل بُنيت الشجرة مرة واحدة على الأقل؟ (بدون محاولة بنائها)"""
+        return self._loaded
+
+    def get(self, category_id: int) -> Optional[CategoryNode]:
+        with self._lock:
+            return self._nodes.get(category_id)
+
+    def children(self, parent_id: Optional[int] = None) -> List[CategoryNode]:
+        """الأبناء المباشرون مرتبين بـ (name, id) - parent_id None أو 0 للتصنيفات الرئيسية"""
+        with self._lock:
+            if not parent_id:
+                ids = self._roots
+            else:
+                parent = self._nodes.get(parent_id)
+                ids = parent.children if parent else []
+            return [self._nodes[child_id] for child_id in ids]
+
+    def ancestors(self, category_id: int) -> List[int]:
+        """معرفات الأسلاف الموجودة من الأب المباشر حتى الجذر (يتوقف عند parent_id غير موجود)"""
+        result = []
+        with self._lock:
+            node = self._nodes.get(category_id)
+            while node is not None and node.parent_id and node.parent_id not in result:
+                node = self._nodes.get(node.parent_id)
+                if node is None:
+                    break
+                result.append(node.id)
+        return result
+
+    # === التحديث التدريجي ===
+
+    def adjust_count(self, category_id: Optional[int], delta: int):
+        """تعديل عدد فيديوهات تصنيف (وجميع أسلافه في العدد التراكمي)"""
+        if not category_id or not delta:
+            return
+        with self._lock:
+            node = self._nodes.get(category_id)
+            if node is None:
+                return
+            node.direct_count += delta
+            node.total_count += delta
+            for ancestor_id in self.ancestors(category_id):
+                self._nodes[ancestor_id].total_count += delta
+            self._adjustments += 1
+
+    def move_videos(self, old_category_ids: List[Optional[int]], new_category_id: Optional[int]):
+        """نقل فيديوهات من تصنيفاتها السابقة إلى تصنيف جديد"""
+        for old_category_id in old_category_ids:
+            if old_category_id != new_category_id:
+                self.adjust_count(old_category_id, -1)
+                self.adjust_count(new_category_id, 1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'categories': len(self._nodes),
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if self._loaded else None,
+                'builds': self._builds,
+                'adjustments': self._adjustments,
+            }
+
+
+category_tree = CategoryTree(ttl=CATEGORY_TREE_TTL)
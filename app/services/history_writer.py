@@ -0,0 +1,56 @@
+"""
+كاتب سجل المشاهدة المؤجل: يدمج أزواج (user_id, video_id) في الذاكرة مع الاحتفاظ
+بأحدث وقت مشاهدة، ويكتبها دورياً بأمر INSERT ... ON CONFLICT متعدد الصفوف
+"""
+import os
+import logging
+from datetime import datetime
+from typing import Dict, Tuple
+
+from psycopg2.extras import execute_values
+
+from app.database.connection import get_db_cursor
+from app.utils.write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '5'))
+HISTORY_FLUSH_MAX_KEYS = int(os.getenv('HISTORY_FLUSH_MAX_KEYS', '1000'))
+
+
+class HistoryWriter(WriteBehindBuffer):
+    """مخزن سجل المشاهدة حسب (user_id, video_id)"""
+
+    name = "history-writer"
+
+    def record(self, user_id: int, video_id: int, watched_at: datetime = None):
+        """تسجيل مشاهدة في الذاكرة (المشاهدات المتكررة لنفس الزوج تُدمج)"""
+        self.add((int(user_id), int(video_id)), watched_at or datetime.now())
+
+    def has_pending_for_user(self, user_id: int) -> bool:
+        """هل للمستخدم مشاهدات لم تُكتب بعد؟"""
+        with self._lock:
+            return any(key[0] == user_id for key in self._pending)
+
+    def _merge(self, current: datetime, value: datetime) -> datetime:
+        return max(current, value)
+
+    def _write(self, batch: Dict[Tuple[int, int], datetime]):
+        # الترتيب يضمن نفس ترتيب القفل بين الدفعات، وكل زوج يظهر مرة واحدة فقط
+        rows = [(user_id, video_id, watched_at, watched_at)
+                for (user_id, video_id), watched_at in sorted(batch.items())]
+        with get_db_cursor(standalone=True) as cursor:
+            execute_values(cursor, """
+                INSERT INTO user_history (user_id, video_id, last_viewed, last_watched)
+                VALUES %s
+                ON CONFLICT (user_id, video_id) DO UPDATE SET
+                    last_viewed = GREATEST(user_history.last_viewed, EXCLUDED.last_viewed),
+                    last_watched = GREATEST(user_history.last_watched, EXCLUDED.last_watched)
+            """, rows, page_size=500)
+        logger.debug(f"🔄 تمت كتابة {len(rows)} سجل مشاهدة")
+
+
+history_writer = HistoryWriter(
+    flush_interval=HISTORY_FLUSH_INTERVAL,
+    max_pending=HISTORY_FLUSH_MAX_KEYS,
+)
@@ -0,0 +1,62 @@
+"""
+آخر ظهور للمستخدمين: يُسجل في الذاكرة ويُكتب دورياً بأمر UPDATE ... FROM (VALUES ...) واحد
+يتطلب عمود bot_users.last_seen (python -m app.database.migrate)
+"""
+import os
+import logging
+from datetime import datetime
+from typing import Dict
+
+from app.database.connection import get_db_cursor
+from app.utils.write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+LAST_SEEN_FLUSH_INTERVAL = float(os.getenv('LAST_SEEN_FLUSH_INTERVAL', '30'))
+LAST_SEEN_FLUSH_MAX_KEYS = int(os.getenv('LAST_SEEN_FLUSH_MAX_KEYS', '2000'))
+
+# رمز خطأ PostgreSQL للعمود غير الموجود
+UNDEFINED_COLUMN = '42703'
+
+
+class LastSeenBuffer(WriteBehindBuffer):
+    """مخزن آخر ظهور حسب user_id (يُحتفظ بأحدث وقت فقط)"""
+
+    name = "last-seen"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._disabled = False
+
+    def record(self, user_id: int, seen_at: datetime = None):
+        """تسجيل ظهور المستخدم (في الذاكرة فقط)"""
+        if not self._disabled:
+            self.add(int(user_id), seen_at or datetime.now())
+
+    def _merge(self, current: datetime, value: datetime) -> datetime:
+        return max(current, value)
+
+    def _write(self, batch: Dict[int, datetime]):
+        items = sorted(batch.items())
+        values_sql = ', '.join(['(%s, %s::timestamp)'] * len(items))
+        params = [value for item in items for value in item]
+        try:
+            with get_db_cursor(standalone=True) as cursor:
+                cursor.execute(f"""
+                    UPDATE bot_users AS u
+                    SET last_seen = GREATEST(u.last_seen, d.seen)
+                    FROM (VALUES {values_sql}) AS d(user_id, seen)
+                    WHERE u.user_id = d.user_id
+                """, params)
+        except Exception as e:
+            if getattr(e, 'pgcode', None) != UNDEFINED_COLUMN:
+                raise
+            # الترحيل لم يُطبق بعد - نوقف التسجيل بدلاً من تكرار الخطأ في كل دورة
+            self._disabled = True
+            logger.warning("⚠️ عمود bot_users.last_seen غير موجود - شغّل: python -m app.database.migrate")
+
+
+last_seen = LastSeenBuffer(
+    flush_interval=LAST_SEEN_FLUSH_INTERVAL,
+    max_pending=LAST_SEEN_FLUSH_MAX_KEYS,
+)
@@ -1,20 +1,55 @@
 """
 خدمات الإحصائيات
 """
+import os
+import time
 import logging
-from typing import Dict, List
+import threading
+from typing import Dict, List, Optional
 from datetime import datetime
 from app.database.connection import get_db_cursor
 
 logger = logging.getLogger(__name__)
 
+# عمر لقطة الإحصائيات العامة قبل تحديثها في الخلفية (بالثواني)
+STATS_SNAPSHOT_TTL = float(os.getenv('STATS_SNAPSHOT_TTL', '60'))
+
+_snapshot = {'data': None, 'taken_at': 0.0}
+_snapshot_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
 
 class StatsService:
     """خدمة الإحصائيات الشاملة"""
     
     @staticmethod
     def get_general_stats() -> Dict:
-        """الإحصائيات العامة للبوت"""
+        """
+        الإحصائيات العامة للبوت من لقطة في الذاكرة (بدون استعلامات عد في كل طلب).
+        اللقطة المنتهية تُعاد كما هي ويُحدّثها خيط في الخلفية (stale-while-revalidate).
+        """
+        with _snapshot_lock:
+            snapshot, taken_at = _snapshot['data'], _snapshot['taken_at']
+        
+        if snapshot is None:
+            snapshot = StatsService.refresh_general_stats()
+            if snapshot is None:
+                return StatsService._empty_general_stats()
+        elif time.monotonic() - taken_at > STATS_SNAPSHOT_TTL:
+            StatsService._refresh_in_background()
+        
+        stats = dict(snapshot)
+        # المشاهدات المعلقة في مخزن العداد لم تصل لقاعدة البيانات بعد
+        try:
+            from app.services.view_counter import view_counter
+            stats['total_views'] += view_counter.pending_total()
+        except Exception:
+            pass
+        return stats
+    
+    @staticmethod
+    def refresh_general_stats() -> Optional[Dict]:
+        """حساب الإحصائيات العامة من قاعدة البيانات وتخزين اللقطة (None عند الفشل)"""
         try:
             with get_db_cursor() as cursor:
                 # إحصائيات أساسية
@@ -28,25 +63,51 @@ class StatsService:
                 """)
                 
                 result = cursor.fetchone()
-                
-                return {
-                    'videos': result[0] or 0,
-                    'users': result[1] or 0,
-                    'categories': result[2] or 0,
-                    'favorites': result[3] or 0,
-                    'total_views': result[4] or 0,
-                    'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M')
-                }
         except Exception as e:
             logger.error(f"❌ خطأ في الإحصائيات العامة: {e}")
-            return {
-                'videos': 0,
-                'users': 0,
-                'categories': 0,
-                'favorites': 0,
-                'total_views': 0,
-                'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M')
-            }
+            return None
+        
+        snapshot = {
+            'videos': result[0] or 0,
+            'users': result[1] or 0,
+            'categories': result[2] or 0,
+            'favorites': result[3] or 0,
+            'total_views': result[4] or 0,
+            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M')
+        }
+        with _snapshot_lock:
+            _snapshot['data'] = snapshot
+            _snapshot['taken_at'] = time.monotonic()
+        return snapshot
+    
+    @staticmethod
+    def _refresh_in_background():
+        """تحديث اللقطة في خيط منفصل (خيط واحد فقط في نفس الوقت)"""
+        if not _refresh_lock.acquire(blocking=False):
+            return
+        
+        def refresh():
+            try:
+                StatsService.refresh_general_stats()
+            finally:
+                _refresh_lock.release()
+        
+        try:
+            threading.Thread(target=refresh, name="stats-refresh", daemon=True).start()
+        except Exception as e:
+            _refresh_lock.release()
+            logger.error(f"❌ خطأ في تشغيل تحديث الإحصائيات: {e}")
+    
+    @staticmethod
+    def _empty_general_stats() -> Dict:
+        return {
+            'videos': 0,
+            'users': 0,
+            'categories': 0,
+            'favorites': 0,
+            'total_views': 0,
+            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M')
+        }
     
     @staticmethod
     def get_detailed_stats() -> Dict:
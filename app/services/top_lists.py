@@ -0,0 +1,216 @@
+"""
+قوائم أعلى N في الذاكرة (الأكثر مشاهدة والأحدث) لقوائم الأزرار 🔥 و🆕
+تُحدّث تدريجياً مع تسجيل المشاهدات وإضافة/حذف الفيديوهات، وتُطابق مع قاعدة البيانات دورياً.
+الصفوف من نوع VideoListItem.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from app.database.connection import get_db_cursor
+from app.models.repository import VIDEO_LIST_COLUMNS, fetch_rows
+from app.models.rows import VideoListItem
+
+logger = logging.getLogger(__name__)
+
+# عدد العناصر المحفوظ في كل قائمة (أكبر من المعروض حتى لا يفرغها الحذف)
+TOP_LIST_SIZE = int(os.getenv('TOP_LIST_SIZE', '50'))
+# الفترة بين كل مطابقة مع قاعدة البيانات (بالثواني)
+TOP_LIST_TTL = float(os.getenv('TOP_LIST_TTL', '300'))
+
+
+class TopList:
+    """قائمة أعلى N عنصر حسب مفتاح ترتيب (آمنة للخيوط)"""
+
+    def __init__(self, name: str, loader: Callable[[int], List[VideoListItem]],
+                 sort_key: Callable[[VideoListItem], tuple], capacity: int = 50, ttl: float = 300.0,
+                 accepts: Callable[[VideoListItem], bool] = None):
+        self.name = name
+        self.capacity = capacity
+        self.ttl = ttl
+        self._loader = loader
+        self._sort_key = sort_key
+        self._accepts = accepts or (lambda row: True)
+
+        self._rows: Dict[int, VideoListItem] = {}
+        self._sorted: Optional[List[VideoListItem]] = None
+        # هل تحتوي القائمة كل الصفوف المؤهلة؟ (الجدول أصغر من السعة)
+        self._complete = False
+        self._loaded_at = 0.0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reloads = 0
+        self._updates = 0
+
+    # === القراءة ===
+
+    @property
+    def loaded(self) -> bool:
+        """هل حُملت القائمة مرة واحدة على الأقل؟ (بدون محاولة تحميلها)"""
+        return self._loaded
+
+    def top(self, limit: int) -> Optional[List[VideoListItem]]:
+        """أعلى limit صف، أو None إذا تعذر تحميل القائمة أو طُلب أكثر من سعتها"""
+        if limit > self.capacity or not self.ensure_loaded():
+            return None
+        with self._lock:
+            if len(self._rows) < limit and not self._complete:
+                # الحذف أنقص القائمة عن المطلوب - نعيد تحميلها
+                self._loaded_at = 0.0
+            if self._sorted is None:
+                self._sorted = sorted(self._rows.values(), key=self._sort_key)
+            return self._sorted[:limit]
+
+    def contains(self, video_id: int) -> bool:
+        with self._lock:
+            return video_id in self._rows
+
+    # === التحميل والمطابقة ===
+
+    def reload(self) -> bool:
+        """مطابقة القائمة مع قاعدة البيانات"""
+        try:
+            rows = self._loader(self.capacity)
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحميل قائمة {self.name}: {e}")
+            return False
+
+        with self._lock:
+            self._rows = {row.id: row for row in rows}
+            self._sorted = None
+            self._complete = len(rows) < self.capacity
+            self._loaded_at = time.monotonic()
+            self._loaded = True
+            self._reloads += 1
+        return True
+
+    def ensure_loaded(self) -> bool:
+        """تحميل متزامن أول مرة ومطابقة في الخلفية عند انتهاء العمر"""
+        if not self._loaded:
+            with self._reload_lock:
+                if not self._loaded:
+                    return self.reload()
+            return self._loaded
+
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self._reload_in_background()
+        return True
+
+    def _reload_in_background(self):
+        if not self._reload_lock.acquire(blocking=False):
+            return
+
+        def reload():
+            try:
+                self.reload()
+            finally:
+                self._reload_lock.release()
+
+        try:
+            threading.Thread(target=reload, name=f"top-{self.name}", daemon=True).start()
+        except Exception as e:
+            self._reload_lock.release()
+            logger.error(f"❌ خطأ في تشغيل تحديث قائمة {self.name}: {e}")
+
+    # === التحديث التدريجي ===
+
+    def offer(self, row: VideoListItem) -> bool:
+        """إضافة/تحديث صف إذا كان مؤهلاً لدخول القائمة"""
+        if not self._loaded:
+            return False
+        with self._lock:
+            if row.id not in self._rows:
+                if not self._accepts(row):
+                    return False
+                if len(self._rows) >= self.capacity:
+                    worst = max(self._rows.values(), key=self._sort_key)
+                    if self._sort_key(row) >= self._sort_key(worst):
+                        return False
+                    del self._rows[worst.id]
+                    self._complete = False
+            self._rows[row.id] = row
+            self._sorted = None
+            self._updates += 1
+            return True
+
+    def add_views(self, video_id: int, delta: int) -> bool:
+        """زيادة عداد مشاهدات صف موجود في القائمة (False إذا لم يكن فيها)"""
+        with self._lock:
+            row = self._rows.get(video_id)
+            if row is None:
+                return False
+            self._rows[video_id] = row._replace(view_count=(row.view_count or 0) + delta)
+            self._sorted = None
+            self._updates += 1
+            return True
+
+    def remove(self, video_ids: List[int]):
+        """حذف صفوف من القائمة"""
+        with self._lock:
+            for video_id in video_ids:
+                if self._rows.pop(video_id, None) is not None:
+                    self._sorted = None
+                    self._updates += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'size': len(self._rows),
+                'capacity': self.capacity,
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded else None,
+                'reloads': self._reloads,
+                'updates': self._updates,
+            }
+
+
+def _with_pending_views(rows: List[VideoListItem]) -> List[VideoListItem]:
+    """إضافة المشاهدات المعلقة في مخزن العداد (لم تصل لقاعدة البيانات بعد)"""
+    from app.services.view_counter import view_counter
+    return [row._replace(view_count=(row.view_count or 0) + view_counter.pending_views(row.id))
+            for row in rows]
+
+
+def _load_popular(limit: int) -> List[VideoListItem]:
+    with get_db_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {VIDEO_LIST_COLUMNS}
+            FROM video_archive
+            WHERE view_count > 0
+            ORDER BY view_count DESC, upload_date DESC
+            LIMIT %s
+        """, (limit,))
+        return _with_pending_views(fetch_rows(cursor, VideoListItem))
+
+
+def _load_recent(limit: int) -> List[VideoListItem]:
+    with get_db_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {VIDEO_LIST_COLUMNS}
+            FROM video_archive
+            ORDER BY upload_date DESC
+            LIMIT %s
+        """, (limit,))
+        return _with_pending_views(fetch_rows(cursor, VideoListItem))
+
+
+def _descending(value) -> float:
+    """مفتاح ترتيب تنازلي للتواريخ (None في الآخر)"""
+    return -value.timestamp() if value is not None else float('inf')
+
+
+popular_videos = TopList(
+    'popular', _load_popular,
+    sort_key=lambda row: (-(row.view_count or 0), _descending(row.upload_date), -row.id),
+    capacity=TOP_LIST_SIZE, ttl=TOP_LIST_TTL,
+    accepts=lambda row: (row.view_count or 0) > 0,
+)
+
+recent_videos = TopList(
+    'recent', _load_recent,
+    sort_key=lambda row: (_descending(row.upload_date), -row.id),
+    capacity=TOP_LIST_SIZE, ttl=TOP_LIST_TTL,
+)
@@ -0,0 +1,268 @@
+"""
+محرك الرائج: درجة متناقصة أُسياً لكل فيديو (نصف عمر TRENDING_HALF_LIFE_HOURS)
+محفوظة في مصفوفات NumPy متجاورة.
+
+الدرجات تُخزن مضروبة في exp((t - ref) / tau) حتى لا تحتاج كل مشاهدة لتحديث
+جميع الدرجات: الترتيب لا يتغير بالتناقص، والدرجة الفعلية = المخزنة * exp(-(now - ref) / tau).
+عند كبر الأُس تُعاد معايرة المصفوفة كاملة بعملية متجهة واحدة وتُحذف الدرجات الضئيلة.
+أعلى K يُحسب في خيط الصيانة (argpartition) ويُقدم من الذاكرة في وقت الطلب.
+"""
+import os
+import math
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from app.database.connection import get_db_cursor
+
+logger = logging.getLogger(__name__)
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '24'))
+TRENDING_TOP_K = int(os.getenv('TRENDING_TOP_K', '50'))
+# إعادة حساب أعلى K (بالثواني)
+TRENDING_REFRESH_INTERVAL = float(os.getenv('TRENDING_REFRESH_INTERVAL', '30'))
+# حفظ لقطة الدرجات في قاعدة البيانات (بالثواني)
+TRENDING_SNAPSHOT_INTERVAL = float(os.getenv('TRENDING_SNAPSHOT_INTERVAL', '600'))
+# الدرجات الأقل من هذا الحد تُحذف عند المعايرة
+TRENDING_MIN_SCORE = float(os.getenv('TRENDING_MIN_SCORE', '0.05'))
+
+# أقصى أُس قبل إعادة المعايرة (exp(50) بعيد عن حدود float64)
+_MAX_EXPONENT = 50.0
+
+
+class TrendingEngine:
+    """درجات الرائج لكل فيديو مع أعلى K محسوب مسبقاً (آمن للخيوط)"""
+
+    def __init__(self, half_life_hours: float = 24.0, top_k: int = 50, refresh_interval: float = 30.0,
+                 snapshot_interval: float = 600.0, min_score: float = 0.05, initial_capacity: int = 1024):
+        self.tau = half_life_hours * 3600 / math.log(2)
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self.snapshot_interval = snapshot_interval
+        self.min_score = min_score
+
+        self._ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._scores = np.zeros(initial_capacity, dtype=np.float64)
+        self._slots: Dict[int, int] = {}
+        self._size = 0
+        self._ref = time.time()
+
+        self._top: List[Tuple[int, float]] = []
+        self._top_at = 0.0
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._restored = False
+
+        self._recorded = 0
+        self._snapshots = 0
+        self._last_snapshot_at = 0.0
+
+    # === التسجيل ===
+
+    def record(self, video_id: int, weight: float = 1.0, at: float = None):
+        """إضافة مشاهدة لدرجة الفيديو (at بتوقيت epoch، الافتراضي الآن)"""
+        self._ensure_started()
+        at = time.time() if at is None else at
+        with self._lock:
+            exponent = (at - self._ref) / self.tau
+            if exponent > _MAX_EXPONENT:
+                self._rebase(at)
+                exponent = 0.0
+            slot = self._slot_for(int(video_id))
+            self._scores[slot] += weight * math.exp(exponent)
+            self._recorded += 1
+
+    def forget(self, video_ids: List[int]):
+        """إزالة فيديوهات محذوفة من الترتيب"""
+        with self._lock:
+            removed = set()
+            for video_id in video_ids:
+                slot = self._slots.get(video_id)
+                if slot is not None:
+                    self._scores[slot] = 0.0
+                    removed.add(video_id)
+            if removed:
+                self._top = [item for item in self._top if item[0] not in removed]
+
+    # === القراءة ===
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        """أعلى limit فيديو: [(video_id, الدرجة الحالية)] - من القائمة المحسوبة مسبقاً"""
+        self._ensure_started()
+        if not self._top_at:
+            self.refresh_top()
+        with self._lock:
+            return self._top[:limit]
+
+    def refresh_top(self):
+        """إعادة حساب أعلى K بعملية متجهة (O(n) مرة كل فترة بدلاً من كل طلب)"""
+        now = time.time()
+        with self._lock:
+            size = self._size
+            if size == 0:
+                self._top, self._top_at = [], now
+                return
+            scores = self._scores[:size]
+            k = min(self.top_k, size)
+            candidates = np.argpartition(scores, size - k)[size - k:]
+            ordered = candidates[np.argsort(scores[candidates])[::-1]]
+            decay = math.exp(-(now - self._ref) / self.tau)
+            self._top = [
+                (int(self._ids[slot]), float(self._scores[slot] * decay))
+                for slot in ordered if self._scores[slot] > 0
+            ]
+            self._top_at = now
+
+    # === الصيانة ===
+
+    def _slot_for(self, video_id: int) -> int:
+        slot = self._slots.get(video_id)
+        if slot is not None:
+            return slot
+        if self._size == len(self._ids):
+            capacity = len(self._ids) * 2
+            self._ids = np.resize(self._ids, capacity)
+            self._scores = np.resize(self._scores, capacity)
+            self._scores[self._size:] = 0.0
+        slot = self._size
+        self._ids[slot] = video_id
+        self._scores[slot] = 0.0
+        self._slots[video_id] = slot
+        self._size += 1
+        return slot
+
+    def _rebase(self, now: float):
+        """معايرة جميع الدرجات إلى المرجع now وحذف الضئيلة منها (يُستدعى مع القفل)"""
+        size = self._size
+        scores = self._scores[:size] * math.exp(-(now - self._ref) / self.tau)
+        keep = scores >= self.min_score
+        kept = int(keep.sum())
+
+        self._ids[:kept] = self._ids[:size][keep]
+        self._scores[:kept] = scores[keep]
+        self._scores[kept:size] = 0.0
+        self._size = kept
+        self._slots = {int(video_id): slot for slot, video_id in enumerate(self._ids[:kept])}
+        self._ref = now
+
+    def current_scores(self) -> List[Tuple[int, float]]:
+        """جميع الدرجات الحالية (للحفظ)"""
+        now = time.time()
+        with self._lock:
+            self._rebase(now)
+            return [(int(video_id), float(score))
+                    for video_id, score in zip(self._ids[:self._size], self._scores[:self._size])]
+
+    def save_snapshot(self) -> bool:
+        """حفظ لقطة الدرجات الحالية في trending_snapshots"""
+        scores = self.current_scores()
+        taken_at = datetime.now()
+        try:
+            with get_db_cursor(standalone=True) as cursor:
+                cursor.execute("DELETE FROM trending_snapshots")
+                if scores:
+                    execute_values(cursor, """
+                        INSERT INTO trending_snapshots (video_id, score, taken_at) VALUES %s
+                    """, [(video_id, score, taken_at) for video_id, score in scores], page_size=1000)
+        except Exception as e:
+            logger.error(f"❌ خطأ في حفظ لقطة الرائج: {e}")
+            return False
+
+        self._snapshots += 1
+        self._last_snapshot_at = time.time()
+        logger.debug(f"💾 تم حفظ لقطة الرائج ({len(scores)} فيديو)")
+        return True
+
+    def restore(self) -> bool:
+        """استعادة الدرجات من آخر لقطة ثم إعادة تشغيل أحداث المشاهدة اللاحقة لها"""
+        try:
+            with get_db_cursor(standalone=True) as cursor:
+                cursor.execute("SELECT video_id, score, taken_at FROM trending_snapshots")
+                snapshot = cursor.fetchall()
+
+                if snapshot:
+                    since = max(row[2] for row in snapshot)
+                else:
+                    # بدون لقطة: الأحداث الأقدم من أربعة أنصاف أعمار لا تؤثر تقريباً
+                    since = datetime.fromtimestamp(time.time() - 4 * self.tau * math.log(2))
+                cursor.execute("""
+                    SELECT video_id, bucket, SUM(views)
+                    FROM video_view_events
+                    WHERE bucket > %s
+                    GROUP BY video_id, bucket
+                """, (since,))
+                events = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"❌ خطأ في استعادة ترتيب الرائج: {e}")
+            return False
+
+        for video_id, score, taken_at in snapshot:
+            self.record(video_id, weight=score, at=taken_at.timestamp())
+        for video_id, bucket, views in events:
+            self.record(video_id, weight=float(views), at=bucket.timestamp())
+
+        self._restored = True
+        logger.info(f"✅ تمت استعادة ترتيب الرائج: {len(snapshot)} من اللقطة و {len(events)} حدث")
+        return True
+
+    def start(self):
+        """تشغيل خيط الصيانة (الاستعادة ثم تحديث أعلى K وحفظ اللقطات دورياً)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="trending", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """إيقاف خيط الصيانة مع حفظ لقطة أخيرة"""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(10)
+        if self._restored:
+            self.save_snapshot()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'videos': self._size,
+                'capacity': len(self._ids),
+                'recorded': self._recorded,
+                'restored': self._restored,
+                'top_age_seconds': round(time.time() - self._top_at, 1) if self._top_at else None,
+                'snapshots': self._snapshots,
+            }
+
+    def _ensure_started(self):
+        if self._thread is None and not self._stopped.is_set():
+            self.start()
+
+    def _run(self):
+        self.restore()
+        self._last_snapshot_at = time.time()
+        self.refresh_top()
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh_top()
+                # بدون استعادة ناجحة (الجداول غير موجودة) لا نحفظ لقطات فوق بيانات ناقصة
+                if self._restored and time.time() - self._last_snapshot_at >= self.snapshot_interval:
+                    self.save_snapshot()
+            except Exception as e:
+                logger.error(f"❌ خطأ في خيط الرائج: {e}")
+
+
+trending = TrendingEngine(
+    half_life_hours=TRENDING_HALF_LIFE_HOURS,
+    top_k=TRENDING_TOP_K,
+    refresh_interval=TRENDING_REFRESH_INTERVAL,
+    snapshot_interval=TRENDING_SNAPSHOT_INTERVAL,
+    min_score=TRENDING_MIN_SCORE,
+)
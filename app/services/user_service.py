@@ -1,42 +1,96 @@
 """
 خدمات المستخدمين
 """
+import os
 import logging
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Set, Tuple, Dict
 from datetime import datetime, timedelta
-from app.database.connection import get_db_cursor
+from app.database.connection import get_db_cursor, on_commit
+from app.models.repository import FAVORITE_IDS_SQL, TOGGLE_FAVORITE_SQL, USER_VIDEO_COLUMNS, fetch_rows
+from app.models.rows import UserVideoItem
+from app.services.history_writer import history_writer
+from app.services.last_seen import last_seen
+from app.utils.cache import LRUCache, MISSING
+from app.utils.job_queue import run_in_background
 
 logger = logging.getLogger(__name__)
 
+# بصمات المستخدمين المعروفين: user_id -> (username, first_name) كما هي في قاعدة البيانات
+KNOWN_USERS_CACHE_SIZE = int(os.getenv('KNOWN_USERS_CACHE_SIZE', '50000'))
+KNOWN_USERS_CACHE_TTL = float(os.getenv('KNOWN_USERS_CACHE_TTL', '86400'))
+
+_known_users = LRUCache(maxsize=KNOWN_USERS_CACHE_SIZE, ttl=KNOWN_USERS_CACHE_TTL)
+
+# مفضلات كل مستخدم: user_id -> مجموعة معرفات الفيديوهات (تُحمل باستعلام واحد عند أول وصول)
+FAVORITES_CACHE_SIZE = int(os.getenv('FAVORITES_CACHE_SIZE', '10000'))
+FAVORITES_CACHE_TTL = float(os.getenv('FAVORITES_CACHE_TTL', '3600'))
+
+_favorites = LRUCache(maxsize=FAVORITES_CACHE_SIZE, ttl=FAVORITES_CACHE_TTL)
+
+try:
+    from app.core.config import settings
+    MAX_FAVORITES_PER_USER = settings.MAX_FAVORITES_PER_USER
+except Exception:
+    # الإعدادات الكاملة تتطلب متغيرات غير مستخدمة في وضع الـ webhook
+    MAX_FAVORITES_PER_USER = int(os.getenv('MAX_FAVORITES_PER_USER', '1000'))
+
+# نتائج toggle_favorite
+FAVORITE_ADDED = 'added'
+FAVORITE_REMOVED = 'removed'
+FAVORITE_LIMIT = 'limit'
+FAVORITE_ERROR = 'error'
+
 
 class UserService:
     """خدمة إدارة المستخدمين"""
     
     @staticmethod
     def add_user(user_id: int, username: str, first_name: str, last_name: str = None) -> bool:
-        """إضافة/تحديث مستخدم"""
+        """
+        إضافة/تحديث مستخدم (في طابور المهام الخلفية - لا ينتظر الرد قاعدة البيانات).
+        إذا كانت بيانات المستخدم مطابقة للمخزنة يُسجل آخر ظهور فقط بدون أي كتابة للصف.
+        """
         try:
-            with get_db_cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO bot_users (user_id, username, first_name, join_date)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (user_id) DO UPDATE SET
-                        username = EXCLUDED.username,
-                        first_name = EXCLUDED.first_name
-                """, (user_id, username, first_name, datetime.now()))
-                
+            now = datetime.now()
+            last_seen.record(user_id, now)
+            
+            if _known_users.get(user_id, MISSING) == (username, first_name):
                 return True
+            
+            return run_in_background(UserService._save_user, user_id, username, first_name, now)
         except Exception as e:
             logger.error(f"❌ خطأ في إضافة المستخدم: {e}")
             return False
     
     @staticmethod
-    def get_user_favorites(user_id: int, limit: int = 20) -> List[Tuple]:
+    def _save_user(user_id: int, username: str, first_name: str, join_date: datetime):
+        """كتابة المستخدم في قاعدة البيانات (الأخطاء تُرفع ليعيد الطابور المحاولة)"""
+        with get_db_cursor(standalone=True) as cursor:
+            # WHERE يمنع إعادة كتابة الصف (وصفوف ميتة) عندما لا يتغير شيء
+            cursor.execute("""
+                INSERT INTO bot_users (user_id, username, first_name, join_date)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = EXCLUDED.username,
+                    first_name = EXCLUDED.first_name
+                WHERE bot_users.username IS DISTINCT FROM EXCLUDED.username
+                   OR bot_users.first_name IS DISTINCT FROM EXCLUDED.first_name
+            """, (user_id, username, first_name, join_date))
+        
+        _known_users.set(user_id, (username, first_name))
+    
+    @staticmethod
+    def known_users_stats() -> Dict:
+        """مقاييس ذاكرة المستخدمين المعروفين"""
+        return _known_users.stats()
+    
+    @staticmethod
+    def get_user_favorites(user_id: int, limit: int = 20) -> List[UserVideoItem]:
         """الحصول على مفضلات المستخدم"""
         try:
             with get_db_cursor() as cursor:
-                cursor.execute("""
-                    SELECT v.id, v.title, v.caption, v.view_count, v.file_name, f.added_date
+                cursor.execute(f"""
+                    SELECT {USER_VIDEO_COLUMNS}, f.added_date
                     FROM user_favorites f
                     JOIN video_archive v ON f.video_id = v.id
                     WHERE f.user_id = %s
@@ -44,18 +98,22 @@ class UserService:
                     LIMIT %s
                 """, (user_id, limit))
                 
-                return cursor.fetchall()
+                return fetch_rows(cursor, UserVideoItem)
         except Exception as e:
             logger.error(f"❌ خطأ في المفضلات: {e}")
             return []
     
     @staticmethod
-    def get_user_history(user_id: int, limit: int = 20) -> List[Tuple]:
+    def get_user_history(user_id: int, limit: int = 20) -> List[UserVideoItem]:
         """الحصول على سجل المستخدم"""
         try:
+            # كتابة المشاهدات المعلقة أولاً حتى يرى المستخدم آخر ما شاهده
+            if history_writer.has_pending_for_user(user_id):
+                history_writer.flush()
+            
             with get_db_cursor() as cursor:
-                cursor.execute("""
-                    SELECT v.id, v.title, v.caption, v.view_count, v.file_name, h.last_watched
+                cursor.execute(f"""
+                    SELECT {USER_VIDEO_COLUMNS}, h.last_watched
                     FROM user_history h
                     JOIN video_archive v ON h.video_id = v.id
                     WHERE h.user_id = %s
@@ -63,59 +121,102 @@ class UserService:
                     LIMIT %s
                 """, (user_id, limit))
                 
-                return cursor.fetchall()
+                return fetch_rows(cursor, UserVideoItem)
         except Exception as e:
             logger.error(f"❌ خطأ في السجل: {e}")
             return []
     
     @staticmethod
-    def toggle_favorite(user_id: int, video_id: int) -> bool:
-        """إضافة/إزالة من المفضلة"""
+    def cached_favorite_ids(user_id: int):
+        """مجموعة مفضلات المستخدم من الذاكرة (أو MISSING إذا لم تُحمل)"""
+        return _favorites.get(user_id)
+    
+    @staticmethod
+    def cache_favorite_ids(user_id: int, ids: Set[int]):
+        """تخزين مجموعة مفضلات المستخدم بعد تحميلها"""
+        _favorites.set(user_id, ids)
+    
+    @staticmethod
+    def forget_favorite_ids(user_id: int):
+        """إبطال مجموعة المفضلات المخزنة (تُحمل من جديد عند الوصول التالي)"""
+        _favorites.delete(user_id)
+    
+    @staticmethod
+    def favorites_full(ids: Optional[Set[int]], video_id: int) -> bool:
+        """هل ستتجاوز إضافة الفيديو الحد الأقصى للمفضلات؟ (الإزالة مسموحة دائماً)"""
+        return ids is not None and video_id not in ids and len(ids) >= MAX_FAVORITES_PER_USER
+    
+    @staticmethod
+    def _favorite_ids(user_id: int) -> Optional[Set[int]]:
+        """مجموعة مفضلات المستخدم من الذاكرة (أو من قاعدة البيانات باستعلام واحد أول مرة)"""
+        ids = _favorites.get(user_id)
+        if ids is not MISSING:
+            return ids
+        
         try:
             with get_db_cursor() as cursor:
-                # فحص إذا كان في المفضلة
-                cursor.execute("SELECT id FROM user_favorites WHERE user_id = %s AND video_id = %s", (user_id, video_id))
-                exists = cursor.fetchone()
-                
-                if exists:
-                    # إزالة من المفضلة
-                    cursor.execute("DELETE FROM user_favorites WHERE user_id = %s AND video_id = %s", (user_id, video_id))
-                    return False  # تم إزالته
-                else:
-                    # إضافة للمفضلة
-                    cursor.execute("""
-                        INSERT INTO user_favorites (user_id, video_id, added_date, date_added)
-                        VALUES (%s, %s, %s, %s)
-                    """, (user_id, video_id, datetime.now(), datetime.now()))
-                    return True  # تم إضافته
+                cursor.execute(FAVORITE_IDS_SQL, {'user_id': user_id})
+                ids = {row[0] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحميل المفضلات: {e}")
+            return None
+        
+        UserService.cache_favorite_ids(user_id, ids)
+        return ids
+    
+    @staticmethod
+    def toggle_favorite(user_id: int, video_id: int) -> str:
+        """
+        إضافة/إزالة من المفضلة بأمر واحد ذري.
+        يُرجع FAVORITE_ADDED أو FAVORITE_REMOVED، أو FAVORITE_LIMIT عند بلوغ الحد الأقصى
+        للمفضلات، أو FAVORITE_ERROR عند خطأ قاعدة البيانات (الحالة لم تتغير).
+        """
+        try:
+            ids = UserService._favorite_ids(user_id)
+            if UserService.favorites_full(ids, video_id):
+                return FAVORITE_LIMIT
+            
+            with get_db_cursor() as cursor:
+                cursor.execute(TOGGLE_FAVORITE_SQL,
+                               {'user_id': user_id, 'video_id': video_id, 'now': datetime.now()})
+                added = cursor.fetchone()[0]
+                # المجموعة المخزنة تُحدث بعد الـ commit فقط حتى لا تخالف قاعدة البيانات عند التراجع
+                on_commit(lambda: UserService.favorite_toggled(user_id, video_id, added))
+            
+            return FAVORITE_ADDED if added else FAVORITE_REMOVED
                     
         except Exception as e:
+            UserService.forget_favorite_ids(user_id)
             logger.error(f"❌ خطأ في المفضلة: {e}")
-            return False
+            return FAVORITE_ERROR
+    
+    @staticmethod
+    def favorite_toggled(user_id: int, video_id: int, added: bool):
+        """تحديث مجموعة مفضلات المستخدم المخزنة بعد نجاح الإضافة/الإزالة"""
+        ids = _favorites.get(user_id)
+        if ids is MISSING or ids is None:
+            return
+        if added:
+            ids.add(video_id)
+        else:
+            ids.discard(video_id)
     
     @staticmethod
     def is_favorite(user_id: int, video_id: int) -> bool:
-        """فحص إذا كان الفيديو في المفضلة"""
-        try:
-            with get_db_cursor() as cursor:
-                cursor.execute("SELECT id FROM user_favorites WHERE user_id = %s AND video_id = %s", (user_id, video_id))
-                return cursor.fetchone() is not None
-        except:
-            return False
+        """فحص إذا كان الفيديو في المفضلة (من الذاكرة)"""
+        ids = UserService._favorite_ids(user_id)
+        return ids is not None and video_id in ids
+    
+    @staticmethod
+    def favorites_cache_stats() -> Dict:
+        """مقاييس ذاكرة المفضلات"""
+        return _favorites.stats()
     
     @staticmethod
     def add_to_history(user_id: int, video_id: int):
-        """إضافة إلى سجل المشاهدة"""
+        """إضافة إلى سجل المشاهدة (تُدمج في الذاكرة وتُكتب دفعة واحدة دورياً)"""
         try:
-            with get_db_cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO user_history (user_id, video_id, last_viewed, last_watched)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (user_id, video_id) DO UPDATE SET
-                        last_viewed = EXCLUDED.last_viewed,
-                        last_watched = EXCLUDED.last_watched
-                """, (user_id, video_id, datetime.now(), datetime.now()))
-                
+            history_writer.record(user_id, video_id)
         except Exception as e:
             logger.error(f"❌ خطأ في إضافة إلى السجل: {e}")
     
@@ -1,81 +1,159 @@
 """
 خدمات الفيديوهات مع بحث محسن - إصدار مُصحح
 """
+import os
+import json
 import logging
 from typing import List, Optional, Tuple, Dict
 from datetime import datetime
-from app.database.connection import get_db_cursor
+from app.database.connection import get_db_cursor, on_commit
+from app.database.schema import SEARCH_TS_CONFIG, normalize_search_text
+from app.models.repository import VIDEO_LIST_COLUMNS, VideoRepository, fetch_rows
+from app.models.rows import VideoDelivery, VideoDetail, VideoListItem
+from app.utils.pagination import AFTER, BEFORE, decode_cursor, encode_cursor, keyset_condition
+from app.services.view_counter import view_counter
+from app.services.category_tree import category_tree
+from app.services.top_lists import popular_videos, recent_videos
+from app.services.trending import trending
+from app.services.view_events import view_events
+from app.utils.cache import LRUCache, MISSING
 
 logger = logging.getLogger(__name__)
 
+# وضع البحث الافتراضي: 'ilike' أو 'fts' أو 'trigram'
+# (يتطلبان: python -m app.database.schema fts / trigram)
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'ilike')
+
+# الحد الأقصى للعد في البحث الواسع (يُعرض "1000+" بدلاً من العد الكامل)
+SEARCH_COUNT_CAP = int(os.getenv('SEARCH_COUNT_CAP', '1000'))
+
+# ذاكرة صفوف تفاصيل الفيديو (get_video_by_id) - المعرف غير الموجود يُخزن لمدة أقصر
+VIDEO_CACHE_SIZE = int(os.getenv('VIDEO_CACHE_SIZE', '5000'))
+VIDEO_CACHE_TTL = float(os.getenv('VIDEO_CACHE_TTL', '300'))
+VIDEO_CACHE_NEGATIVE_TTL = float(os.getenv('VIDEO_CACHE_NEGATIVE_TTL', '30'))
+
+_video_cache = LRUCache(maxsize=VIDEO_CACHE_SIZE, ttl=VIDEO_CACHE_TTL)
+
 
 class VideoService:
     """خدمة إدارة الفيديوهات مع بحث محسن"""
     
     @staticmethod
-    def search_videos(query: str, category_id: Optional[int] = None, limit: int = 20, page: int = 1) -> List[Tuple]:
+    def _search_filter(query: str, mode: str) -> Tuple[str, list, str, list]:
+        """بناء شرط البحث وترتيب الصلة حسب وضع البحث"""
+        if mode == 'fts':
+            tsquery = f"websearch_to_tsquery('{SEARCH_TS_CONFIG}', %s)"
+            return (
+                f"search_vector @@ {tsquery}",
+                [query],
+                f"ts_rank(search_vector, {tsquery}) DESC",
+                [query],
+            )
+        
+        if mode == 'trigram':
+            # بحث تقريبي يتحمل اختلاف الإملاء (ة/ه، أ/ا/إ) - المعاملات % و <% تستخدم فهارس GIN
+            normalized = normalize_search_text(query)
+            return (
+                """
+                (
+                    archive_normalize(title) %% %s OR
+                    %s <%% archive_normalize(title) OR
+                    %s <%% archive_normalize(caption) OR
+                    %s <%% archive_normalize(file_name)
+                )
+                """,
+                [normalized] * 4,
+                """
+                GREATEST(
+                    similarity(archive_normalize(title), %s),
+                    word_similarity(%s, archive_normalize(title)),
+                    word_similarity(%s, archive_normalize(caption)) * 0.8,
+                    word_similarity(%s, archive_normalize(file_name)) * 0.9
+                ) DESC
+                """,
+                [normalized] * 4,
+            )
+        
+        # الوضع الافتراضي: بحث جزئي ILIKE في جميع الحقول المهمة (بدون file_size)
+        pattern = f"%{query}%"
+        return (
+            """
+            (
+                title ILIKE %s OR 
+                caption ILIKE %s OR 
+                file_name ILIKE %s OR
+                metadata::text ILIKE %s
+            )
+            """,
+            [pattern, pattern, pattern, pattern],
+            """
+            CASE 
+                WHEN title ILIKE %s THEN 1
+                WHEN caption ILIKE %s THEN 2
+                WHEN file_name ILIKE %s THEN 3
+                ELSE 4
+            END
+            """,
+            [pattern, pattern, pattern],
+        )
+    
+    @staticmethod
+    def _search_where(query: str, category_id: Optional[int], mode: Optional[str]) -> Tuple[str, list, str, list]:
+        """شرط البحث الكامل (مع التصنيف إن وُجد) وترتيب الصلة"""
+        where_clause, params, rank_order, rank_params = VideoService._search_filter(
+            query, mode or SEARCH_MODE
+        )
+        
+        if category_id:
+            where_clause += " AND category_id = %s"
+            params.append(category_id)
+        
+        return where_clause, params, rank_order, rank_params
+    
+    @staticmethod
+    def search_videos(query: str, category_id: Optional[int] = None, limit: int = 20, page: int = 1,
+                      mode: Optional[str] = None) -> List[VideoListItem]:
         """البحث المحسن في الفيديوهات - يبحث في العنوان والوصف واسم الملف"""
         try:
             with get_db_cursor() as cursor:
                 offset = (page - 1) * limit
-                
-                # بحث شامل في جميع الحقول المهمة (بدون file_size)
-                where_clause = """
-                (
-                    title ILIKE %s OR 
-                    caption ILIKE %s OR 
-                    file_name ILIKE %s OR
-                    metadata::text ILIKE %s
+                where_clause, params, rank_order, rank_params = VideoService._search_where(
+                    query, category_id, mode
                 )
-                """
-                params = [f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"]
-                
-                if category_id:
-                    where_clause += " AND category_id = %s"
-                    params.append(category_id)
                 
                 cursor.execute(f"""
-                    SELECT id, title, caption, view_count, file_name, 
-                           category_id, upload_date, file_id, message_id
+                    SELECT {VIDEO_LIST_COLUMNS}
                     FROM video_archive 
                     WHERE {where_clause}
                     ORDER BY 
-                        CASE 
-                            WHEN title ILIKE %s THEN 1
-                            WHEN caption ILIKE %s THEN 2
-                            WHEN file_name ILIKE %s THEN 3
-                            ELSE 4
-                        END,
+                        {rank_order},
                         view_count DESC, 
-                        upload_date DESC
+                        upload_date DESC,
+                        id DESC
                     LIMIT %s OFFSET %s
-                """, params + [f"%{query}%", f"%{query}%", f"%{query}%", limit, offset])
+                """, params + rank_params + [limit, offset])
                 
-                return cursor.fetchall()
+                return fetch_rows(cursor, VideoListItem)
         except Exception as e:
             logger.error(f"❌ خطأ في البحث: {e}")
             return []
     
     @staticmethod
-    def get_search_count(query: str, category_id: Optional[int] = None) -> int:
-        """الحصول على عدد نتائج البحث الإجمالي"""
+    def get_search_count(query: str, category_id: Optional[int] = None, mode: Optional[str] = None,
+                         cap: Optional[int] = None) -> int:
+        """الحصول على عدد نتائج البحث الإجمالي (أو حتى cap فقط إذا حُدد)"""
         try:
             with get_db_cursor() as cursor:
-                where_clause = """
-                (
-                    title ILIKE %s OR 
-                    caption ILIKE %s OR 
-                    file_name ILIKE %s OR
-                    metadata::text ILIKE %s
-                )
-                """
-                params = [f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"]
-                
-                if category_id:
-                    where_clause += " AND category_id = %s"
-                    params.append(category_id)
+                where_clause, params, _, _ = VideoService._search_where(query, category_id, mode)
                 
-                cursor.execute(f"SELECT COUNT(*) FROM video_archive WHERE {where_clause}", params)
+                if cap:
+                    cursor.execute(f"""
+                        SELECT COUNT(*) FROM (
+                            SELECT 1 FROM video_archive WHERE {where_clause} LIMIT %s
+                        ) capped
+                    """, params + [cap])
+                else:
+                    cursor.execute(f"SELECT COUNT(*) FROM video_archive WHERE {where_clause}", params)
                 
                 return cursor.fetchone()[0]
         except Exception as e:
@@ -83,47 +161,287 @@ class VideoService:
             return 0
     
     @staticmethod
-    def get_video_by_id(video_id: int) -> Optional[Tuple]:
-        """الحصول على فيديو بالمعرف"""
+    def _estimate_search_count(cursor, where_clause: str, params: list) -> int:
+        """تقدير عدد النتائج من مخطط الاستعلام بدون تنفيذه"""
+        cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM video_archive WHERE {where_clause}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    
+    @staticmethod
+    def search_videos_with_count(query: str, category_id: Optional[int] = None, limit: int = 20,
+                                 page: int = 1, mode: Optional[str] = None,
+                                 count_strategy: str = 'exact',
+                                 count_cap: Optional[int] = None) -> Tuple[List[VideoListItem], int, str]:
+        """
+        البحث مع العدد الإجمالي في استعلام واحد بدلاً من مسحين للجدول.
+        count_strategy:
+            'exact'    - عدد دقيق عبر COUNT(*) OVER ()
+            'capped'   - يتوقف العد عند count_cap (النتيجة "1000+")
+            'estimate' - تقدير المخطط للبحث الواسع، وعد دقيق إذا كان التقدير أقل من count_cap
+        يُرجع (النتائج، العدد، نوع العدد) ونوع العدد: 'exact' أو 'capped' أو 'estimate'
+        """
+        cap = count_cap or SEARCH_COUNT_CAP
         try:
             with get_db_cursor() as cursor:
-                cursor.execute("""
-                    SELECT v.id, v.message_id, v.caption, v.chat_id, v.file_name, v.file_id, 
-                           v.category_id, v.metadata, v.view_count, v.title, v.grouping_key, 
-                           v.upload_date, c.name as category_name, c.full_path as category_path
-                    FROM video_archive v
-                    LEFT JOIN categories c ON v.category_id = c.id
-                    WHERE v.id = %s
-                """, (video_id,))
+                offset = (page - 1) * limit
+                where_clause, params, rank_order, rank_params = VideoService._search_where(
+                    query, category_id, mode
+                )
+                
+                count_kind = 'exact'
+                estimated = None
+                if count_strategy == 'estimate':
+                    estimated = VideoService._estimate_search_count(cursor, where_clause, params)
+                    if estimated > cap:
+                        count_kind = 'estimate'
+                elif count_strategy == 'capped':
+                    count_kind = 'capped'
+                
+                if count_kind == 'estimate':
+                    count_sql, count_params = "NULL", []
+                elif count_kind == 'capped':
+                    # استعلام فرعي غير مرتبط يُنفذ مرة واحدة ويتوقف بعد cap + 1 صف
+                    count_sql = f"""(
+                        SELECT COUNT(*) FROM (
+                            SELECT 1 FROM video_archive WHERE {where_clause} LIMIT %s
+                        ) capped
+                    )"""
+                    count_params = params + [cap + 1]
+                else:
+                    count_sql, count_params = "COUNT(*) OVER ()", []
                 
-                return cursor.fetchone()
+                cursor.execute(f"""
+                    SELECT {VIDEO_LIST_COLUMNS},
+                           {count_sql} AS total_count
+                    FROM video_archive 
+                    WHERE {where_clause}
+                    ORDER BY 
+                        {rank_order},
+                        view_count DESC, 
+                        upload_date DESC,
+                        id DESC
+                    LIMIT %s OFFSET %s
+                """, count_params + params + rank_params + [limit, offset])
+                
+                rows = cursor.fetchall()
+                if count_kind == 'estimate':
+                    total = estimated
+                else:
+                    total = rows[0][-1] if rows else 0
+                    if count_kind == 'capped':
+                        if total > cap:
+                            total = cap
+                        else:
+                            count_kind = 'exact'
+                
+                return [VideoListItem._make(row[:-1]) for row in rows], total, count_kind
+        except Exception as e:
+            logger.error(f"❌ خطأ في البحث: {e}")
+            return [], 0, 'exact'
+    
+    @staticmethod
+    def cached_video(video_id: int):
+        """صف التفاصيل من الذاكرة: الصف، أو None (غير موجود)، أو MISSING إذا لم يُخزن"""
+        return _video_cache.get(video_id)
+    
+    @staticmethod
+    def cache_video(video_id: int, video: Optional[VideoDetail]):
+        """تخزين صف التفاصيل (None يُخزن كغير موجود لمدة أقصر)"""
+        _video_cache.set(video_id, video, ttl=None if video else VIDEO_CACHE_NEGATIVE_TTL)
+    
+    @staticmethod
+    def get_video_by_id(video_id: int) -> Optional[VideoDetail]:
+        """الحصول على تفاصيل فيديو بالمعرف (عبر ذاكرة مؤقتة تُبطل عند التعديل)"""
+        cached = _video_cache.get(video_id)
+        if cached is not MISSING:
+            return cached
+        
+        try:
+            video = VideoRepository.get_detail(video_id)
         except Exception as e:
             logger.error(f"❌ خطأ في الحصول على الفيديو: {e}")
             return None
+        
+        VideoService.cache_video(video_id, video)
+        return video
     
     @staticmethod
-    def get_videos_by_category(category_id: int, limit: int = 20, page: int = 1) -> List[Tuple]:
-        """الحصول على فيديوهات تصنيف معين مع التصفح"""
+    def get_videos_by_ids(video_ids: List[int]) -> Dict[int, VideoDetail]:
+        """عدة فيديوهات بالمعرفات: من الذاكرة ثم استعلام واحد للباقي"""
+        videos, missing = {}, []
+        for video_id in video_ids:
+            cached = _video_cache.get(video_id)
+            if cached is MISSING:
+                missing.append(video_id)
+            elif cached:
+                videos[video_id] = cached
+        
+        if missing:
+            try:
+                fetched = VideoRepository.get_details(missing)
+            except Exception as e:
+                logger.error(f"❌ خطأ في الحصول على الفيديوهات: {e}")
+                return videos
+            for video_id, video in fetched.items():
+                videos[video_id] = video
+                VideoService.cache_video(video_id, video)
+        return videos
+    
+    @staticmethod
+    def get_video_for_delivery(video_id: int) -> Optional[VideoDelivery]:
+        """أعمدة إرسال الفيديو فقط (من صف التفاصيل المخزن إن وُجد)"""
+        cached = _video_cache.get(video_id)
+        if cached is not MISSING:
+            return VideoDelivery.from_detail(cached) if cached else None
+        
         try:
-            with get_db_cursor() as cursor:
-                offset = (page - 1) * limit
+            return VideoRepository.get_delivery(video_id)
+        except Exception as e:
+            logger.error(f"❌ خطأ في الحصول على الفيديو: {e}")
+            return None
+    
+    @staticmethod
+    def invalidate_video(video_id: int):
+        """إبطال صف فيديو في الذاكرة المؤقتة"""
+        _video_cache.delete(video_id)
+    
+    @staticmethod
+    def invalidate_videos(video_ids: List[int]):
+        """إبطال عدة صفوف فيديو في الذاكرة المؤقتة"""
+        _video_cache.delete_many(video_ids)
+    
+    @staticmethod
+    def videos_deleted(video_ids: List[int], old_category_ids: List[int]):
+        """تحديث الذاكرة بعد حذف فيديوهات (يُستدعى بعد الـ commit فقط)"""
+        VideoService.invalidate_videos(video_ids)
+        for old_category_id in old_category_ids:
+            category_tree.adjust_count(old_category_id, -1)
+        popular_videos.remove(video_ids)
+        recent_videos.remove(video_ids)
+        trending.forget(video_ids)
+    
+    @staticmethod
+    def videos_moved(video_ids: List[int], old_category_ids: List[int], category_id: int):
+        """تحديث الذاكرة بعد نقل فيديوهات لتصنيف آخر (يُستدعى بعد الـ commit فقط)"""
+        VideoService.invalidate_videos(video_ids)
+        category_tree.move_videos(old_category_ids, category_id)
+    
+    @staticmethod
+    def video_added(video: VideoListItem, category_id: int):
+        """تحديث الذاكرة بعد إضافة فيديو (يُستدعى بعد الـ commit فقط)"""
+        # المعرف الجديد قد يكون مخزناً كغير موجود
+        VideoService.invalidate_video(video.id)
+        category_tree.adjust_count(category_id, 1)
+        recent_videos.offer(video)
+    
+    @staticmethod
+    def video_cache_stats() -> Dict:
+        """مقاييس ذاكرة صفوف الفيديو"""
+        return _video_cache.stats()
+    
+    @staticmethod
+    def _list_videos_in(scope: str, scope_params: list, limit: int, page: int,
+                        cursor: Optional[str]) -> List[VideoListItem]:
+        """
+        صفحة فيديوهات ضمن نطاق (شرط WHERE) مرتبة بالمشاهدات.
+        مع cursor يُستخدم التصفح بالمفاتيح على (view_count, upload_date, id) بدلاً من OFFSET
+        """
+        with get_db_cursor() as db_cursor:
+            keyset = decode_cursor(cursor)
+            if keyset:
+                direction, key = keyset
+                order = "DESC" if direction == AFTER else "ASC"
+                condition, key_params = keyset_condition(("view_count", "upload_date", "id"), direction, key)
                 
-                cursor.execute("""
-                    SELECT id, title, caption, view_count, file_name, upload_date, file_id
+                db_cursor.execute(f"""
+                    SELECT {VIDEO_LIST_COLUMNS}
                     FROM video_archive 
-                    WHERE category_id = %s
-                    ORDER BY view_count DESC, upload_date DESC
-                    LIMIT %s OFFSET %s
-                """, (category_id, limit, offset))
+                    WHERE {scope}
+                      AND {condition}
+                    ORDER BY view_count {order}, upload_date {order}, id {order}
+                    LIMIT %s
+                """, (*scope_params, *key_params, limit))
                 
-                return cursor.fetchall()
+                rows = fetch_rows(db_cursor, VideoListItem)
+                return rows if direction == AFTER else rows[::-1]
+            
+            offset = (page - 1) * limit
+            db_cursor.execute(f"""
+                SELECT {VIDEO_LIST_COLUMNS}
+                FROM video_archive 
+                WHERE {scope}
+                ORDER BY view_count DESC, upload_date DESC, id DESC
+                LIMIT %s OFFSET %s
+            """, (*scope_params, limit, offset))
+            
+            return fetch_rows(db_cursor, VideoListItem)
+    
+    @staticmethod
+    def get_videos_by_category(category_id: int, limit: int = 20, page: int = 1,
+                               cursor: Optional[str] = None) -> List[VideoListItem]:
+        """الحصول على فيديوهات تصنيف معين (المباشرة فقط) مع التصفح"""
+        try:
+            return VideoService._list_videos_in("category_id = %s", [category_id], limit, page, cursor)
         except Exception as e:
             logger.error(f"❌ خطأ في فيديوهات التصنيف: {e}")
             return []
     
+    @staticmethod
+    def get_subtree_videos(category_id: int, limit: int = 20, page: int = 1,
+                           cursor: Optional[str] = None) -> List[VideoListItem]:
+        """
+        فيديوهات التصنيف وجميع تصنيفاته الفرعية في استعلام واحد عبر جدول category_closure
+        (يتطلب: python -m app.database.migrate). عند غيابه تُعاد الفيديوهات المباشرة فقط.
+        """
+        try:
+            return VideoService._list_videos_in(
+                "category_id IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = %s)",
+                [category_id], limit, page, cursor
+            )
+        except Exception as e:
+            logger.error(f"❌ خطأ في فيديوهات الشجرة الفرعية: {e}")
+            return VideoService.get_videos_by_category(category_id, limit, page, cursor)
+    
+    @staticmethod
+    def get_subtree_videos_count(category_id: int) -> int:
+        """عدد فيديوهات التصنيف وجميع تصنيفاته الفرعية (من شجرة التصنيفات إن وُجد فيها)"""
+        if category_tree.ensure_loaded():
+            node = category_tree.get(category_id)
+            if node is not None:
+                return node.total_count
+        
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM video_archive
+                    WHERE category_id IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = %s)
+                """, (category_id,))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"❌ خطأ في عدد فيديوهات الشجرة الفرعية: {e}")
+            return VideoService.get_category_videos_count(category_id)
+    
+    @staticmethod
+    def video_page_cursors(videos: List[VideoListItem]) -> Tuple[Optional[str], Optional[str]]:
+        """مؤشرا الصفحة السابقة والتالية لصفحة فيديوهات"""
+        if not videos:
+            return None, None
+        first, last = videos[0], videos[-1]
+        return (
+            encode_cursor(BEFORE, (first.view_count, first.upload_date, first.id)),
+            encode_cursor(AFTER, (last.view_count, last.upload_date, last.id)),
+        )
+    
     @staticmethod
     def get_category_videos_count(category_id: int) -> int:
-        """الحصول على عدد فيديوهات التصنيف"""
+        """الحصول على عدد فيديوهات التصنيف (من شجرة التصنيفات إن وُجد فيها)"""
+        if category_tree.ensure_loaded():
+            node = category_tree.get(category_id)
+            if node is not None:
+                return node.direct_count
+        
         try:
             with get_db_cursor() as cursor:
                 cursor.execute("SELECT COUNT(*) FROM video_archive WHERE category_id = %s", (category_id,))
@@ -133,50 +451,90 @@ class VideoService:
             return 0
     
     @staticmethod
-    def update_view_count(video_id: int) -> bool:
-        """زيادة عداد المشاهدة"""
+    def update_view_count(video_id: int, video: Optional[VideoDetail] = None) -> bool:
+        """
+        زيادة عداد المشاهدة (تُجمع في الذاكرة وتُكتب دفعة واحدة دورياً).
+        video: صف get_video_by_id إن كان متاحاً لدى المستدعي (بدون أي استعلام حينها).
+        """
         try:
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    "UPDATE video_archive SET view_count = view_count + 1 WHERE id = %s", 
-                    (video_id,)
-                )
-                return True
+            view_counter.record(video_id)
+            view_events.record(video_id)
+            trending.record(video_id)
+            recent_videos.add_views(video_id, 1)
+            
+            # قائمة الأكثر مشاهدة: زيادة العداد إن كان الفيديو فيها، وإلا عرضه عليها بعدده الحالي
+            if not popular_videos.add_views(video_id, 1):
+                if video is None:
+                    video = VideoService.get_video_by_id(video_id)  # من الذاكرة المؤقتة عادة
+                if video:
+                    popular_videos.offer(VideoService._list_row(video, view_counter.pending_views(video_id)))
+            return True
         except Exception as e:
             logger.error(f"❌ خطأ في تحديث عداد المشاهدة: {e}")
             return False
     
     @staticmethod
-    def get_popular_videos(limit: int = 10) -> List[Tuple]:
-        """الحصول على أشهر الفيديوهات"""
+    def _list_row(video: VideoDetail, pending_views: int = 0) -> VideoListItem:
+        """تحويل صف التفاصيل إلى عنصر قائمة (مع المشاهدات المعلقة)"""
+        return VideoListItem(video.id, video.title, (video.view_count or 0) + pending_views,
+                             video.file_name, video.upload_date)
+    
+    @staticmethod
+    def get_popular_videos(limit: int = 10) -> List[VideoListItem]:
+        """الحصول على أشهر الفيديوهات (من القائمة المحفوظة في الذاكرة)"""
+        cached = popular_videos.top(limit)
+        if cached is not None:
+            return cached
+        
         try:
             with get_db_cursor() as cursor:
-                cursor.execute("""
-                    SELECT id, title, caption, view_count, file_name, upload_date
+                cursor.execute(f"""
+                    SELECT {VIDEO_LIST_COLUMNS}
                     FROM video_archive 
                     WHERE view_count > 0
                     ORDER BY view_count DESC, upload_date DESC
                     LIMIT %s
                 """, (limit,))
                 
-                return cursor.fetchall()
+                return fetch_rows(cursor, VideoListItem)
         except Exception as e:
             logger.error(f"❌ خطأ في الفيديوهات الشائعة: {e}")
             return []
     
     @staticmethod
-    def get_recent_videos(limit: int = 10) -> List[Tuple]:
-        """الحصول على أحدث الفيديوهات"""
+    def get_trending_videos(limit: int = 10) -> List[VideoListItem]:
+        """
+        الفيديوهات الرائجة (درجة مشاهدات متناقصة مع الزمن) بنفس شكل صفوف القوائم.
+        الترتيب من الذاكرة والصفوف من ذاكرة صفوف الفيديو، وغير المخزن منها باستعلام واحد.
+        """
+        try:
+            video_ids = [video_id for video_id, _ in trending.top(limit)]
+            videos = VideoService.get_videos_by_ids(video_ids)
+            return [
+                VideoService._list_row(videos[video_id], view_counter.pending_views(video_id))
+                for video_id in video_ids if video_id in videos
+            ]
+        except Exception as e:
+            logger.error(f"❌ خطأ في الفيديوهات الرائجة: {e}")
+            return []
+    
+    @staticmethod
+    def get_recent_videos(limit: int = 10) -> List[VideoListItem]:
+        """الحصول على أحدث الفيديوهات (من القائمة المحفوظة في الذاكرة)"""
+        cached = recent_videos.top(limit)
+        if cached is not None:
+            return cached
+        
         try:
             with get_db_cursor() as cursor:
-                cursor.execute("""
-                    SELECT id, title, caption, view_count, file_name, upload_date
+                cursor.execute(f"""
+                    SELECT {VIDEO_LIST_COLUMNS}
                     FROM video_archive 
                     ORDER BY upload_date DESC
                     LIMIT %s
                 """, (limit,))
                 
-                return cursor.fetchall()
+                return fetch_rows(cursor, VideoListItem)
         except Exception as e:
             logger.error(f"❌ خطأ في الفيديوهات الحديثة: {e}")
             return []
@@ -186,8 +544,13 @@ class VideoService:
         """حذف فيديو (للمشرفين)"""
         try:
             with get_db_cursor() as cursor:
-                cursor.execute("DELETE FROM video_archive WHERE id = %s", (video_id,))
-                return cursor.rowcount > 0
+                cursor.execute("DELETE FROM video_archive WHERE id = %s RETURNING category_id", (video_id,))
+                deleted = cursor.fetchone()
+                if deleted is None:
+                    return False
+                # الذاكرة تُحدث بعد الـ commit حتى لا تصف كتابة تم التراجع عنها
+                on_commit(lambda: VideoService.videos_deleted([video_id], [deleted[0]]))
+                return True
         except Exception as e:
             logger.error(f"❌ خطأ في حذف الفيديو: {e}")
             return False
@@ -197,11 +560,18 @@ class VideoService:
         """تحديث تصنيف الفيديو"""
         try:
             with get_db_cursor() as cursor:
-                cursor.execute(
-                    "UPDATE video_archive SET category_id = %s WHERE id = %s", 
-                    (category_id, video_id)
-                )
-                return cursor.rowcount > 0
+                # التصنيف السابق مطلوب لتحديث عدادات شجرة التصنيفات
+                cursor.execute("""
+                    UPDATE video_archive v SET category_id = %s
+                    FROM (SELECT id, category_id FROM video_archive WHERE id = %s FOR UPDATE) old
+                    WHERE v.id = old.id
+                    RETURNING old.category_id
+                """, (category_id, video_id))
+                moved = cursor.fetchone()
+                if moved is None:
+                    return False
+                on_commit(lambda: VideoService.videos_moved([video_id], [moved[0]], category_id))
+                return True
         except Exception as e:
             logger.error(f"❌ خطأ في تحديث التصنيف: {e}")
             return False
@@ -243,9 +613,17 @@ class VideoService:
                     (message_id, caption, chat_id, file_name, file_id, category_id, 
                      metadata, title, grouping_key, upload_date, view_count)
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), 0)
+                    RETURNING id, upload_date
                 """, (message_id, caption, chat_id, file_name, file_id, category_id, 
                      metadata, title, grouping_key))
+                video_id, upload_date = cursor.fetchone()
+                video = VideoListItem(video_id, title, 0, file_name, upload_date)
+                on_commit(lambda: VideoService.video_added(video, category_id))
                 return True
         except Exception as e:
             logger.error(f"❌ خطأ في إضافة الفيديو: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+# بعد كتابة المشاهدات يُبطل الصف المخزن حتى لا يُعرض العداد القديم بدون الزيادة المعلقة
+view_counter.add_flush_listener(VideoService.invalidate_videos)
@@ -0,0 +1,57 @@
+"""
+عداد المشاهدات المؤجل: يجمع الزيادات لكل فيديو في الذاكرة ويكتبها
+بأمر UPDATE ... FROM (VALUES ...) واحد بدلاً من تحديث ومعاملة لكل مشاهدة
+"""
+import os
+import logging
+from typing import Dict, List
+
+from app.database.connection import get_db_cursor
+from app.utils.write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+VIEW_FLUSH_INTERVAL = float(os.getenv('VIEW_FLUSH_INTERVAL', '10'))
+VIEW_FLUSH_MAX_KEYS = int(os.getenv('VIEW_FLUSH_MAX_KEYS', '500'))
+
+
+class ViewCountBuffer(WriteBehindBuffer):
+    """مخزن زيادات عداد المشاهدة حسب video_id"""
+
+    name = "view-counter"
+
+    def record(self, video_id: int, delta: int = 1):
+        """تسجيل مشاهدة (في الذاكرة فقط)"""
+        self.add(int(video_id), delta)
+
+    def pending_views(self, video_id: int) -> int:
+        """المشاهدات المسجلة التي لم تُكتب بعد لهذا الفيديو"""
+        return self.pending(int(video_id), 0)
+
+    def pending_total(self) -> int:
+        """مجموع المشاهدات المعلقة لجميع الفيديوهات"""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def _merge(self, current: int, value: int) -> int:
+        return current + value
+
+    def _write(self, batch: Dict[int, int]):
+        # ترتيب المعرفات يضمن نفس ترتيب قفل الصفوف بين الدفعات المتزامنة
+        items = sorted(batch.items())
+        values_sql = ', '.join(['(%s, %s)'] * len(items))
+        params: List[int] = [value for item in items for value in item]
+        with get_db_cursor(standalone=True) as cursor:
+            cursor.execute(f"""
+                UPDATE video_archive AS v
+                SET view_count = COALESCE(v.view_count, 0) + d.delta
+                FROM (VALUES {values_sql}) AS d(id, delta)
+                WHERE v.id = d.id
+            """, params)
+        logger.debug(f"🔄 تم تحديث المشاهدات لـ {len(items)} فيديو")
+
+
+view_counter = ViewCountBuffer(
+    flush_interval=VIEW_FLUSH_INTERVAL,
+    max_pending=VIEW_FLUSH_MAX_KEYS,
+)
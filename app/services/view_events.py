@@ -0,0 +1,61 @@
+"""
+سجل أحداث المشاهدة (إلحاق فقط): عدد المشاهدات لكل فيديو في كل دقيقة
+يُكتب على دفعات ويُستخدم لإعادة بناء ترتيب الرائج بعد إعادة التشغيل
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from psycopg2.extras import execute_values
+
+from app.database.connection import get_db_cursor
+from app.utils.write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+VIEW_EVENTS_FLUSH_INTERVAL = float(os.getenv('VIEW_EVENTS_FLUSH_INTERVAL', '30'))
+VIEW_EVENTS_FLUSH_MAX_KEYS = int(os.getenv('VIEW_EVENTS_FLUSH_MAX_KEYS', '2000'))
+VIEW_EVENTS_RETENTION_DAYS = int(os.getenv('VIEW_EVENTS_RETENTION_DAYS', '14'))
+
+
+class ViewEventBuffer(WriteBehindBuffer):
+    """مخزن أحداث المشاهدة حسب (video_id, الدقيقة)"""
+
+    name = "view-events"
+
+    def record(self, video_id: int, viewed_at: datetime = None):
+        """تسجيل حدث مشاهدة (في الذاكرة فقط)"""
+        bucket = (viewed_at or datetime.now()).replace(second=0, microsecond=0)
+        self.add((int(video_id), bucket), 1)
+
+    def _merge(self, current: int, value: int) -> int:
+        return current + value
+
+    def _write(self, batch: Dict[Tuple[int, datetime], int]):
+        rows = [(video_id, bucket, views) for (video_id, bucket), views in batch.items()]
+        with get_db_cursor(standalone=True) as cursor:
+            execute_values(cursor, """
+                INSERT INTO video_view_events (video_id, bucket, views) VALUES %s
+            """, rows, page_size=1000)
+
+
+def cleanup_old_view_events(days: int = VIEW_EVENTS_RETENTION_DAYS) -> int:
+    """حذف أحداث المشاهدة الأقدم من days يوماً"""
+    try:
+        with get_db_cursor(standalone=True) as cursor:
+            cursor.execute("DELETE FROM video_view_events WHERE bucket < %s",
+                           (datetime.now() - timedelta(days=days),))
+            deleted_count = cursor.rowcount
+        if deleted_count > 0:
+            logger.info(f"🧹 تم حذف {deleted_count} حدث مشاهدة قديم")
+        return deleted_count
+    except Exception as e:
+        logger.error(f"❌ خطأ في تنظيف أحداث المشاهدة: {e}")
+        return 0
+
+
+view_events = ViewEventBuffer(
+    flush_interval=VIEW_EVENTS_FLUSH_INTERVAL,
+    max_pending=VIEW_EVENTS_FLUSH_MAX_KEYS,
+)
@@ -0,0 +1,106 @@
+"""
+ذاكرة تخزين مؤقت محدودة الحجم (LRU) مع مدة صلاحية اختيارية (TTL) وآمنة للخيوط
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional
+
+# قيمة مميزة لغياب المفتاح (لأن None قد يكون قيمة مخزنة صالحة)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    ذاكرة LRU: تحذف الأقل استخداماً عند الامتلاء والعناصر المنتهية عند قراءتها.
+    ttl=None يعني عناصر بلا انتهاء صلاحية.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+        self._invalidations = 0
+
+    def get(self, key: Hashable, default=MISSING):
+        """قراءة قيمة (أو default إذا لم توجد أو انتهت صلاحيتها)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._data[key]
+                self._expired += 1
+            self._misses += 1
+            return default
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        """
+        تخزين قيمة (ttl يتجاوز المدة الافتراضية لهذا العنصر فقط).
+        المدة None تعني بلا انتهاء، والمدة <= 0 تعني انتهاءً فورياً: لا تُخزن القيمة
+        وتُحذف القيمة القديمة للمفتاح.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            with self._lock:
+                self._data.pop(key, None)
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """حذف مفتاح (إبطال)"""
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._invalidations += 1
+                return True
+            return False
+
+    def delete_many(self, keys: Iterable[Hashable]) -> int:
+        """حذف عدة مفاتيح، ويُرجع عدد المحذوف فعلاً"""
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    removed += 1
+            self._invalidations += removed
+        return removed
+
+    def clear(self):
+        """مسح جميع العناصر"""
+        with self._lock:
+            self._invalidations += len(self._data)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict:
+        """مقاييس الذاكرة المؤقتة"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 3) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expired': self._expired,
+                'invalidations': self._invalidations,
+            }
@@ -0,0 +1,217 @@
+"""
+طابور مهام خلفية داخل العملية: كتابات جانبية لا يحتاجها المستخدم قبل الرد
+(تسجيل المستخدم، سجلات الإدارة...) تُنفذ في مجموعة خيوط عاملة بدل مسار الـ webhook
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_WORKERS = int(os.getenv('JOB_QUEUE_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '1000'))
+# سياسة الامتلاء: drop_oldest (حذف أقدم مهمة) أو drop_new (رفض الجديدة) أو run_inline (تنفيذ فوري)
+JOB_QUEUE_OVERFLOW = os.getenv('JOB_QUEUE_OVERFLOW', 'drop_oldest')
+JOB_MAX_RETRIES = int(os.getenv('JOB_MAX_RETRIES', '3'))
+JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', '0.5'))
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_new', 'run_inline')
+
+
+class _Job:
+    __slots__ = ('func', 'args', 'kwargs', 'retries', 'name', 'enqueued_at')
+
+    def __init__(self, func, args, kwargs, retries):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.retries = retries
+        self.name = getattr(func, '__qualname__', repr(func))
+        self.enqueued_at = time.monotonic()
+
+
+class JobQueue:
+    """طابور محدود السعة مع خيوط عاملة وإعادة محاولة بتأخير متزايد"""
+
+    def __init__(self, workers: int = 2, maxsize: int = 1000, overflow: str = 'drop_oldest',
+                 max_retries: int = 3, backoff: float = 0.5):
+        if overflow not in OVERFLOW_POLICIES:
+            logger.warning(f"⚠️ سياسة امتلاء غير معروفة '{overflow}' - استخدام drop_oldest")
+            overflow = 'drop_oldest'
+
+        self.workers = max(1, workers)
+        self.overflow = overflow
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._queue: "queue.Queue[_Job]" = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+        # مقاييس
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._retried = 0
+        self._dropped = 0
+        self._inline = 0
+        self._max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+
+    def submit(self, func: Callable, *args, retries: int = None, **kwargs) -> bool:
+        """إضافة مهمة (أطلق وانسَ). يُرجع False إذا رُفضت المهمة"""
+        job = _Job(func, args, kwargs, self.max_retries if retries is None else retries)
+
+        if self._stopping.is_set():
+            # بعد بدء الإيقاف لا نقبل مهام جديدة في الطابور - ننفذها مباشرة
+            self._run_inline(job)
+            return True
+
+        self._ensure_started()
+        with self._lock:
+            self._submitted += 1
+
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow == 'run_inline':
+            self._run_inline(job)
+            return True
+
+        if self.overflow == 'drop_oldest':
+            try:
+                dropped = self._queue.get_nowait()
+                self._queue.task_done()
+                logger.warning(f"⚠️ الطابور ممتلئ - تم حذف أقدم مهمة: {dropped.name}")
+                self._queue.put_nowait(job)
+                with self._lock:
+                    self._dropped += 1
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+
+        with self._lock:
+            self._dropped += 1
+        logger.warning(f"⚠️ الطابور ممتلئ - تم رفض المهمة: {job.name}")
+        return False
+
+    def start(self):
+        """تشغيل الخيوط العاملة"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"✅ تم تشغيل طابور المهام ({self.workers} خيط، سعة {self._queue.maxsize})")
+
+    def shutdown(self, timeout: float = 10.0):
+        """إيقاف الطابور بعد تنفيذ المهام المتبقية (بحد أقصى timeout ثانية)"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in list(self._threads):
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        remaining = self._queue.qsize()
+        if remaining:
+            logger.warning(f"⚠️ تم إيقاف طابور المهام مع {remaining} مهمة غير منفذة")
+        else:
+            logger.info("✅ تم تفريغ طابور المهام")
+        with self._lock:
+            self._threads = []
+
+    def stats(self) -> Dict:
+        """مقاييس الطابور"""
+        with self._lock:
+            done = self._completed + self._failed
+            return {
+                'depth': self._queue.qsize(),
+                'workers': len(self._threads),
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'retried': self._retried,
+                'dropped': self._dropped,
+                'inline': self._inline,
+                'latency_avg_ms': round(self._total_latency_ms / max(done, 1), 2),
+                'latency_max_ms': round(self._max_latency_ms, 2),
+            }
+
+    # === داخلي ===
+
+    def _ensure_started(self):
+        if not self._threads:
+            self.start()
+
+    def _run_inline(self, job: _Job):
+        with self._lock:
+            self._inline += 1
+        self._execute(job)
+
+    def _worker(self):
+        while True:
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+
+            try:
+                self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job: _Job):
+        attempt = 0
+        while True:
+            try:
+                job.func(*job.args, **job.kwargs)
+                self._record_done(job, success=True)
+                return
+            except Exception as e:
+                if attempt >= job.retries:
+                    self._record_done(job, success=False)
+                    logger.error(f"❌ فشلت المهمة {job.name} بعد {attempt + 1} محاولة: {e}")
+                    return
+
+                delay = self.backoff * (2 ** attempt)
+                attempt += 1
+                with self._lock:
+                    self._retried += 1
+                logger.warning(f"⚠️ إعادة محاولة المهمة {job.name} ({attempt}/{job.retries}) بعد {delay:.1f}s: {e}")
+                # أثناء الإيقاف لا ننتظر التأخير كاملاً
+                self._stopping.wait(delay)
+
+    def _record_done(self, job: _Job, success: bool):
+        latency_ms = (time.monotonic() - job.enqueued_at) * 1000
+        with self._lock:
+            if success:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._total_latency_ms += latency_ms
+            self._max_latency_ms = max(self._max_latency_ms, latency_ms)
+
+
+background_jobs = JobQueue(
+    workers=JOB_QUEUE_WORKERS,
+    maxsize=JOB_QUEUE_SIZE,
+    overflow=JOB_QUEUE_OVERFLOW,
+    max_retries=JOB_MAX_RETRIES,
+    backoff=JOB_RETRY_BACKOFF,
+)
+
+
+def run_in_background(func: Callable, *args, **kwargs) -> bool:
+    """تنفيذ دالة في طابور المهام الخلفية"""
+    return background_jobs.submit(func, *args, **kwargs)
@@ -0,0 +1,111 @@
+"""
+مؤشرات التصفح بالمفاتيح (Keyset / Cursor Pagination)
+المؤشر نص قصير آمن لـ callback_data (بدون '_') يحمل قيم مفتاح الترتيب لآخر/أول صف
+مثال: 'ai2s.tgvrh0tief4.i7k' = بعد الصف ذي المفتاح (100، تاريخ الرفع، 272)
+القيمة NULL تُرمز صراحة ('n') ويعالجها keyset_condition حسب موضع NULL في الترتيب.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple
+
+AFTER = 'a'
+BEFORE = 'b'
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _to_base36(number: int) -> str:
+    if number < 0:
+        return '-' + _to_base36(-number)
+    if number == 0:
+        return '0'
+    digits = []
+    while number:
+        number, rem = divmod(number, 36)
+        digits.append(_DIGITS[rem])
+    return ''.join(reversed(digits))
+
+
+def _encode_value(value) -> str:
+    if value is None:
+        return 'n'
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            micros = (value - _EPOCH_UTC) // timedelta(microseconds=1)
+            return 'z' + _to_base36(micros)
+        micros = (value - _EPOCH) // timedelta(microseconds=1)
+        return 't' + _to_base36(micros)
+    return 'i' + _to_base36(int(value))
+
+
+def _decode_value(token: str):
+    tag, payload = token[0], token[1:]
+    if tag == 'n' and not payload:
+        return None
+    number = int(payload, 36)
+    if tag == 'i':
+        return number
+    if tag == 't':
+        return _EPOCH + timedelta(microseconds=number)
+    if tag == 'z':
+        return _EPOCH_UTC + timedelta(microseconds=number)
+    raise ValueError(f"نوع قيمة غير معروف في المؤشر: {tag}")
+
+
+def encode_cursor(direction: str, values: Sequence) -> str:
+    """ترميز اتجاه التصفح وقيم المفتاح في نص قصير"""
+    return direction + '.'.join(_encode_value(value) for value in values)
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, tuple]]:
+    """فك ترميز المؤشر إلى (الاتجاه، القيم) أو None إذا كان غير صالح"""
+    if not cursor or cursor[0] not in (AFTER, BEFORE):
+        return None
+    try:
+        return cursor[0], tuple(_decode_value(token) for token in cursor[1:].split('.'))
+    except (ValueError, IndexError, OverflowError):
+        return None
+
+
+def keyset_condition(columns: Sequence[str], direction: str, key: Sequence) -> Tuple[str, List]:
+    """
+    شرط WHERE للصفوف بعد (AFTER) أو قبل (BEFORE) المفتاح في ترتيب تنازلي على columns،
+    مع نفس موضع NULL في ترتيب PostgreSQL (أولاً في DESC وأخيراً في ASC).
+    بعد مفتاح بلا NULL تكفي مقارنة الصف (a, b) < (x, y) التي يستخدمها الفهرس مباشرة،
+    وإلا يُفك الشرط عموداً عموداً: (a بعد x) OR (a = x AND b بعد y) ...
+    """
+    if direction == AFTER and all(value is not None for value in key):
+        placeholders = ', '.join(['%s'] * len(key))
+        return f"({', '.join(columns)}) < ({placeholders})", list(key)
+
+    clauses, params = [], []
+    for index, (column, value) in enumerate(zip(columns, key)):
+        if direction == AFTER:
+            step = f"{column} IS NOT NULL" if value is None else f"{column} < %s"
+        elif value is None:
+            continue  # لا شيء قبل NULL في الترتيب التصاعدي (NULLS LAST)
+        else:
+            step = f"({column} > %s OR {column} IS NULL)"
+        
+        parts = []
+        for prev_column, prev_value in zip(columns[:index], key[:index]):
+            if prev_value is None:
+                parts.append(f"{prev_column} IS NULL")
+            else:
+                parts.append(f"{prev_column} = %s")
+                params.append(prev_value)
+        parts.append(step)
+        if value is not None:
+            params.append(value)
+        clauses.append(' AND '.join(parts))
+
+    if not clauses:
+        return "FALSE", []
+    return '(' + ' OR '.join(f"({clause})" for clause in clauses) + ')', params
+
+
+def parse_page_callback(payload: str) -> Tuple[int, Optional[str]]:
+    """تحليل الجزء '{page}' أو '{page}_{cursor}' من callback_data"""
+    page_part, _, cursor = payload.partition('_')
+    return int(page_part), (cursor or None)
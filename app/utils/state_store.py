@@ -0,0 +1,226 @@
+"""
+مخزن حالات المحادثة (مثل انتظار نص البحث) بواجهة قاموس
+مع مدة صلاحية (TTL) وحد أقصى للحجم، بدلاً من قواميس تكبر بلا حد.
+
+الخلفيات (STATE_BACKEND):
+    memory   - في ذاكرة العملية (LRU + TTL، بحث O(1))
+    postgres - جدول UNLOGGED مشترك بين العمليات (الترحيل 7)، للتشغيل بأكثر من عملية
+
+القيم قواميس قابلة للتحويل لـ JSON، وتعديلها بعد القراءة لا يُحفظ إلا بإعادة تعيينها.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Hashable
+
+from app.database.connection import get_db_cursor
+from app.utils.cache import MISSING, LRUCache
+from app.utils.job_queue import run_in_background
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory').lower()
+# مدة صلاحية الحالة بالثواني (تتجدد عند كل تعيين)
+STATE_TTL = float(os.getenv('STATE_TTL', '1800'))
+# أقصى عدد حالات لكل مخزن (الأقدم استخداماً يُحذف أولاً)
+STATE_MAX_SIZE = int(os.getenv('STATE_MAX_SIZE', '10000'))
+# أقل فاصل بين عمليتي تنظيف لجدول الحالات (بالثواني)
+STATE_PURGE_INTERVAL = float(os.getenv('STATE_PURGE_INTERVAL', '300'))
+
+
+class StateStore(ABC):
+    """واجهة قاموس لحالات المحادثة: store[key] = state، key in store، store.get/pop"""
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float):
+        self.namespace = namespace
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+
+    @abstractmethod
+    def get(self, key: Hashable, default=None):
+        """الحالة الحالية (أو default إذا لم توجد أو انتهت صلاحيتها)"""
+
+    @abstractmethod
+    def set(self, key: Hashable, state: Dict):
+        """تعيين الحالة وتجديد صلاحيتها"""
+
+    @abstractmethod
+    def pop(self, key: Hashable, default=None):
+        """حذف الحالة وإرجاعها (أو default)"""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        """مقاييس المخزن"""
+
+    def __getitem__(self, key: Hashable):
+        state = self.get(key, MISSING)
+        if state is MISSING:
+            raise KeyError(key)
+        return state
+
+    def __setitem__(self, key: Hashable, state: Dict):
+        self.set(key, state)
+
+    def __delitem__(self, key: Hashable):
+        if self.pop(key, MISSING) is MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+
+class MemoryStateStore(StateStore):
+    """حالات في ذاكرة العملية فوق LRUCache"""
+
+    def __init__(self, namespace: str, maxsize: int = 10000, ttl: float = 1800):
+        super().__init__(namespace, maxsize, ttl)
+        self._cache = LRUCache(maxsize=self.maxsize, ttl=ttl)
+
+    def get(self, key: Hashable, default=None):
+        return self._cache.get(key, default)
+
+    def set(self, key: Hashable, state: Dict):
+        self._cache.set(key, state)
+
+    def pop(self, key: Hashable, default=None):
+        state = self._cache.get(key, MISSING)
+        if state is MISSING:
+            return default
+        self._cache.delete(key)
+        return state
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats()
+        stats['backend'] = 'memory'
+        stats['ttl'] = self.ttl
+        return stats
+
+
+class PostgresStateStore(StateStore):
+    """
+    حالات مشتركة في جدول conversation_states (UNLOGGED: بلا WAL، وتُفقد عند تعطل الخادم
+    وهذا مقبول لحالات مؤقتة). انتهاء الصلاحية يُفحص عند القراءة، والتنظيف الدوري يحذف
+    المنتهي ثم الأقدم تحديثاً فوق maxsize.
+    أخطاء قاعدة البيانات تُسجل ويُعامل المفتاح كغير موجود.
+    """
+
+    def __init__(self, namespace: str, maxsize: int = 10000, ttl: float = 1800,
+                 purge_interval: float = 300):
+        super().__init__(namespace, maxsize, ttl)
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+        self._purge_lock = threading.Lock()
+        self._reads = 0
+        self._writes = 0
+        self._errors = 0
+        self._purged = 0
+
+    def get(self, key: Hashable, default=None):
+        self._reads += 1
+        try:
+            with get_db_cursor(standalone=True) as cursor:
+                cursor.execute("""
+                    SELECT state FROM conversation_states
+                    WHERE namespace = %s AND key = %s AND expires_at > NOW()
+                """, (self.namespace, str(key)))
+                row = cursor.fetchone()
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"❌ خطأ في قراءة حالة المحادثة: {e}")
+            return default
+        return row[0] if row is not None else default
+
+    def set(self, key: Hashable, state: Dict):
+        self._writes += 1
+        try:
+            with get_db_cursor(standalone=True) as cursor:
+                cursor.execute("""
+                    INSERT INTO conversation_states (namespace, key, state, updated_at, expires_at)
+                    VALUES (%s, %s, %s::jsonb, NOW(), NOW() + %s * INTERVAL '1 second')
+                    ON CONFLICT (namespace, key) DO UPDATE
+                    SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at,
+                        expires_at = EXCLUDED.expires_at
+                """, (self.namespace, str(key), json.dumps(state), self.ttl))
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"❌ خطأ في حفظ حالة المحادثة: {e}")
+            return
+        self._maybe_purge()
+
+    def pop(self, key: Hashable, default=None):
+        self._writes += 1
+        try:
+            with get_db_cursor(standalone=True) as cursor:
+                cursor.execute("""
+                    DELETE FROM conversation_states
+                    WHERE namespace = %s AND key = %s
+                    RETURNING state, expires_at > NOW()
+                """, (self.namespace, str(key)))
+                row = cursor.fetchone()
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"❌ خطأ في حذف حالة المحادثة: {e}")
+            return default
+        return row[0] if row is not None and row[1] else default
+
+    def purge(self) -> int:
+        """حذف الحالات المنتهية والزائدة عن maxsize، ويُرجع عدد المحذوف"""
+        try:
+            with get_db_cursor(standalone=True) as cursor:
+                cursor.execute("""
+                    DELETE FROM conversation_states
+                    WHERE namespace = %s AND expires_at <= NOW()
+                """, (self.namespace,))
+                deleted_count = cursor.rowcount
+                cursor.execute("""
+                    DELETE FROM conversation_states
+                    WHERE namespace = %s AND key IN (
+                        SELECT key FROM conversation_states
+                        WHERE namespace = %s
+                        ORDER BY updated_at DESC
+                        OFFSET %s
+                    )
+                """, (self.namespace, self.namespace, self.maxsize))
+                deleted_count += cursor.rowcount
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"❌ خطأ في تنظيف حالات المحادثة: {e}")
+            return 0
+        self._purged += deleted_count
+        return deleted_count
+
+    def _maybe_purge(self):
+        """جدولة تنظيف في طابور المهام الخلفية إذا مر purge_interval منذ آخر تنظيف"""
+        now = time.monotonic()
+        with self._purge_lock:
+            if now - self._last_purge < self.purge_interval:
+                return
+            self._last_purge = now
+        run_in_background(self.purge)
+
+    def stats(self) -> Dict:
+        return {
+            'backend': 'postgres',
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'reads': self._reads,
+            'writes': self._writes,
+            'errors': self._errors,
+            'purged': self._purged,
+        }
+
+
+def create_state_store(namespace: str, backend: str = STATE_BACKEND, maxsize: int = STATE_MAX_SIZE,
+                       ttl: float = STATE_TTL) -> StateStore:
+    """إنشاء مخزن حالات بالخلفية المضبوطة في STATE_BACKEND"""
+    if backend == 'postgres':
+        return PostgresStateStore(namespace, maxsize=maxsize, ttl=ttl, purge_interval=STATE_PURGE_INTERVAL)
+    if backend != 'memory':
+        logger.warning(f"⚠️ خلفية حالات غير معروفة '{backend}' - سيتم استخدام الذاكرة")
+    return MemoryStateStore(namespace, maxsize=maxsize, ttl=ttl)
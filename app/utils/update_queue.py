@@ -0,0 +1,245 @@
+"""
+استقبال تحديثات الـ webhook عبر طوابير: المسار يتحقق من التحديث ويضعه في طابور
+ويرد فوراً، وخيوط عاملة تعالج التحديثات (قاعدة البيانات واستدعاءات تيليجرام).
+
+التحديثات تُوزع على مسارات (lanes) حسب chat_id: لكل مسار طابور وخيط واحد،
+فتُعالج تحديثات المحادثة الواحدة بترتيب وصولها تماماً (حالة البحث ثم ضغطات الأزرار)
+بينما تعمل المحادثات المختلفة بالتوازي. يمكن تخصيص مسار مستقل لمحادثات المشرفين
+حتى لا تتأخر خلف مستخدمين آخرين.
+"""
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def chat_id_of(update) -> Optional[int]:
+    """معرف المحادثة التي يخصها التحديث (أو المستخدم إذا لم تكن هناك محادثة)"""
+    for name in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = getattr(update, name, None)
+        if message is not None:
+            return message.chat.id
+
+    callback = getattr(update, 'callback_query', None)
+    if callback is not None:
+        if callback.message is not None:
+            return callback.message.chat.id
+        return callback.from_user.id
+
+    for name in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+                 'my_chat_member', 'chat_member', 'chat_join_request'):
+        event = getattr(update, name, None)
+        if event is None:
+            continue
+        chat = getattr(event, 'chat', None)
+        if chat is not None:
+            return chat.id
+        user = getattr(event, 'from_user', None)
+        if user is not None:
+            return user.id
+    return None
+
+
+class Timing:
+    """مجموع وأقصى قيمة لزمن (بالميلي ثانية)"""
+
+    __slots__ = ('count', 'total_ms', 'max_ms')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, other: "Timing"):
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def as_dict(self, prefix: str) -> Dict:
+        return {
+            f'{prefix}_avg_ms': round(self.total_ms / max(self.count, 1), 2),
+            f'{prefix}_max_ms': round(self.max_ms, 2),
+        }
+
+
+class _Lane:
+    """مسار واحد: طابور محدود وخيط واحد يعالجه بالترتيب"""
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.queue: "queue.Queue[tuple]" = queue.Queue(maxsize=maxsize)
+        self.thread: Optional[threading.Thread] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.wait = Timing()
+        self.processing = Timing()
+
+    def stats(self) -> Dict:
+        stats = {
+            'lane': self.name,
+            'depth': self.queue.qsize(),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
+        stats.update(self.wait.as_dict('wait'))
+        stats.update(self.processing.as_dict('processing'))
+        return stats
+
+
+def _imbalance(values: List[int]) -> float:
+    """أكبر قيمة مقسومة على المتوسط (1.0 = توزيع متساوٍ)"""
+    if not values:
+        return 1.0
+    mean = sum(values) / len(values)
+    return round(max(values) / mean, 2) if mean else 1.0
+
+
+class UpdateDispatcher:
+    """موزع تحديثات على مسارات حسب المحادثة: ترتيب صارم داخل المحادثة وتوازٍ بين المحادثات"""
+
+    def __init__(self, process: Callable, lanes: int = 4, maxsize: int = 1000,
+                 admin_ids: Iterable[int] = (), admin_lane: bool = False,
+                 key: Callable = chat_id_of, name: str = "update"):
+        self.process = process
+        self.key = key
+        self.name = name
+        self.admin_ids = frozenset(admin_ids or ())
+
+        self._lanes = [_Lane(str(index), maxsize) for index in range(max(1, lanes))]
+        self._admin_lane = _Lane('admin', maxsize) if admin_lane and self.admin_ids else None
+
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._started = False
+
+    def lane_for(self, update) -> _Lane:
+        """المسار الثابت لمحادثة التحديث"""
+        chat_id = self.key(update)
+        if chat_id is None:
+            # تحديث بدون محادثة: لا ترتيب مطلوب - يُوزع حسب رقمه
+            chat_id = getattr(update, 'update_id', 0) or 0
+        elif self._admin_lane is not None and chat_id in self.admin_ids:
+            return self._admin_lane
+        return self._lanes[chat_id % len(self._lanes)]
+
+    def submit(self, update) -> bool:
+        """وضع تحديث في طابور مساره (False إذا كان ممتلئاً أو متوقفاً)"""
+        if self._stopping.is_set():
+            return False
+        self._ensure_started()
+        lane = self.lane_for(update)
+        try:
+            lane.queue.put_nowait((update, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                lane.rejected += 1
+            logger.warning(f"⚠️ طابور المسار {lane.name} ممتلئ ({lane.queue.maxsize}) - تم رفض التحديث")
+            return False
+        with self._lock:
+            lane.accepted += 1
+        return True
+
+    def start(self):
+        """تشغيل خيط لكل مسار"""
+        with self._lock:
+            if self._started:
+                return
+            self._stopping.clear()
+            for lane in self._all_lanes():
+                lane.thread = threading.Thread(target=self._worker, args=(lane,),
+                                               name=f"{self.name}-lane-{lane.name}", daemon=True)
+                lane.thread.start()
+            self._started = True
+        logger.info(f"✅ تم تشغيل موزع التحديثات ({len(self._lanes)} مسار"
+                    f"{' + مسار المشرفين' if self._admin_lane else ''})")
+
+    def shutdown(self, timeout: float = 10.0):
+        """إيقاف القبول ومعالجة ما تبقى في الطوابير (بحد أقصى timeout ثانية)"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for lane in self._all_lanes():
+            if lane.thread is not None:
+                lane.thread.join(max(0.0, deadline - time.monotonic()))
+        remaining = sum(lane.queue.qsize() for lane in self._all_lanes())
+        if remaining:
+            logger.warning(f"⚠️ تم إيقاف موزع التحديثات مع {remaining} تحديث غير معالج")
+        with self._lock:
+            for lane in self._all_lanes():
+                lane.thread = None
+            self._started = False
+
+    def stats(self) -> Dict:
+        """مقاييس الموزع: العمق وزمن الانتظار والمعالجة لكل مسار وعدم توازن المسارات"""
+        with self._lock:
+            wait, processing = Timing(), Timing()
+            for lane in self._all_lanes():
+                wait.merge(lane.wait)
+                processing.merge(lane.processing)
+            lanes = [lane.stats() for lane in self._all_lanes()]
+            # عدم التوازن يُحسب على مسارات التجزئة فقط (مسار المشرفين مقصود أن يختلف)
+            hashed = lanes[:len(self._lanes)]
+            stats = {
+                'mode': 'queue',
+                'lanes': len(self._lanes),
+                'admin_lane': self._admin_lane is not None,
+                'depth': sum(lane['depth'] for lane in lanes),
+                'capacity_per_lane': self._lanes[0].queue.maxsize,
+                'accepted': sum(lane['accepted'] for lane in lanes),
+                'rejected': sum(lane['rejected'] for lane in lanes),
+                'processed': sum(lane['processed'] for lane in lanes),
+                'failed': sum(lane['failed'] for lane in lanes),
+                'load_imbalance': _imbalance([lane['accepted'] for lane in hashed]),
+                'depth_imbalance': _imbalance([lane['depth'] for lane in hashed]),
+                'per_lane': lanes,
+            }
+            stats.update(wait.as_dict('wait'))
+            stats.update(processing.as_dict('processing'))
+            return stats
+
+    # === داخلي ===
+
+    def _all_lanes(self) -> List[_Lane]:
+        return self._lanes + ([self._admin_lane] if self._admin_lane else [])
+
+    def _ensure_started(self):
+        if not self._started:
+            self.start()
+
+    def _worker(self, lane: _Lane):
+        while True:
+            try:
+                update, enqueued_at = lane.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+
+            started = time.monotonic()
+            failed = False
+            try:
+                self.process(update)
+            except Exception as e:
+                failed = True
+                logger.error(f"❌ خطأ في معالجة التحديث (المسار {lane.name}): {e}")
+            finally:
+                finished = time.monotonic()
+                with self._lock:
+                    lane.wait.add((started - enqueued_at) * 1000)
+                    lane.processing.add((finished - started) * 1000)
+                    if failed:
+                        lane.failed += 1
+                    else:
+                        lane.processed += 1
+                lane.queue.task_done()
@@ -0,0 +1,173 @@
+"""
+مخزن كتابة مؤجلة (Write-Behind) عام: يجمع التحديثات في الذاكرة حسب المفتاح
+ويكتبها دفعة واحدة عند امتلاء الحد أو مرور الفترة أو الإيقاف
+"""
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer(ABC):
+    """
+    الأساس المشترك لمخازن الكتابة المؤجلة.
+    الأصناف الفرعية تعرّف _merge و _write.
+    """
+
+    name = "write-behind"
+
+    def __init__(self, flush_interval: float = 5.0, max_pending: int = 500, max_retained: int = 50000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # عند فشل الكتابة تُعاد الدفعة للمخزن، وبعد هذا الحد تُسقط حتى لا تنمو الذاكرة بلا حد
+        self.max_retained = max_retained
+
+        self._pending: Dict[Hashable, object] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._listeners: List[Callable[[List[Hashable]], None]] = []
+
+        # مقاييس
+        self._recorded = 0
+        self._flushes = 0
+        self._flushed_keys = 0
+        self._failures = 0
+        self._dropped = 0
+        self._last_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    # === الواجهة العامة ===
+
+    def add(self, key: Hashable, value):
+        """إضافة تحديث للمخزن (بدون أي اتصال بقاعدة البيانات)"""
+        self._ensure_started()
+        with self._lock:
+            current = self._pending.get(key)
+            self._pending[key] = value if current is None else self._merge(current, value)
+            self._recorded += 1
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def pending(self, key: Hashable, default=None):
+        """القيمة المعلقة لمفتاح لم تُكتب بعد"""
+        with self._lock:
+            return self._pending.get(key, default)
+
+    def depth(self) -> int:
+        """عدد المفاتيح المعلقة"""
+        with self._lock:
+            return len(self._pending)
+
+    def add_flush_listener(self, listener: Callable[[List[Hashable]], None]):
+        """دالة تُستدعى بقائمة المفاتيح بعد كل كتابة ناجحة"""
+        self._listeners.append(listener)
+
+    def flush(self) -> int:
+        """كتابة جميع التحديثات المعلقة الآن، ويُرجع عدد المفاتيح المكتوبة"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._pending = {}
+
+            started = time.monotonic()
+            try:
+                self._write(batch)
+            except Exception as e:
+                self._restore(batch)
+                with self._lock:
+                    self._failures += 1
+                logger.error(f"❌ فشل كتابة دفعة {self.name} ({len(batch)} عنصر): {e}")
+                return 0
+
+            elapsed_ms = (time.monotonic() - started) * 1000
+            with self._lock:
+                self._flushes += 1
+                self._flushed_keys += len(batch)
+                self._last_flush_ms = elapsed_ms
+                self._total_flush_ms += elapsed_ms
+
+            keys = list(batch)
+            for listener in self._listeners:
+                try:
+                    listener(keys)
+                except Exception as e:
+                    logger.error(f"❌ خطأ في مستمع {self.name}: {e}")
+            return len(batch)
+
+    def start(self):
+        """تشغيل خيط الكتابة الدورية"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        logger.info(f"✅ تم تشغيل {self.name} (كل {self.flush_interval}s أو {self.max_pending} عنصر)")
+
+    def stop(self, timeout: float = 10.0):
+        """إيقاف الخيط مع كتابة ما تبقى"""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict:
+        """مقاييس المخزن: العمق وزمن الكتابة"""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'recorded': self._recorded,
+                'flushes': self._flushes,
+                'flushed_keys': self._flushed_keys,
+                'failures': self._failures,
+                'dropped': self._dropped,
+                'last_flush_ms': round(self._last_flush_ms, 2),
+                'avg_flush_ms': round(self._total_flush_ms / max(self._flushes, 1), 2),
+            }
+
+    # === للأصناف الفرعية ===
+
+    @abstractmethod
+    def _merge(self, current, value):
+        """دمج قيمة جديدة مع القيمة المعلقة لنفس المفتاح"""
+
+    @abstractmethod
+    def _write(self, batch: Dict[Hashable, object]):
+        """كتابة الدفعة في قاعدة البيانات (الخطأ يُعيد الدفعة للمخزن)"""
+
+    # === داخلي ===
+
+    def _ensure_started(self):
+        if self._thread is None and not self._stopped.is_set():
+            self.start()
+
+    def _restore(self, batch: Dict[Hashable, object]):
+        """إعادة دفعة فاشلة للمخزن مع دمجها بالتحديثات الأحدث"""
+        with self._lock:
+            for key, value in batch.items():
+                if key in self._pending:
+                    self._pending[key] = self._merge(value, self._pending[key])
+                elif len(self._pending) < self.max_retained:
+                    self._pending[key] = value
+                else:
+                    self._dropped += 1
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ خطأ في خيط {self.name}: {e}")
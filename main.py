@@ -11,6 +11,7 @@ import logging
 import schedule
 from dotenv import load_dotenv
 import telebot
+from telebot import apihelper
 from flask import Flask, request
 
 # تحميل متغيرات البيئة
@@ -30,6 +31,16 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 ADMIN_IDS = [int(x.strip()) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()]
 WEBHOOK_URL = os.getenv('RENDER_EXTERNAL_URL', 'https://o-v-c-f.onrender.com')
 SOURCE_CHAT_ID = int(os.getenv('SOURCE_CHAT_ID', '-1002674581978'))
+# inline: معالجة التحديث داخل طلب الـ webhook | queue: وضعه في طابور والرد فوراً
+WEBHOOK_MODE = os.getenv('WEBHOOK_MODE', 'inline').lower()
+# عدد المسارات (خيط لكل مسار، والمحادثة الواحدة دائماً على نفس المسار)
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+# سعة طابور كل مسار
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+# مسار مستقل لمحادثات المشرفين
+WEBHOOK_ADMIN_LANE = os.getenv('WEBHOOK_ADMIN_LANE', 'false').lower() in ('1', 'true', 'yes')
+# sync: Flask + telebot | async: aiohttp + AsyncTeleBot + محرك SQLAlchemy غير المتزامن
+BOT_RUNTIME = os.getenv('BOT_RUNTIME', 'sync').lower()
 
 if not BOT_TOKEN or not DATABASE_URL:
     logger.error("❌ متغيرات البيئة مفقودة!")
@@ -39,9 +50,23 @@ if not BOT_TOKEN or not DATABASE_URL:
 bot = telebot.TeleBot(BOT_TOKEN, threaded=False)
 app = Flask(__name__)
 
+
+def send_telegram_request(method, url, **kwargs):
+    """
+    إرسال طلبات Bot API: تُنهى معاملة وحدة العمل وتُرجع اتصالها للتجمع قبل انتظار الشبكة
+    حتى لا تحجز ردود Telegram البطيئة اتصالات قاعدة البيانات
+    """
+    from app.database.connection import release_unit_of_work
+    release_unit_of_work()
+    return apihelper._get_req_session().request(method, url, **kwargs)
+
+
+apihelper.CUSTOM_REQUEST_SENDER = send_telegram_request
+
 # متغيرات النظام
 should_stop = False
 handlers_registered = False
+update_queue = None
 
 
 def setup_scheduler():
@@ -51,6 +76,8 @@ def setup_scheduler():
             try:
                 from app.services.user_service import UserService
                 UserService.cleanup_old_history(15)
+                from app.services.view_events import cleanup_old_view_events
+                cleanup_old_view_events()
                 logger.info("🧹 تم تنفيذ التنظيف الدوري")
             except Exception as e:
                 logger.error(f"❌ خطأ في تنظيف السجل: {e}")
@@ -205,13 +232,15 @@ def register_simple_handlers():
             btn_history = telebot.types.InlineKeyboardButton("📊 سجل المشاهدة", callback_data="history")
             btn_popular = telebot.types.InlineKeyboardButton("🔥 الأشهر", callback_data="popular")
             btn_recent = telebot.types.InlineKeyboardButton("🆕 الأحدث", callback_data="recent")
+            btn_trending = telebot.types.InlineKeyboardButton("🚀 الرائج", callback_data="trending")
             btn_stats = telebot.types.InlineKeyboardButton("📈 الإحصائيات", callback_data="stats")
             btn_help = telebot.types.InlineKeyboardButton("❓ المساعدة", callback_data="help")
             
             markup.add(btn_search, btn_categories)
             markup.add(btn_favorites, btn_history)
             markup.add(btn_popular, btn_recent)
-            markup.add(btn_stats, btn_help)
+            markup.add(btn_trending, btn_stats)
+            markup.add(btn_help)
             
             bot.send_message(message.chat.id, welcome_text, reply_markup=markup, parse_mode='Markdown')
             
@@ -327,6 +356,9 @@ def register_simple_handlers():
             elif data == "recent":
                 from app.handlers.callbacks import handle_recent_videos
                 handle_recent_videos(bot, call)
+            elif data == "trending":
+                from app.handlers.callbacks import handle_trending_videos
+                handle_trending_videos(bot, call)
             elif data == "stats":
                 from app.handlers.callbacks import handle_stats_menu
                 handle_stats_menu(bot, call)
@@ -352,10 +384,11 @@ def register_simple_handlers():
             elif data.startswith("category_"):
                 from app.handlers.callbacks import handle_category_videos
                 if "_page_" in data:
+                    from app.utils.pagination import parse_page_callback
                     parts = data.replace("category_", "").split("_page_")
                     category_id = int(parts[0])
-                    page = int(parts[1])
-                    handle_category_videos(bot, call, category_id, page)
+                    page, cursor = parse_page_callback(parts[1])
+                    handle_category_videos(bot, call, category_id, page, cursor)
                 else:
                     category_id = int(data.replace("category_", ""))
                     handle_category_videos(bot, call, category_id)
@@ -397,12 +430,12 @@ def register_simple_handlers():
                     markup = telebot.types.InlineKeyboardMarkup()
                     
                     for i, video in enumerate(results, 1):
-                        title = video[1] or video[4] or f"فيديو {video[0]}"
+                        title = video.display_title
                         title = title[:40] + "..." if len(title) > 40 else title
-                        views = video[3] or 0
+                        views = video.view_count or 0
                         response += f"**{i}.** {title}\n   👁️ {views:,}\n\n"
                         
-                        btn = telebot.types.InlineKeyboardButton(f"📺 {i}. {title[:25]}...", callback_data=f"video_{video[0]}")
+                        btn = telebot.types.InlineKeyboardButton(f"📺 {i}. {title[:25]}...", callback_data=f"video_{video.id}")
                         markup.add(btn)
                     
                     btn_back = telebot.types.InlineKeyboardButton("🏠 الرئيسية", callback_data="main_menu")
@@ -561,13 +594,20 @@ def home():
 def health_check():
     try:
         from app.database.connection import check_database
+        from app.database.pool import get_pool_stats
         db_status = "connected ✅" if check_database() else "disconnected ❌"
+        pool_stats = get_pool_stats()
+        background_stats = background_work_stats()
     except Exception as e:
         db_status = f"error: {str(e)[:50]}..."
+        pool_stats = {}
+        background_stats = {}
     
     return {
         "status": "healthy",
         "database": db_status,
+        "db_pool": pool_stats,
+        "background": background_stats,
         "bot": "webhook_active ✅",
         "handlers": "registered ✅" if handlers_registered else "simple mode ⚠️",
         "architecture": "structured",
@@ -609,7 +649,10 @@ def debug_info():
     
     try:
         from app.database.connection import check_database
+        from app.database.pool import get_pool_stats
         debug_info["database_connection"] = check_database()
+        debug_info["db_pool"] = get_pool_stats()
+        debug_info["background"] = background_work_stats()
     except Exception as e:
         debug_info["database_error"] = str(e)[:100]
     
@@ -627,13 +670,74 @@ def webhook():
     try:
         json_string = request.get_data().decode('utf-8')
         update = telebot.types.Update.de_json(json_string)
-        bot.process_new_updates([update])
+    except Exception as e:
+        logger.error(f"❌ تحديث غير صالح في Webhook: {e}")
+        return '', 400
+
+    if update_queue is not None:
+        # الطابور ممتلئ: 503 حتى يعيد تيليجرام إرسال التحديث لاحقاً
+        return ('', 200) if update_queue.submit(update) else ('', 503)
+
+    try:
+        process_update(update)
         return '', 200
     except Exception as e:
         logger.error(f"❌ خطأ في Webhook: {e}")
         return '', 500
 
 
+def process_update(update):
+    """معالجة تحديث واحد: استعلامات الخدمات المتتالية تشترك في اتصال ومعاملة واحدة"""
+    from app.database.connection import unit_of_work
+    with unit_of_work():
+        bot.process_new_updates([update])
+
+
+def setup_update_queue():
+    """تشغيل موزع التحديثات إذا كان WEBHOOK_MODE=queue"""
+    global update_queue
+    if WEBHOOK_MODE != 'queue':
+        return
+    from app.utils.update_queue import UpdateDispatcher
+    update_queue = UpdateDispatcher(
+        process_update,
+        lanes=WEBHOOK_WORKERS,
+        maxsize=WEBHOOK_QUEUE_SIZE,
+        admin_ids=ADMIN_IDS,
+        admin_lane=WEBHOOK_ADMIN_LANE,
+    )
+    update_queue.start()
+
+
+def warm_up_caches():
+    """تحميل قوائم الأشهر/الأحدث وشجرة التصنيفات مسبقاً"""
+    from app.services.top_lists import popular_videos, recent_videos
+    from app.services.category_tree import category_tree
+    popular_videos.ensure_loaded()
+    recent_videos.ensure_loaded()
+    category_tree.ensure_loaded()
+
+
+def run_async_runtime() -> bool:
+    """تشغيل الوضع غير المتزامن حتى الإيقاف (False إذا تعذر تحميله ليُكمل بالوضع المتزامن)"""
+    try:
+        from app.core.async_runtime import AsyncRuntime, ASYNC_MAX_IN_FLIGHT, ASYNC_SYNC_WORKERS
+    except Exception as e:
+        # يتطلب aiohttp و SQLAlchemy/asyncpg وإعدادات app.core.config كاملة
+        logger.error(f"❌ تعذر تحميل الوضع غير المتزامن: {e} - سيعمل البوت بالوضع المتزامن")
+        return False
+    
+    runtime = AsyncRuntime(
+        BOT_TOKEN, WEBHOOK_URL, ADMIN_IDS, process_update,
+        stats_provider=background_work_stats,
+        warm_up=warm_up_caches,
+        max_in_flight=ASYNC_MAX_IN_FLIGHT,
+        sync_workers=ASYNC_SYNC_WORKERS,
+    )
+    runtime.run(int(os.environ.get("PORT", 10000)))
+    return True
+
+
 def setup_webhook():
     """إعداد Webhook للبوت"""
     try:
@@ -657,6 +761,73 @@ def setup_webhook():
         return False
 
 
+def background_work_stats() -> dict:
+    """مقاييس طابور المهام الخلفية ومخازن الكتابة المؤجلة"""
+    from app.utils.job_queue import background_jobs
+    from app.services.view_counter import view_counter
+    from app.services.history_writer import history_writer
+    from app.services.last_seen import last_seen
+    from app.services.user_service import UserService
+    from app.services.video_service import VideoService
+    from app.services.category_tree import category_tree
+    from app.services.top_lists import popular_videos, recent_videos
+    from app.services.view_events import view_events
+    from app.services.trending import trending
+    from app.handlers.callbacks import user_states
+    return {
+        "webhook": update_queue.stats() if update_queue is not None else {"mode": "inline"},
+        "jobs": background_jobs.stats(),
+        "views": view_counter.stats(),
+        "history": history_writer.stats(),
+        "last_seen": last_seen.stats(),
+        "known_users": UserService.known_users_stats(),
+        "favorites": UserService.favorites_cache_stats(),
+        "video_cache": VideoService.video_cache_stats(),
+        "category_tree": category_tree.stats(),
+        "top_lists": {"popular": popular_videos.stats(), "recent": recent_videos.stats()},
+        "view_events": view_events.stats(),
+        "trending": trending.stats(),
+        "states": {"user": user_states.stats()},
+    }
+
+
+def drain_background_work():
+    """تنفيذ المهام الخلفية المتبقية ثم كتابة المخازن المؤجلة (عند الإيقاف)"""
+    if update_queue is not None:
+        # التحديثات المعلقة تضيف مهام ومشاهدات - تُعالج أولاً
+        try:
+            update_queue.shutdown()
+        except Exception as e:
+            logger.error(f"❌ خطأ في تفريغ طابور التحديثات: {e}")
+    try:
+        from app.utils.job_queue import background_jobs
+        background_jobs.shutdown()
+    except Exception as e:
+        logger.error(f"❌ خطأ في تفريغ طابور المهام: {e}")
+    try:
+        from app.services.view_counter import view_counter
+        view_counter.stop()
+    except Exception as e:
+        logger.error(f"❌ خطأ في كتابة المشاهدات المعلقة: {e}")
+    try:
+        from app.services.history_writer import history_writer
+        history_writer.stop()
+    except Exception as e:
+        logger.error(f"❌ خطأ في كتابة سجل المشاهدة المعلق: {e}")
+    try:
+        from app.services.last_seen import last_seen
+        last_seen.stop()
+    except Exception as e:
+        logger.error(f"❌ خطأ في كتابة آخر ظهور المعلق: {e}")
+    try:
+        from app.services.view_events import view_events
+        view_events.stop()
+        from app.services.trending import trending
+        trending.stop()
+    except Exception as e:
+        logger.error(f"❌ خطأ في حفظ بيانات الرائج: {e}")
+
+
 def self_ping():
     """نظام الـ Self Ping لمنع السكون"""
     import requests
@@ -699,6 +870,18 @@ def main():
         # إعداد المجدول
         setup_scheduler()
         
+        # بدء Self-Ping
+        ping_thread = threading.Thread(target=self_ping, daemon=True)
+        ping_thread.start()
+        logger.info("✅ Self-ping system started")
+        
+        # الوضع غير المتزامن يُعد الـ Webhook ويشغل خادمه الخاص
+        if BOT_RUNTIME == 'async' and run_async_runtime():
+            return
+        
+        # طابور التحديثات قبل Webhook حتى لا يصل تحديث قبل تشغيل الخيوط
+        setup_update_queue()
+        
         # إعداد Webhook
         if setup_webhook():
             logger.info("✅ تم إعداد Webhook بنجاح")
@@ -706,11 +889,6 @@ def main():
             logger.error("❌ فشل إعداد Webhook - البوت لن يعمل!")
             return
         
-        # بدء Self-Ping
-        ping_thread = threading.Thread(target=self_ping, daemon=True)
-        ping_thread.start()
-        logger.info("✅ Self-ping system started")
-        
         logger.info("🎉 البوت النهائي جاهز للعمل 24/7 بدون تضارب!")
         logger.info(f"🔧 المشرفون: {ADMIN_IDS}")
         logger.info("🛠️ لوحة التحكم: /admin")
@@ -732,6 +910,12 @@ def main():
             logger.info("🧹 تم حذف Webhook")
         except:
             pass
+        drain_background_work()
+        try:
+            from app.database.pool import close_pool
+            close_pool()
+        except Exception as e:
+            logger.error(f"❌ خطأ في إغلاق تجمع الاتصالات: {e}")
         logger.info("👋 تم إنهاء البوت")
 
 